@@ -0,0 +1,177 @@
+"""
+asyncio 接口
+
+yt-dlp 的提取和下载都是阻塞调用。asyncio 服务通常在每个调用处临时套上
+run_in_executor，线程数不受控制，进度钩子也无法转成异步事件。
+
+AsyncDownloader 在 download_service 的预热实例池之上提供协程接口:
+
+    async with AsyncDownloader(workers=4) as downloader:
+        info = await downloader.extract(url)
+        async for event in downloader.download(url, profile='audio'):
+            print(event)                      # progress / postprocess / 最后一个为 result
+        results = await downloader.gather_downloads(urls, limit=8, timeout=600)
+
+- 阻塞调用在固定大小的线程池中执行，线程数等于 workers；等待中的任务只是
+  挂起的协程，上千个待处理任务不会创建上千个线程。
+- 进度钩子在下载线程中被调用，通过 call_soon_threadsafe 放入事件循环中的队列，
+  download() 以异步迭代器的形式逐个产出。
+- 超时从任务取得线程开始计算，不含排队时间。下载超时、被取消或迭代提前结束时，
+  下载线程在下一次进度回调时中断；提取无法中途打断，超时后协程立即返回，
+  线程在提取结束后才空出。
+
+模块级的 extract()、download()、gather_downloads() 使用一个默认实例，
+首次调用时创建（default 预设，4 个线程）。同一个实例可以在多个事件循环中使用
+（例如多次 asyncio.run()），线程池和实例池在它们之间共享。
+"""
+
+import asyncio
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import yt_dlp
+
+from download_service import DEFAULT_PROGRESS_INTERVAL, PROFILES, DownloadService
+from retry_policy import TRANSIENT
+
+
+class AsyncDownloader:
+    """
+    基于线程池和预热实例池的异步下载器
+
+    Args:
+        profiles: {名称: yt-dlp 选项}，默认为 download_service.PROFILES
+        output_dir: 默认输出目录
+        workers: 同时执行的提取/下载数，即线程数
+        progress_interval: 下载进度事件的最小间隔（秒），也是取消下载的最长响应时间
+    """
+
+    def __init__(self, profiles=None, output_dir='downloads', workers=4,
+                 progress_interval=DEFAULT_PROGRESS_INTERVAL):
+        self.workers = workers
+        self.service = DownloadService(profiles or PROFILES, output_dir, workers, progress_interval)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='async-ydl')
+        # 取得名额的任务才提交给线程池，排队中的任务可以直接取消；
+        # asyncio.Semaphore 只能在一个事件循环中使用，按事件循环分别创建
+        self._loop_slots = weakref.WeakKeyDictionary()
+        self._loop_slots_lock = threading.Lock()
+
+    def _slots(self):
+        loop = asyncio.get_running_loop()
+        with self._loop_slots_lock:
+            slots = self._loop_slots.get(loop)
+            if slots is None:
+                slots = self._loop_slots[loop] = asyncio.Semaphore(self.workers)
+        return slots
+
+    async def extract(self, url, profile='default', flat=False, timeout=None):
+        """提取信息（不下载），返回 info_dict；超时抛出 asyncio.TimeoutError"""
+        self.service._pool(profile)
+        loop = asyncio.get_running_loop()
+        async with self._slots():
+            future = loop.run_in_executor(
+                self._executor, self.service.extract, url, profile, flat, time.perf_counter())
+            return await asyncio.wait_for(future, timeout)
+
+    async def download(self, url, profile='default', output_dir=None, timeout=None):
+        """
+        下载并逐个产出事件（异步迭代器），最后一个事件为 result
+
+        超时抛出 asyncio.TimeoutError；迭代提前结束、任务被取消或超时时中断下载。
+        """
+        self.service._pool(profile)
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+        cancelled = threading.Event()
+
+        def emit(event):
+            # 在下载线程中调用；抛出异常即中断下载
+            if cancelled.is_set():
+                raise yt_dlp.utils.DownloadCancelled('已取消')
+            loop.call_soon_threadsafe(events.put_nowait, event)
+
+        async with self._slots():
+            future = loop.run_in_executor(
+                self._executor, self.service.download, url, profile, emit, output_dir, time.perf_counter())
+            # 完成回调在事件循环中执行，排在线程送出的所有事件之后
+            future.add_done_callback(lambda _: events.put_nowait(None))
+            deadline = None if timeout is None else loop.time() + timeout
+            try:
+                while True:
+                    remaining = None if deadline is None else max(deadline - loop.time(), 0)
+                    event = await asyncio.wait_for(events.get(), remaining)
+                    if event is None:
+                        break
+                    yield event
+                yield await future
+            finally:
+                if not future.done():
+                    cancelled.set()
+
+    async def gather_downloads(self, urls, profile='default', limit=None, timeout=None, on_event=None):
+        """
+        下载多个 URL，按输入顺序返回各自的 result 事件（附带 url）
+
+        Args:
+            limit: 同时下载数，默认为 workers（超过 workers 的部分只是在排队）
+            timeout: 每个 URL 的超时（秒），超时记为失败，不影响其他 URL
+            on_event: 每个事件的回调 on_event(url, event)
+        """
+        limit = asyncio.Semaphore(limit or self.workers)
+
+        async def one(url):
+            async with limit:
+                result = None
+                try:
+                    async for event in self.download(url, profile, timeout=timeout):
+                        if event['event'] == 'result':
+                            result = event
+                        elif on_event:
+                            on_event(url, event)
+                except asyncio.TimeoutError:
+                    result = {'event': 'result', 'ok': False, 'files': [],
+                              'error': f'超过 {timeout} 秒未完成', 'kind': TRANSIENT}
+                return {**result, 'url': url}
+
+        return await asyncio.gather(*(one(url) for url in urls))
+
+    def close(self):
+        """取消排队中的任务并等待进行中的任务结束"""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self.service.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def _get_default():
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = AsyncDownloader()
+        return _default
+
+
+async def extract(url, profile='default', flat=False, timeout=None):
+    """使用默认实例提取信息"""
+    return await _get_default().extract(url, profile, flat, timeout)
+
+
+async def download(url, profile='default', output_dir=None, timeout=None):
+    """使用默认实例下载并逐个产出事件"""
+    async for event in _get_default().download(url, profile, output_dir, timeout):
+        yield event
+
+
+async def gather_downloads(urls, profile='default', limit=None, timeout=None, on_event=None):
+    """使用默认实例下载多个 URL"""
+    return await _get_default().gather_downloads(urls, profile, limit, timeout, on_event)
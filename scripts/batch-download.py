@@ -6,38 +6,110 @@
 """
 
 import argparse
+import contextlib
+import itertools
 import sys
 from pathlib import Path
 
-try:
-    import yt_dlp
-except ImportError:
-    print("错误: 需要安装 yt-dlp")
-    print("请运行: pip install yt-dlp")
-    sys.exit(1)
+from lazy_import import LazyModule, preload, startup_profile
+
+# 第一次使用时才导入，--help 和参数错误时不必等待 yt-dlp 加载
+yt_dlp = LazyModule('yt_dlp', install_hint='pip install yt-dlp')
+
+from batch_journal import BatchJournal
+from batch_metrics import BatchMetrics, MetricsFileWriter, MetricsServer
+from format_index import max_height_selector
+from info_cache import DEFAULT_TTL, InfoCache
+from job_order import DEFAULT_LOOKAHEAD, POLICIES, JobOrder
+from rate_scheduler import RateScheduler, parse_site_limits
+from url_dedup import DedupIndex
+from url_source import iter_urls
 
 
 def read_urls_from_file(file_path):
-    """从文件读取 URL 列表"""
-    urls = []
-    with open(file_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            line = line.strip()
-            # 跳过空行和注释
-            if line and not line.startswith('#'):
-                urls.append(line)
-    return urls
-
-
-def batch_download(urls, output_dir='downloads', options=None):
+    """从文件读取 URL 列表（大文件请直接使用 url_source.iter_urls 流式读取）"""
+    return list(iter_urls(file_path))
+
+
+def resume_order(urls, journal, stats):
+    """
+    跳过日志中已完成的 URL，并优先产出上次中断时正在处理的 URL
+
+    逐个产出，不需要预先读入整个列表；日志查询为 O(1)。
+    """
+    in_flight = journal.in_flight()
+    if in_flight:
+        print(f"恢复 {len(in_flight)} 个上次中断的任务")
+    yield from in_flight
+
+    in_flight = set(in_flight)
+    for url in urls:
+        if url in in_flight:
+            continue
+        if journal.is_done(url):
+            stats.record('skipped')
+            continue
+        yield url
+
+
+def expand_claims(claims, expander, work_queue):
+    """
+    队列模式下展开领取到的播放列表
+
+    播放列表在领取它的节点上展开；条目全部派发后播放列表在队列中记为完成。
+    节点在展开过程中退出时，接手的节点重新展开，已下载的条目由去重索引和
+    下载存档跳过。
+    """
+    # 可能是播放列表的 URL 判断后才知道是否展开；是视频时原样产出，由流水线回报结果
+    return expander.expand(claims, expanded=lambda url: work_queue.finish(url, 'success'))
+
+
+def batch_download(urls, output_dir='downloads', options=None, jobs=1, journal=None, resume=False,
+                   dedup=None, prefetch=0, queue_depth=16, cache=None, scheduler=None, retries=3, retry_base=2.0,
+                   metrics=None, pp_workers=0, pp_queue=None, merge_pp=True, archive=None, expand_playlists=True,
+                   work_queue=None, job_order=None):
     """
     批量下载视频
 
     Args:
-        urls: URL 列表
+        urls: URL 列表或任意可迭代对象（如 url_source.iter_urls 的生成器）
         output_dir: 输出目录
         options: 额外的 yt-dlp 选项
+        jobs: 并发 worker 数，每个 worker 使用独立的 YoutubeDL 实例
+        journal: 已打开的 BatchJournal，记录每个 URL 的状态（可选）
+        resume: 根据 journal 中的历史记录跳过已完成的 URL
+        dedup: 已打开的 DedupIndex，在发出任何网络请求前丢弃重复的 URL（可选）
+        prefetch: 提取 worker 数；大于 0 时提取与下载拆成两个并行阶段
+        queue_depth: 已提取、待下载的 info_dict 数量上限
+        cache: InfoCache，与 format-analyzer.py 共用；命中时跳过提取（可选）
+        scheduler: RateScheduler，所有 worker 共享的带宽和站点并发限制（可选）
+        retries: 临时性失败（429、5xx、超时等）的最大重试次数
+        retry_base: 首次重试前的基准等待时间（秒），之后每次翻倍
+        metrics: BatchMetrics，各阶段耗时和吞吐指标（可选）
+        pp_workers: 后处理（转码、嵌入字幕/元数据）进程数，0 表示在下载 worker 中执行，
+            None 表示 CPU 核数
+        pp_queue: 已下载、等待后处理的文件数上限（默认为进程数的 2 倍）
+        merge_pp: 把相邻的换容器/嵌入字幕/元数据步骤合并为一次 ffmpeg 调用
+        archive: 下载存档（download_archive.open_archive），已下载的视频不再下载（可选）
+        expand_playlists: 把播放列表/频道 URL 惰性展开为视频 URL，边翻页边下载
+        work_queue: 多节点共享的任务队列（work_queue.SqliteWorkQueue，需已 open）。
+            urls 先加入队列，再从队列逐个领取，多台机器可以同时处理同一个列表
+        job_order: JobOrder，按最短优先、站点轮流或 URL 文件中的优先级调整处理顺序（可选）
+
+    urls 为生成器时边读边下载，总数未知，进度显示为 完成数/已读取数。
+
+    第一次 Ctrl-C 停止派发新任务并等待进行中的下载完成；
+    第二次 Ctrl-C 中断进行中的下载，并将其记为未完成。
     """
+    # 这些模块会导入 yt_dlp，放在这里以免拖慢 --help 等不需要下载的调用
+    from batch_pipeline import BatchPipeline, BatchStats
+    from playlist_expander import PlaylistExpander
+    from postprocess_stage import default_workers
+    from pp_planner import TESTED_YTDLP_VERSION, is_compatible, plan_postprocessors, savings
+
+    if pp_workers is None:
+        pp_workers = default_workers()
+
     ydl_opts = {
         'outtmpl': f'{output_dir}/%(title)s.%(ext)s',
         'ignoreerrors': True,  # 失败继续
@@ -48,27 +120,94 @@ def batch_download(urls, output_dir='downloads', options=None):
     if options:
         ydl_opts.update(options)
 
-    success_count = 0
-    fail_count = 0
-
-    print(f"开始批量下载，共 {len(urls)} 个视频")
+    merged = []
+    if merge_pp and ydl_opts.get('postprocessors'):
+        if not is_compatible():
+            print(f"⚠ 已安装的 yt-dlp 与后处理合并不兼容（验证版本 {TESTED_YTDLP_VERSION}），逐个执行后处理器")
+        ydl_opts['postprocessors'], merged = plan_postprocessors(ydl_opts['postprocessors'])
+
+    stats = BatchStats()
+    total = len(urls) if hasattr(urls, '__len__') else None
+    if work_queue is not None:
+        added = work_queue.add(urls)
+        print(f"任务队列: 新增 {added} 个 URL，本节点 {work_queue.node_id}")
+        urls, total = work_queue.claims(), None
+    expander = None
+    if expand_playlists:
+        matcher = dedup.matcher if dedup else None
+
+        def known(url):
+            # 已下载过的只会是视频，不必发出请求判断类型
+            if resume and journal and journal.is_done(url):
+                return True
+            key = expander.matcher.key(url)
+            return (dedup is not None and dedup.is_done(key)) or (archive is not None and key in archive)
+
+        expander = PlaylistExpander(ydl_opts, matcher,
+                                    known=known if dedup or archive is not None or (resume and journal) else None,
+                                    probe_workers=max(jobs, prefetch))
+        if work_queue is not None:
+            urls = expand_claims(urls, expander, work_queue)
+        elif total is None or any(expander.may_be_playlist(url) for url in urls):
+            # 展开后的数量事先未知；续传时按展开后的视频 URL 跳过已完成项
+            urls, total = expander.expand(urls), None
+    if journal and resume:
+        urls = resume_order(urls, journal, stats)
+    if job_order:
+        urls = job_order.order(urls)
+    if resume or dedup or archive is not None:
+        # 过滤后的数量事先未知
+        total = None
+
+    mode = f"并发: {jobs}"
+    if prefetch:
+        mode += f", 预提取: {prefetch}, 队列: {queue_depth}"
+    if pp_workers and ydl_opts.get('postprocessors'):
+        mode += f", 后处理进程: {pp_workers}"
+    if total is not None:
+        print(f"开始批量下载，共 {total} 个视频（{mode}）")
+    else:
+        print(f"开始批量下载，边读取边下载（{mode}）")
     print(f"输出目录: {output_dir}")
+    for steps in merged:
+        print(f"合并后处理: {' + '.join(steps)} → 一次 ffmpeg 调用")
     print("-" * 60)
 
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        for i, url in enumerate(urls, 1):
-            print(f"\n[{i}/{len(urls)}] 下载: {url}")
-
-            try:
-                ydl.download([url])
-                success_count += 1
-                print(f"✓ 成功")
-            except Exception as e:
-                fail_count += 1
-                print(f"✗ 失败: {e}")
+    if metrics and merged:
+        metrics.add_callback('rewrite_bytes_avoided_total', '合并后处理避免的整文件重写字节数',
+                             lambda: savings.bytes, type='counter')
+    pipeline = BatchPipeline(ydl_opts, jobs=jobs, prefetch=prefetch, queue_depth=queue_depth,
+                             journal=journal, dedup=dedup, cache=cache, scheduler=scheduler,
+                             retries=retries, retry_base=retry_base, metrics=metrics, stats=stats,
+                             pp_workers=pp_workers, pp_queue=pp_queue, archive=archive,
+                             work_queue=work_queue, job_order=job_order,
+                             resolved=expander.take if expander else None)
+    startup_profile.mark('开始派发')
+    try:
+        pipeline.run(urls, total)
+    finally:
+        if expander:
+            expander.close()
 
     print("\n" + "=" * 60)
-    print(f"下载完成！成功: {success_count}, 失败: {fail_count}")
+    print(f"下载{'中断' if pipeline.interrupted else '完成'}！{stats.summary()}")
+    for line in pipeline.stage_report():
+        print(line)
+    if merged:
+        print(savings.report())
+    if expander and (expander.playlists or expander.probed):
+        print(expander.report())
+    if dedup:
+        print(dedup.report())
+    if archive is not None:
+        print(f"下载存档: 派发前跳过 {pipeline.archive_skipped} 个已下载的视频")
+    if cache:
+        print(f"信息缓存: 命中 {cache.hits}, 未命中 {cache.misses}")
+    if work_queue is not None:
+        print(work_queue.report())
+    if job_order and (job_order.policy != 'fifo' or job_order.priorities):
+        print(job_order.report())
+    return stats
 
 
 def main():
@@ -86,6 +225,61 @@ def main():
   # 使用特定格式
   python batch_download.py -f urls.txt -f "bestvideo+bestaudio"
 
+  # 不高于 1080p 的最佳画质
+  python batch_download.py -f urls.txt --max-height 1080
+
+  # 4 个并发 worker
+  python batch_download.py -f urls.txt -j 4
+
+  # 8 个 worker 预提取元数据，4 个 worker 下载
+  python batch_download.py -f urls.txt --prefetch 8 -j 4
+
+  # 短视频优先：预提取 64 个，下载 worker 每次挑选其中最小的
+  python batch_download.py -f urls.txt --prefetch 8 --queue-depth 64 -j 4 --schedule sjf
+
+  # 提取音频，转码在 4 个独立进程中进行，下载不等待转码
+  python batch_download.py -f urls.txt -j 4 -x --pp-workers 4
+
+  # 嵌入字幕和元数据，并转为 mkv（三步合并为一次 ffmpeg 调用）
+  python batch_download.py -f urls.txt --write-subs --embed-subs --embed-metadata --remux-video mkv
+
+  # HLS/DASH 每个视频 8 个分片并发下载，最多缓存 32 个待拼接分片
+  python batch_download.py -f urls.txt -N 8 --fragment-window 32
+
+  # 总速率不超过 20MB/s，小红书最多同时下载 2 个
+  python batch_download.py -f urls.txt -j 8 --global-rate 20M --site-limit xiaohongshu.com=2
+
+  # 临时性失败最多重试 5 次，首次等待 10 秒
+  python batch_download.py -f urls.txt --retries 5 --retry-delay 10
+
+  # 在 9100 端口提供 Prometheus 指标，并记录每个 URL 的分阶段耗时
+  python batch_download.py -f urls.txt -j 8 --metrics-port 9100 --trace trace.jsonl
+
+  # 每 15 秒写一次指标文件（node_exporter textfile collector）
+  python batch_download.py -f urls.txt --metrics-file /var/lib/node_exporter/ytdlp.prom --metrics-interval 15
+
+  # 复用 format-analyzer.py 已提取的信息
+  python batch_download.py -f urls.txt --info-cache
+
+  # 下载整个频道：边翻页边下载，已下载的视频在派发前跳过
+  python batch_download.py --download-archive archive.sqlite https://www.youtube.com/@xxx/videos
+
+  # 使用下载存档（SQLite），已下载的视频在派发前跳过，不发出网络请求
+  python batch_download.py -f urls.txt --download-archive archive.sqlite
+
+  # 进程中断后继续（跳过已完成的 URL）
+  python batch_download.py -f urls.txt --resume
+
+  # 多台机器处理同一个列表：第一台填充共享队列，其余直接加入
+  python batch_download.py -f urls.txt --queue /mnt/shared/queue.sqlite --download-archive /mnt/shared/archive.sqlite
+  python batch_download.py --queue /mnt/shared/queue.sqlite --download-archive /mnt/shared/archive.sqlite
+
+  # 从其他程序的输出读取（边读边下载）
+  producer | python batch_download.py -f -
+
+  # 持续跟随追加写入的 URL 文件
+  python batch_download.py -f urls.txt --follow
+
   # 直接提供 URL
   python batch_download.py https://www.youtube.com/watch?v=xxx https://www.youtube.com/watch?v=yyy
 
@@ -99,7 +293,13 @@ URL 文件格式:
 
     parser.add_argument(
         '-f', '--file',
-        help='包含 URL 列表的文件'
+        help='包含 URL 列表的文件，"-" 表示从标准输入读取'
+    )
+
+    parser.add_argument(
+        '--follow',
+        action='store_true',
+        help='读到文件末尾后继续等待新追加的 URL（类似 tail -f，按 Ctrl-C 结束）'
     )
 
     parser.add_argument(
@@ -113,6 +313,13 @@ URL 文件格式:
         help='视频格式选择 (例如: bestvideo+bestaudio)'
     )
 
+    parser.add_argument(
+        '--max-height',
+        type=int,
+        metavar='H',
+        help='选择不高于 H 的最佳视频 + 最佳兼容音频（不能与 -F、-x 同时使用）'
+    )
+
     parser.add_argument(
         '-x', '--extract-audio',
         action='store_true',
@@ -143,11 +350,230 @@ URL 文件格式:
         help='嵌入元数据'
     )
 
+    parser.add_argument(
+        '--remux-video',
+        metavar='FORMAT',
+        help='不重新编码，转换为其他容器格式，例如 mkv 或 "webm>webm/mkv"'
+    )
+
+    parser.add_argument(
+        '--no-merge-pp',
+        action='store_true',
+        help='不合并后处理步骤：换容器、嵌入字幕、嵌入元数据各自重写一遍文件'
+    )
+
+    parser.add_argument(
+        '--pp-workers',
+        type=int,
+        default=None,
+        metavar='N',
+        help='后处理（-x、--embed-subs、--embed-metadata）进程数，0 表示在下载 worker 中执行 (默认: CPU 核数)'
+    )
+
+    parser.add_argument(
+        '--pp-queue',
+        type=int,
+        metavar='N',
+        help='已下载、等待后处理的文件数上限，达到上限时下载暂停 (默认: 进程数的 2 倍)'
+    )
+
     parser.add_argument(
         '--playlist-items',
         help='播放列表项范围 (例如: 1-5,10)'
     )
 
+    parser.add_argument(
+        '--no-expand-playlists',
+        action='store_true',
+        help='不展开播放列表/频道，整个交给 yt-dlp 下载（先解析全部条目再开始下载）'
+    )
+
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=1,
+        help='并发下载数，每个 worker 使用独立的 YoutubeDL 实例 (默认: 1)'
+    )
+
+    parser.add_argument(
+        '--prefetch',
+        type=int,
+        default=0,
+        metavar='N',
+        help='预提取 worker 数：提前解析元数据，与下载并行进行 (默认: 0，不拆分)'
+    )
+
+    parser.add_argument(
+        '--queue-depth',
+        type=int,
+        default=16,
+        help='已提取、等待下载的视频数上限 (默认: 16)'
+    )
+
+    parser.add_argument(
+        '--schedule',
+        choices=POLICIES,
+        default='fifo',
+        help='处理顺序: fifo 按文件顺序，sjf 预计大小最小的优先，fair 各站点轮流 (默认: fifo)。'
+             '按大小排序需要元数据：配合 --prefetch 时下载 worker 从已提取的队列中挑选，'
+             '派发前只能使用 --info-cache 中的信息。URL 文件中 "URL priority=N" 标记的优先级总是先生效'
+    )
+
+    parser.add_argument(
+        '--lookahead',
+        type=int,
+        default=DEFAULT_LOOKAHEAD,
+        metavar='N',
+        help=f'派发前预读并重新排序的 URL 数，优先级标记和 --schedule 只在这个范围内调整派发顺序；'
+             f'0 表示不预读。--follow 和 --queue 模式下不预读 (默认: {DEFAULT_LOOKAHEAD})'
+    )
+
+    parser.add_argument(
+        '-N', '--concurrent-fragments',
+        type=int,
+        default=1,
+        metavar='N',
+        help='HLS/DASH 视频的分片并发下载数，分片按顺序拼接到输出文件 (默认: 1)'
+    )
+
+    parser.add_argument(
+        '--fragment-window',
+        type=int,
+        metavar='W',
+        help='每个视频最多同时持有的分片数（下载中 + 等待拼接），默认为 -N 的 4 倍'
+    )
+
+    parser.add_argument(
+        '--no-fragment-resume',
+        action='store_true',
+        help='不从上次中断的分片继续，重新下载未完成的文件（默认按分片断点续传）'
+    )
+
+    parser.add_argument(
+        '--global-rate',
+        metavar='RATE',
+        help='所有 worker 合计的最大下载速率，例如 50M 或 800K (字节/秒)'
+    )
+
+    parser.add_argument(
+        '--site-limit',
+        action='append',
+        metavar='DOMAIN=N',
+        help='某个站点（含子域名）同时下载的最大数量，可重复指定，例如 xiaohongshu.com=2'
+    )
+
+    parser.add_argument(
+        '--retries',
+        type=int,
+        default=3,
+        help='临时性失败（限流、服务器错误、超时）的重试次数，地区限制等永久性失败不重试 (默认: 3)'
+    )
+
+    parser.add_argument(
+        '--retry-delay',
+        type=float,
+        default=2.0,
+        metavar='SECONDS',
+        help='首次重试前的等待时间，之后按指数退避递增 (默认: 2)'
+    )
+
+    parser.add_argument(
+        '--info-cache',
+        nargs='?',
+        const='',
+        metavar='DIR',
+        help='复用 format-analyzer.py 的 info_dict 缓存 (默认目录: ~/.cache/yt-dlp-skill/info)'
+    )
+
+    parser.add_argument(
+        '--cache-ttl',
+        type=int,
+        default=DEFAULT_TTL,
+        help=f'信息缓存有效期，秒 (默认: {DEFAULT_TTL})'
+    )
+
+    parser.add_argument(
+        '--metrics-port',
+        type=int,
+        metavar='PORT',
+        help='在 127.0.0.1:PORT/metrics 提供 Prometheus 文本格式的指标'
+    )
+
+    parser.add_argument(
+        '--metrics-file',
+        metavar='PATH',
+        help='定期把指标写入该文件（Prometheus 文本格式，原子替换）'
+    )
+
+    parser.add_argument(
+        '--metrics-interval',
+        type=float,
+        default=10.0,
+        metavar='SECONDS',
+        help='指标文件的写入间隔 (默认: 10)'
+    )
+
+    parser.add_argument(
+        '--trace',
+        metavar='PATH',
+        help='每个 URL 结束时追加一行 JSON：提取、格式选择、传输、合并、后处理各阶段耗时'
+    )
+
+    parser.add_argument(
+        '--journal',
+        help='任务日志文件 (默认: <输出目录>/.batch-journal.jsonl)'
+    )
+
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='根据任务日志跳过已完成的 URL，并重新拾起中断的任务'
+    )
+
+    parser.add_argument(
+        '--queue',
+        metavar='PATH',
+        help='多节点共享任务队列（SQLite 文件，可放在共享卷上）。'
+             '提供的 URL 先加入队列，各节点从队列领取，互不重复；节点退出后其任务由其他节点接手'
+    )
+
+    parser.add_argument(
+        '--node-id',
+        help='本节点在队列中的标识 (默认: 主机名-进程号)'
+    )
+
+    parser.add_argument(
+        '--lease',
+        type=float,
+        default=120.0,
+        metavar='SECONDS',
+        help='队列任务的租约时长：节点失联超过该时间后，其任务由其他节点接手 (默认: 120)'
+    )
+
+    parser.add_argument(
+        '--download-archive',
+        metavar='PATH',
+        help='下载存档：记录已下载视频的 "提取器 ID"，再次运行时跳过。'
+             '.sqlite/.db 结尾为 SQLite 索引，否则为 yt-dlp 纯文本格式（可与原生 yt-dlp 共用）'
+    )
+
+    parser.add_argument(
+        '--dedup-index',
+        help='去重索引文件 (默认: <输出目录>/.dedup-index.txt)'
+    )
+
+    parser.add_argument(
+        '--no-dedup',
+        action='store_true',
+        help='不做 URL 去重'
+    )
+
+    parser.add_argument(
+        '--profile-startup',
+        action='store_true',
+        help='退出时在 stderr 输出启动各阶段耗时（导入 yt-dlp、预加载提取器、开始派发等）'
+    )
+
     parser.add_argument(
         'urls',
         nargs='*',
@@ -155,20 +581,61 @@ URL 文件格式:
     )
 
     args = parser.parse_args()
-
-    # 收集 URL
-    urls = []
+    if args.profile_startup:
+        startup_profile.enable()
+    startup_profile.mark('参数解析完成')
+
+    if args.jobs < 1:
+        parser.error('--jobs 必须大于等于 1')
+    if args.prefetch < 0 or args.queue_depth < 1:
+        parser.error('--prefetch 不能为负数，--queue-depth 必须大于等于 1')
+    if args.retries < 0 or args.retry_delay < 0:
+        parser.error('--retries 和 --retry-delay 不能为负数')
+    if args.concurrent_fragments < 1 or (args.fragment_window is not None and args.fragment_window < 1):
+        parser.error('--concurrent-fragments 和 --fragment-window 必须大于等于 1')
+    if (args.pp_workers is not None and args.pp_workers < 0) or (args.pp_queue is not None and args.pp_queue < 1):
+        parser.error('--pp-workers 不能为负数，--pp-queue 必须大于等于 1')
+    if args.metrics_interval <= 0:
+        parser.error('--metrics-interval 必须大于 0')
+    if args.max_height and args.format:
+        parser.error('--max-height 不能与 -F 同时使用')
+    if args.max_height and args.extract_audio:
+        parser.error('--max-height 不能与 -x 同时使用（只提取音频时不选择视频）')
+
+    # 后台导入 yt-dlp 并加载命令行 URL 对应的提取器，同时读取日志、去重索引等
+    preload(yt_dlp, args.urls)
+
+    scheduler = None
+    if args.global_rate or args.site_limit:
+        rate = None
+        if args.global_rate:
+            rate = yt_dlp.utils.parse_bytes(args.global_rate)
+            if not rate:
+                parser.error(f'无法解析速率: {args.global_rate}')
+        try:
+            scheduler = RateScheduler(rate, parse_site_limits(args.site_limit))
+        except ValueError as e:
+            parser.error(str(e))
+
+    if args.follow and not args.file:
+        parser.error('--follow 需要配合 -f 使用')
+    if args.queue and (args.follow or args.resume):
+        parser.error('--queue 不能与 --follow 或 --resume 同时使用（进度由队列记录）')
+    if args.lease <= 0:
+        parser.error('--lease 必须大于 0')
+    if args.lookahead < 0:
+        parser.error('--lookahead 不能为负数')
+
+    # 收集 URL：命令行 URL 直接使用，文件/标准输入边读边下载
+    urls = list(args.urls)
+    priorities = {}
 
     if args.file:
-        if not Path(args.file).exists():
+        if args.file != '-' and not Path(args.file).exists():
             print(f"错误: 文件不存在: {args.file}")
             sys.exit(1)
-        urls.extend(read_urls_from_file(args.file))
-
-    if args.urls:
-        urls.extend(args.urls)
-
-    if not urls:
+        urls = itertools.chain(iter_urls(args.file, follow=args.follow, priorities=priorities), urls)
+    elif not urls and not args.queue:
         print("错误: 没有提供 URL")
         print("请使用 -f 指定 URL 文件或直接提供 URL")
         sys.exit(1)
@@ -179,6 +646,9 @@ URL 文件格式:
     if args.format:
         options['format'] = args.format
 
+    if args.max_height:
+        options['format'] = max_height_selector(args.max_height)
+
     if args.extract_audio:
         options['format'] = 'bestaudio'
         options['postprocessors'] = [{
@@ -187,6 +657,13 @@ URL 文件格式:
             'preferredquality': '0',
         }]
 
+    if args.remux_video:
+        options['postprocessors'] = options.get('postprocessors', [])
+        options['postprocessors'].append({
+            'key': 'FFmpegVideoRemuxer',
+            'preferedformat': args.remux_video,
+        })
+
     if args.write_subs:
         options['writesubtitles'] = True
         options['subtitleslangs'] = ['en']
@@ -206,11 +683,82 @@ URL 文件格式:
     if args.playlist_items:
         options['playlist_items'] = args.playlist_items
 
+    if args.concurrent_fragments > 1:
+        options['concurrent_fragment_downloads'] = args.concurrent_fragments
+        if args.fragment_window:
+            options['fragment_window'] = args.fragment_window
+
+    if args.no_fragment_resume:
+        options['continuedl'] = False
+
     # 创建输出目录
     Path(args.output_dir).mkdir(parents=True, exist_ok=True)
 
+    work_queue = None
+    journal_path = args.journal or Path(args.output_dir) / '.batch-journal.jsonl'
+    if args.queue:
+        from work_queue import SqliteWorkQueue
+        work_queue = SqliteWorkQueue(args.queue, args.node_id, lease=args.lease)
+        if not args.journal:
+            # 多个节点可能共用输出目录，各自写自己的日志
+            journal_path = Path(args.output_dir) / f'.batch-journal-{work_queue.node_id}.jsonl'
+    journal = BatchJournal(journal_path)
+    if args.resume:
+        journal.load()
+
+    dedup = None
+    if not args.no_dedup:
+        dedup = DedupIndex(args.dedup_index or Path(args.output_dir) / '.dedup-index.txt')
+
+    cache = None
+    if args.info_cache is not None:
+        cache = InfoCache(args.info_cache or None, ttl=args.cache_ttl)
+
+    metrics = None
+    exporters = []
+    if args.metrics_port is not None or args.metrics_file or args.trace:
+        metrics = BatchMetrics(args.trace)
+        if args.metrics_port is not None:
+            server = MetricsServer(metrics, args.metrics_port).start()
+            exporters.append(server)
+            print(f"指标地址: {server.address}")
+        if args.metrics_file:
+            exporters.append(MetricsFileWriter(metrics, args.metrics_file, args.metrics_interval).start())
+
+    # 跟随文件时预读会等待新行；队列模式下预读会提前领取其他节点可以处理的 URL
+    lookahead = 0 if args.follow or args.queue else args.lookahead
+    job_order = JobOrder(args.schedule, priorities, cache, lookahead)
+
+    # 以下模块依赖 yt-dlp：先等待后台线程导入完成（yt-dlp 不能由两个线程同时导入）
+    yt_dlp.load()
+    from download_archive import open_archive
+    from fragment_window import TESTED_YTDLP_VERSION, enable_windowed_fragments
+
+    if args.concurrent_fragments > 1 and not enable_windowed_fragments():
+        print(f"⚠ 已安装的 yt-dlp 与有界窗口分片下载不兼容（验证版本 {TESTED_YTDLP_VERSION}），"
+              f"使用 yt-dlp 自带的并发分片下载")
+
+    archive = None
+    if args.download_archive:
+        archive = open_archive(args.download_archive)
+
     # 开始下载
-    batch_download(urls, args.output_dir, options)
+    try:
+        with journal, (dedup or contextlib.nullcontext()), (work_queue or contextlib.nullcontext()):
+            batch_download(urls, args.output_dir, options, jobs=args.jobs, journal=journal, resume=args.resume,
+                           dedup=dedup, prefetch=args.prefetch, queue_depth=args.queue_depth, cache=cache,
+                           scheduler=scheduler, retries=args.retries, retry_base=args.retry_delay,
+                           metrics=metrics, pp_workers=args.pp_workers, pp_queue=args.pp_queue,
+                           merge_pp=not args.no_merge_pp, archive=archive,
+                           expand_playlists=not args.no_expand_playlists, work_queue=work_queue,
+                           job_order=job_order)
+    finally:
+        if archive is not None:
+            archive.close()
+        for exporter in exporters:
+            exporter.stop()
+        if metrics:
+            metrics.close()
 
 
 if __name__ == '__main__':
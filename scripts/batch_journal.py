@@ -0,0 +1,100 @@
+"""
+批量下载任务日志
+
+以追加写入的 JSONL 文件记录每个 URL 的状态，进程被杀掉后可以从日志恢复，
+跳过已完成的 URL，并重新拾起中断时正在处理的 URL。
+
+每行一条记录:
+  {"url": "...", "state": "done", "ts": 1700000000.0, "bytes": 1048576}
+"""
+
+import json
+import threading
+import time
+from pathlib import Path
+
+PENDING = 'pending'
+EXTRACTING = 'extracting'
+DOWNLOADING = 'downloading'
+POSTPROCESSING = 'postprocessing'
+DONE = 'done'
+FAILED = 'failed'
+
+STATES = (PENDING, EXTRACTING, DOWNLOADING, POSTPROCESSING, DONE, FAILED)
+IN_FLIGHT = (EXTRACTING, DOWNLOADING, POSTPROCESSING)
+
+
+class BatchJournal:
+    """
+    追加写入的任务日志（线程安全）
+
+    内存中只保存 load() 读入的历史状态，本次运行的记录只写入文件，
+    因此处理超长 URL 列表时内存占用不随列表增长。
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._states = {}
+        self._file = None
+
+    def load(self):
+        """回放日志，得到每个 URL 的最新状态"""
+        if not self.path.exists():
+            return self
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 进程被杀时最后一行可能只写了一半
+                    continue
+                self._states[record['url']] = record
+        return self
+
+    def open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        return self
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def state(self, url):
+        """上次运行结束时该 URL 的状态"""
+        record = self._states.get(url)
+        return record['state'] if record else None
+
+    def is_done(self, url):
+        return self.state(url) == DONE
+
+    def in_flight(self):
+        """上次运行中断时仍在处理的 URL"""
+        return [url for url, record in self._states.items() if record['state'] in IN_FLIGHT]
+
+    def record(self, url, state, reason=None, nbytes=None):
+        assert state in STATES, state
+        record = {'url': url, 'state': state, 'ts': round(time.time(), 3)}
+        if reason is not None:
+            record['reason'] = str(reason)
+        if nbytes is not None:
+            record['bytes'] = nbytes
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            if self._file:
+                self._file.write(line)
+                self._file.flush()
+
+    def counts(self):
+        result = dict.fromkeys(STATES, 0)
+        for record in self._states.values():
+            result[record['state']] += 1
+        return result
@@ -0,0 +1,406 @@
+"""
+批量下载的指标与追踪
+
+- MetricsRegistry: 计数器、仪表、直方图，输出 Prometheus 文本格式
+- ItemTrace: 单个 URL 的分段计时（extract、format_select、transfer、merge、
+  postprocess:<名称>），同名分段的耗时累加（例如多个文件的 transfer）
+- BatchMetrics: 把 yt-dlp 的 progress_hooks / postprocessor_hooks 接到上面两者，
+  由 BatchPipeline 调用；transfer 分段由 BatchPipeline 的 YoutubeDL 子类在
+  dl() 前后标记，分片并发下载时同样有效
+- 导出：HTTP 端点（/metrics）或定期写入的指标文件（可配合 node_exporter 的
+  textfile collector），以及每个 URL 一行的 JSONL 追踪文件
+"""
+
+import json
+import math
+import os
+import threading
+import time
+
+PREFIX = 'ytdlp_batch_'
+
+# 秒
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+# 字节
+SIZE_BUCKETS = tuple(2 ** n for n in range(16, 36, 2))
+# 字节/秒
+SPEED_BUCKETS = tuple(2 ** n for n in range(14, 32, 2))
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels) + '}'
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple((name, labels.get(name, '')) for name in self.labelnames)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class CallbackGauge(_Metric):
+    """在输出时调用 fn 取值；fn 返回数值，或 {标签值元组: 数值}"""
+
+    def __init__(self, name, help_text, fn, labelnames=(), type='gauge'):
+        super().__init__(name, help_text, labelnames)
+        self.fn = fn
+        self.type = type
+
+    def samples(self):
+        value = self.fn()
+        if not isinstance(value, dict):
+            return [(self.name, (), value)]
+        return [(self.name, tuple(zip(self.labelnames, key)), v) for key, v in value.items()]
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help_text, buckets, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # [各桶计数..., 总和]
+                counts = self._values[key] = [0] * len(self.buckets) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            counts[-1] += value
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            items = [(key, list(counts)) for key, counts in self._values.items()]
+        for key, counts in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                samples.append((f'{self.name}_bucket', key + (('le', _format_value(bound)),), cumulative))
+            samples.append((f'{self.name}_sum', key, counts[-1]))
+            samples.append((f'{self.name}_count', key, cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    """指标注册表，render() 输出 Prometheus 文本格式"""
+
+    def __init__(self, prefix=PREFIX):
+        self.prefix = prefix
+        self._metrics = []
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(self.prefix + name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._register(Gauge(self.prefix + name, help_text, labelnames))
+
+    def histogram(self, name, help_text, buckets, labelnames=()):
+        return self._register(Histogram(self.prefix + name, help_text, buckets, labelnames))
+
+    def callback(self, name, help_text, fn, labelnames=(), type='gauge'):
+        return self._register(CallbackGauge(self.prefix + name, help_text, fn, labelnames, type))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class ItemTrace:
+    """
+    单个 URL 的分段计时
+
+    同一时刻最多一个打开的分段；switch() 结束当前分段并开始新的分段。
+    一个任务同一时刻只在一个线程中处理，不需要加锁。
+    """
+
+    __slots__ = ('url', 'started', 'wall_started', 'spans', '_open', 'on_span')
+
+    def __init__(self, url, on_span=None):
+        self.url = url
+        self.started = time.monotonic()
+        self.wall_started = time.time()
+        self.spans = []
+        self._open = None
+        self.on_span = on_span
+
+    @property
+    def current(self):
+        return self._open[0] if self._open else None
+
+    def switch(self, name):
+        self.stop()
+        self._open = (name, time.monotonic())
+
+    def stop(self):
+        if self._open is None:
+            return
+        name, start = self._open
+        self._open = None
+        duration = time.monotonic() - start
+        self.spans.append((name, start - self.started, duration))
+        if self.on_span:
+            self.on_span(name, duration)
+
+    def add(self, name, wall_start, duration):
+        """记录在其他进程中测得的分段（按墙上时间换算偏移）"""
+        self.spans.append((name, wall_start - self.wall_started, duration))
+        if self.on_span:
+            self.on_span(name, duration)
+
+    def record(self, outcome, **extra):
+        return {
+            'url': self.url,
+            'outcome': outcome,
+            'start': round(self.wall_started, 3),
+            'duration': round(time.monotonic() - self.started, 4),
+            'spans': [{'name': n, 'offset': round(o, 4), 'duration': round(d, 4)} for n, o, d in self.spans],
+            **extra,
+        }
+
+
+class BatchMetrics:
+    """
+    批量下载的指标采集
+
+    Args:
+        trace_path: 每个 URL 完成时向该文件追加一行 JSON 追踪记录（可选）
+    """
+
+    def __init__(self, trace_path=None):
+        self.registry = registry = MetricsRegistry()
+        self.items = registry.counter('items_total', '已结束的 URL 数', ('outcome',))
+        self.failures = registry.counter('failures_total', '按类型统计的失败数', ('kind',))
+        self.retries = registry.counter('retries_total', '临时性失败的重试次数')
+        self.bytes = registry.counter('bytes_total', '已下载的字节数')
+        self.active = registry.gauge('active_items', '已派发、尚未结束的 URL 数')
+        self.item_seconds = registry.histogram('item_duration_seconds', '单个 URL 从派发到结束的耗时',
+                                               DURATION_BUCKETS, ('outcome',))
+        self.stage_seconds = registry.histogram('stage_duration_seconds', '各处理阶段的耗时',
+                                                DURATION_BUCKETS, ('stage',))
+        self.file_bytes = registry.histogram('file_size_bytes', '单个下载文件的大小', SIZE_BUCKETS)
+        self.file_speed = registry.histogram('file_speed_bytes_per_second', '单个文件的平均下载速度',
+                                             SPEED_BUCKETS)
+        registry.callback('download_speed_bytes_per_second', '所有 worker 当前的下载速度之和',
+                          self._current_speed)
+        registry.callback('start_time_seconds', '开始时间（Unix 时间戳）', lambda: self.start_time)
+
+        self.start_time = time.time()
+        self._local = threading.local()
+        # {文件名: (已下载字节数, 当前速度)}
+        self._files = {}
+        self._files_lock = threading.Lock()
+        self._trace_file = open(trace_path, 'a', encoding='utf-8') if trace_path else None
+        self._trace_lock = threading.Lock()
+
+    def add_callback(self, name, help_text, fn, labelnames=(), type='gauge'):
+        """注册在输出时取值的指标，例如队列深度"""
+        self.registry.callback(name, help_text, fn, labelnames, type)
+
+    def new_trace(self, url):
+        return ItemTrace(url, on_span=self._observe_span)
+
+    def _observe_span(self, name, duration):
+        self.stage_seconds.observe(duration, stage=name)
+
+    def _current_speed(self):
+        with self._files_lock:
+            return sum(speed for _, speed in self._files.values())
+
+    def bind(self, trace):
+        """把当前线程接下来的 yt-dlp 回调归到 trace 上"""
+        self._local.trace = trace
+
+    def unbind(self):
+        self._local.trace = None
+
+    def progress_hook(self, d):
+        # 分片并发下载时回调来自多个线程，按文件而不是按线程计算增量
+        filename = d.get('filename') or d.get('tmpfilename')
+        status = d['status']
+        if status == 'downloading':
+            downloaded = d.get('downloaded_bytes') or 0
+            with self._files_lock:
+                last, _ = self._files.get(filename, (0, 0))
+                self._files[filename] = (max(last, downloaded), d.get('speed') or 0)
+            if downloaded > last:
+                self.bytes.inc(downloaded - last)
+        elif status == 'finished':
+            with self._files_lock:
+                self._files.pop(filename, None)
+            total = d.get('total_bytes') or d.get('downloaded_bytes')
+            if total:
+                self.file_bytes.observe(total)
+                elapsed = d.get('elapsed')
+                if elapsed:
+                    self.file_speed.observe(total / elapsed)
+
+    def forget(self, filenames):
+        """任务结束时清除其文件的进度记录（下载失败或中断时不会收到 finished）"""
+        with self._files_lock:
+            for filename in filenames:
+                self._files.pop(filename, None)
+
+    def postprocessor_hook(self, d):
+        trace = getattr(self._local, 'trace', None)
+        if trace is None:
+            return
+        if d['status'] == 'started':
+            pp = d.get('postprocessor')
+            trace.switch('merge' if pp == 'Merger' else f'postprocess:{pp}')
+        elif d['status'] == 'finished':
+            trace.stop()
+
+    def finish(self, trace, outcome, **extra):
+        """记录一个 URL 的最终结果"""
+        trace.stop()
+        self.items.inc(outcome=outcome)
+        self.item_seconds.observe(time.monotonic() - trace.started, outcome=outcome)
+        if self._trace_file:
+            line = json.dumps(trace.record(outcome, **extra), ensure_ascii=False)
+            with self._trace_lock:
+                self._trace_file.write(line + '\n')
+                self._trace_file.flush()
+
+    def render(self):
+        return self.registry.render()
+
+    def close(self):
+        if self._trace_file:
+            self._trace_file.close()
+            self._trace_file = None
+
+
+class MetricsServer:
+    """在后台线程中提供 GET /metrics"""
+
+    def __init__(self, metrics, port, host='127.0.0.1'):
+        # http.server 连带导入 email、http.client 等模块，只在需要时导入
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name='metrics-http', daemon=True)
+
+    @property
+    def address(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/metrics'
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class MetricsFileWriter:
+    """每隔 interval 秒把指标原子地写入文件，stop() 时再写一次"""
+
+    def __init__(self, metrics, path, interval=10.0):
+        self.metrics = metrics
+        self.path = str(path)
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='metrics-file', daemon=True)
+
+    def flush(self):
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(self.metrics.render())
+        os.replace(tmp, self.path)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def start(self):
+        self.flush()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.flush()
@@ -0,0 +1,684 @@
+"""
+批量下载流水线
+
+batch-download.py 的执行核心。两种模式:
+
+- 单阶段（prefetch=0）: jobs 个 worker，每个 URL 在同一个 worker 中依次完成
+  提取和下载（ydl.download）。
+- 两阶段（prefetch>0）: prefetch 个提取 worker 提前调用
+  extract_info(download=False)，把解析好的 info_dict 放进有界队列；jobs 个下载
+  worker 从队列中取出并调用 process_ie_result(download=True)。提取延迟和传输
+  时间相互重叠，队列深度限制了内存占用。
+
+配置了 pp_workers 时，FFmpeg 后处理器移到独立的进程池（postprocess_stage），
+下载完成的文件排队等待转码，下载 worker 立即开始下一个下载。
+
+各阶段之间都是有界队列，下游跟不上时上游阻塞；阻塞时间作为各阶段的背压
+指标，见 stage_report()。
+
+每个 worker 线程持有自己的 YoutubeDL 实例。失败按 retry_policy 分类，
+临时性失败按指数退避延迟后重新派发。
+"""
+
+import collections
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import yt_dlp
+
+from batch_journal import DONE, DOWNLOADING, EXTRACTING, FAILED, PENDING, POSTPROCESSING
+from connection_pool import ConnectionPool
+from postprocess_stage import HandoffPP, PostprocessStage
+from retry_policy import KIND_LABELS, TRANSIENT, DelayedQueue, backoff_delay, classify_failure
+from url_dedup import ExtractorMatcher
+
+
+class BatchStats:
+    """批量下载统计，多个 worker 共享（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.success = 0
+        self.failed = 0
+        self.incomplete = 0
+        self.skipped = 0
+        self.retries = 0
+        self.failure_kinds = collections.Counter()
+        self.seen = 0
+
+    def record(self, outcome, count=1, kind=None):
+        with self._lock:
+            if outcome == 'success':
+                self.success += count
+            elif outcome == 'failed':
+                self.failed += count
+                if kind:
+                    self.failure_kinds[kind] += count
+            elif outcome == 'skipped':
+                self.skipped += count
+            elif outcome == 'retry':
+                self.retries += count
+            else:
+                self.incomplete += count
+
+    @property
+    def finished(self):
+        return self.success + self.failed + self.incomplete
+
+    def summary(self):
+        text = f"成功: {self.success}, 失败: {self.failed}"
+        if self.failure_kinds:
+            kinds = ', '.join(f"{KIND_LABELS[k]} {n}" for k, n in self.failure_kinds.most_common())
+            text += f" ({kinds})"
+        if self.incomplete:
+            text += f", 未完成: {self.incomplete}"
+        if self.skipped:
+            text += f", 跳过: {self.skipped}"
+        if self.retries:
+            text += f", 重试: {self.retries} 次"
+        return text
+
+
+def make_abort_hook(abort_event):
+    """进度钩子：收到强制退出信号后中断正在进行的下载"""
+    def hook(d):
+        if abort_event.is_set():
+            raise yt_dlp.utils.DownloadCancelled('用户中断')
+    return hook
+
+
+class TrackingYoutubeDL(yt_dlp.YoutubeDL):
+    """
+    记录错误的 YoutubeDL
+
+    ignoreerrors 模式下 yt-dlp 只打印错误、不抛出异常，download() 的返回码
+    也会在同一实例上一直保持为 1。这里在 trouble() 中记下每条错误及当时的
+    异常，调用方在每个任务前清空 errors，任务后检查即可得到准确结果。
+
+    设置了 trace（batch_metrics.ItemTrace）时，同时标记格式选择和传输阶段的起止。
+
+    result_type 记录任务的结果类型（video、playlist 等，跳转结果不计），
+    filenames 记录任务下载过的文件名，同样由调用方在每个任务前清空。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.errors = []
+        self.trace = None
+        self.result_type = None
+        self.filenames = []
+
+    def process_ie_result(self, ie_result, download=True, extra_info=None):
+        # url/url_transparent 会再次进入这里，记录第一个实际结果的类型
+        if self.result_type is None and ie_result.get('_type') not in ('url', 'url_transparent'):
+            self.result_type = ie_result.get('_type', 'video')
+        return super().process_ie_result(ie_result, download, extra_info)
+
+    def trouble(self, message=None, tb=None, is_error=True):
+        if is_error:
+            self.errors.append((message, sys.exc_info()[1]))
+        return super().trouble(message, tb, is_error)
+
+    def process_video_result(self, info_dict, download=True):
+        if self.trace:
+            self.trace.switch('format_select')
+        return super().process_video_result(info_dict, download)
+
+    def process_info(self, info_dict):
+        if self.trace and self.trace.current == 'format_select':
+            self.trace.stop()
+        return super().process_info(info_dict)
+
+    def dl(self, name, info, subtitle=False, test=False):
+        if not test:
+            self.filenames.append(name)
+        if not self.trace or test:
+            return super().dl(name, info, subtitle, test)
+        # 在调用线程上标记，分片由其他线程下载时也能得到完整的传输耗时
+        self.trace.switch('subtitles' if subtitle else 'transfer')
+        try:
+            return super().dl(name, info, subtitle, test)
+        finally:
+            self.trace.stop()
+
+    def last_error(self):
+        """最近一条错误：优先返回异常对象，便于按类型分类"""
+        message, exc = self.errors[-1]
+        return exc if exc is not None else message
+
+
+class Job:
+    """一个 URL 的处理任务"""
+
+    __slots__ = ('i', 'url', 'key', 'attempt', 'trace')
+
+    def __init__(self, i, url, key=None, attempt=0, trace=None):
+        self.i = i
+        self.url = url
+        self.key = key
+        self.attempt = attempt
+        self.trace = trace
+
+
+class BatchPipeline:
+    """
+    批量下载流水线
+
+    Args:
+        ydl_opts: yt-dlp 选项，每个 worker 用它创建自己的 YoutubeDL
+        jobs: 下载 worker 数
+        prefetch: 提取 worker 数，0 表示不拆分提取和下载
+        queue_depth: 两阶段模式下已提取、待下载的 info_dict 队列上限
+        journal: 已打开的 BatchJournal（可选）
+        dedup: 已打开的 DedupIndex（可选）
+        archive: 下载存档（download_archive.open_archive），能从 URL 推导出 ID 的
+            已下载项在派发前跳过，不发出网络请求（可选）
+        cache: InfoCache，命中时跳过提取直接下载（可选）
+        scheduler: RateScheduler，全局带宽和站点并发限制（可选）
+        pool: ConnectionPool，默认新建，所有 worker 共享连接
+        retries: 临时性失败的最大重试次数
+        retry_base: 首次重试的基准等待时间（秒），之后每次翻倍
+        metrics: BatchMetrics，记录各阶段耗时、字节数、队列深度等（可选）
+        stats: BatchStats，默认新建
+        pp_workers: 后处理进程数，0 表示在下载 worker 中执行后处理器
+        pp_queue: 等待后处理的文件数上限，默认为进程数的 2 倍
+        work_queue: 多节点共享的任务队列（work_queue.SqliteWorkQueue），URL 的最终
+            结果和派发前的跳过都回报给它（可选）
+        job_order: JobOrder，两阶段模式下按其策略（最短优先、站点轮流、优先级）
+            从待下载队列中挑选，默认先进先出（可选）
+        resolved: resolved(url) 返回派发前已提取、尚未经过格式选择的信息
+            （playlist_expander 判断类型时得到），命中时不再重复提取（可选）
+    """
+
+    def __init__(self, ydl_opts, jobs=1, prefetch=0, queue_depth=16, journal=None, dedup=None, cache=None,
+                 scheduler=None, retries=3, retry_base=2.0, pool=None, metrics=None, stats=None,
+                 pp_workers=0, pp_queue=None, archive=None, work_queue=None, job_order=None, resolved=None):
+        self.jobs = jobs
+        self.prefetch = prefetch
+        self.queue_depth = queue_depth
+        self.journal = journal
+        self.dedup = dedup
+        self.archive = archive
+        self.archive_skipped = 0
+        self.work_queue = work_queue
+        self.job_order = job_order
+        self.resolved = resolved
+        self._matcher = dedup.matcher if dedup else None
+        self.cache = cache
+        self.scheduler = scheduler
+        self.retries = retries
+        self.retry_base = retry_base
+        self.metrics = metrics
+        self.stats = stats or BatchStats()
+        self._own_pool = pool is None
+        self.pool = pool or ConnectionPool(maxsize=max(jobs, prefetch))
+        self.total = None
+        self.interrupted = False
+        self.abort = threading.Event()
+        self._closing = False
+
+        self._local = threading.local()
+        self._instances = []
+        self._instances_lock = threading.Lock()
+        # 已派发但尚未得出最终结果的任务数（含等待重试的任务）
+        self._active = 0
+        self._active_cond = threading.Condition()
+        # 提取阶段因待下载队列已满而等待的秒数
+        self.extract_blocked = 0.0
+        self._blocked_lock = threading.Lock()
+
+        self.postprocess = None
+        if pp_workers and ydl_opts.get('postprocessors'):
+            self.postprocess = PostprocessStage(ydl_opts, pp_workers, pp_queue)
+            ydl_opts = PostprocessStage.download_opts(ydl_opts)
+
+        hooks = [*ydl_opts.get('progress_hooks', []), make_abort_hook(self.abort)]
+        if journal:
+            hooks.append(self._journal_hook)
+        if scheduler:
+            hooks.append(scheduler.progress_hook)
+        self.ydl_opts = {**ydl_opts, 'progress_hooks': hooks}
+        if archive is not None:
+            # yt-dlp 直接使用这个对象查询和记录，所有 worker 共享
+            self.ydl_opts['download_archive'] = archive
+        if metrics:
+            hooks.append(metrics.progress_hook)
+            self.ydl_opts['postprocessor_hooks'] = [
+                *ydl_opts.get('postprocessor_hooks', []), metrics.postprocessor_hook]
+
+    def _get_ydl(self):
+        ydl = getattr(self._local, 'ydl', None)
+        if ydl is None:
+            ydl = self.pool.attach(TrackingYoutubeDL(self.ydl_opts))
+            if self.postprocess:
+                ydl.add_post_processor(HandoffPP(self._handoff), when='after_move')
+            self._local.ydl = ydl
+            with self._instances_lock:
+                self._instances.append(ydl)
+        ydl.errors.clear()
+        ydl.result_type = None
+        ydl.filenames.clear()
+        return ydl
+
+    def _journal_hook(self, d):
+        job = getattr(self._local, 'job', None)
+        if job is None:
+            return
+        if d['status'] == 'downloading' and not job['downloading']:
+            job['downloading'] = True
+            self.journal.record(job['url'], DOWNLOADING)
+        elif d['status'] == 'finished':
+            job['bytes'] += d.get('total_bytes') or d.get('downloaded_bytes') or 0
+
+    def _handoff(self, info):
+        self._local.job['handoff'].append(info)
+
+    def progress(self, i):
+        if self.total is not None:
+            return f"{i}/{self.total}"
+        return f"完成 {self.stats.finished}/已读取 {self.stats.seen}"
+
+    def _settle(self, job, outcome, kind=None, reason=None):
+        """记录任务的最终结果"""
+        self.stats.record(outcome, kind=kind)
+        if self.work_queue:
+            self.work_queue.finish(job.url, outcome, reason)
+        if self.metrics:
+            self.metrics.active.dec()
+            extra = {'attempts': job.attempt + 1}
+            if kind:
+                self.metrics.failures.inc(kind=kind)
+                extra['kind'] = kind
+            self.metrics.finish(job.trace, outcome, **extra)
+        with self._active_cond:
+            self._active -= 1
+            self._active_cond.notify_all()
+
+    def _incomplete(self, job):
+        self._settle(job, 'incomplete')
+
+    def _fail(self, job, error, retry=True):
+        """失败处理：临时性失败在重试次数内延迟重试，其余记为失败"""
+        kind = classify_failure(error)
+        if retry and kind == TRANSIENT and job.attempt < self.retries and not self._stopping():
+            delay = backoff_delay(job.attempt, self.retry_base)
+            job.attempt += 1
+            self.stats.record('retry')
+            if self.metrics:
+                self.metrics.retries.inc()
+            if self.journal:
+                self.journal.record(job.url, PENDING, reason=f'retry {job.attempt}: {error}')
+            print(f"↻ 重试 ({job.attempt}/{self.retries}，{delay:.1f} 秒后): {job.url}: {error}")
+            self._retry_queue.schedule(delay, job)
+            return
+
+        if self.journal:
+            self.journal.record(job.url, FAILED, reason=f'{kind}: {error}')
+        print(f"✗ 失败 [{KIND_LABELS[kind]}]: {job.url}: {error}")
+        self._settle(job, 'failed', kind, reason=f'{kind}: {error}')
+
+    def _finish(self, job, action):
+        """执行下载动作并记录结果"""
+        if self.abort.is_set():
+            self._incomplete(job)
+            return
+        print(f"\n[{self.progress(job.i)}] 下载: {job.url}")
+
+        self._local.job = {'url': job.url, 'downloading': False, 'bytes': 0, 'handoff': []}
+        ydl = self._get_ydl()
+        self._bind(ydl, job)
+        try:
+            if self.scheduler:
+                if job.trace:
+                    job.trace.switch('slot_wait')
+                with self.scheduler.slot(job.url):
+                    if job.trace:
+                        job.trace.stop()
+                    action(ydl)
+            else:
+                action(ydl)
+        except yt_dlp.utils.DownloadCancelled:
+            # 日志中保留 extracting/downloading 状态，--resume 时重新拾起
+            print(f"✗ 未完成: {job.url}")
+            self._incomplete(job)
+        except Exception as e:
+            self._fail(job, e)
+        else:
+            if ydl.errors:
+                # ignoreerrors 模式下错误不会抛出
+                self._fail(job, ydl.last_error())
+                return
+            single = ydl.result_type == 'video'
+            if self._local.job['handoff']:
+                self._postprocess(job, self._local.job['handoff'], self._local.job['bytes'], single)
+            else:
+                self._succeed(job, self._local.job['bytes'], single)
+        finally:
+            self._local.job = None
+            self._unbind(ydl, job)
+            if self.scheduler:
+                self.scheduler.forget(ydl.filenames)
+            if self.metrics:
+                self.metrics.forget(ydl.filenames)
+
+    def _succeed(self, job, nbytes, single):
+        if self.journal:
+            self.journal.record(job.url, DONE, nbytes=nbytes)
+        # 只记录单个视频的去重键；播放列表/频道记录后，之后新增的视频就再也不会下载
+        if self.dedup and single:
+            self.dedup.add(job.key)
+        print(f"✓ 成功: {job.url}")
+        self._settle(job, 'success')
+
+    def _postprocess(self, job, infos, nbytes, single):
+        """把下载完成的文件交给后处理进程池，全部处理完才记为成功"""
+        if self.journal:
+            self.journal.record(job.url, POSTPROCESSING)
+        print(f"→ 等待后处理: {job.url}")
+        lock = threading.Lock()
+        remaining = [len(infos)]
+        errors = []
+
+        def done(submitted, error, result):
+            # 在进程池的回调线程中执行
+            with lock:
+                if error:
+                    errors.append(error)
+                elif job.trace:
+                    started, duration, _ = result
+                    job.trace.add('postprocess_wait', submitted, max(started - submitted, 0))
+                    job.trace.add('postprocess', started, duration)
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            if not errors:
+                self._succeed(job, nbytes, single)
+            elif self.abort.is_set():
+                # 日志中保留 postprocessing 状态，--resume 时重新处理
+                print(f"✗ 未完成: {job.url}")
+                self._incomplete(job)
+            else:
+                # 文件已经下载完成，重新下载无济于事，不重试
+                self._fail(job, f'后处理失败: {errors[0]}', retry=False)
+
+        if job.trace:
+            # 之后的分段由回调线程记录
+            job.trace.stop()
+        for info in infos:
+            self.postprocess.submit(
+                info, lambda error, result, submitted=time.time(): done(submitted, error, result))
+
+    def _bind(self, ydl, job):
+        """把当前线程上的 yt-dlp 回调归到该任务的追踪上"""
+        if job.trace:
+            ydl.trace = job.trace
+            self.metrics.bind(job.trace)
+
+    def _unbind(self, ydl, job):
+        if job.trace:
+            job.trace.stop()
+            ydl.trace = None
+            self.metrics.unbind()
+
+    def _resolved_info(self, job):
+        """派发前已提取的信息；重试时其中的格式地址可能已失效，重新提取"""
+        if self.resolved is None or job.attempt:
+            return None
+        return self.resolved(job.url)
+
+    def _download_one(self, job):
+        """单阶段：在同一个 worker 中提取并下载"""
+        url = job.url
+        info = self.cache.get(url) if self.cache and not job.attempt else None
+        if info is None:
+            info = self._resolved_info(job)
+        if info is not None:
+            self._finish(job, lambda ydl: ydl.process_ie_result(info, download=True))
+            return
+        if self.journal and not self.abort.is_set():
+            self.journal.record(url, EXTRACTING)
+
+        def download(ydl):
+            if job.trace:
+                job.trace.switch('extract')
+            ydl.download([url])
+        self._finish(job, download)
+
+    def _extract_one(self, job):
+        """两阶段的提取阶段：解析 info_dict 后放入待下载队列"""
+        if self.abort.is_set():
+            self._incomplete(job)
+            return
+        url = job.url
+        # 重试时缓存中的格式地址可能已失效，重新提取
+        info = self.cache.get(url) if self.cache and not job.attempt else None
+        if info is None:
+            resolved = self._resolved_info(job)
+            if self.journal:
+                self.journal.record(url, EXTRACTING)
+            ydl = self._get_ydl()
+            self._bind(ydl, job)
+            try:
+                if job.trace:
+                    job.trace.switch('extract')
+                if resolved is not None:
+                    # 只需格式选择
+                    info = ydl.process_ie_result(resolved, download=False)
+                else:
+                    info = ydl.extract_info(url, download=False)
+            except Exception as e:
+                self._fail(job, e)
+                return
+            finally:
+                self._unbind(ydl, job)
+            if info is None:
+                # ignoreerrors 模式下提取错误不会抛出，只返回 None
+                self._fail(job, ydl.last_error() if ydl.errors else '提取失败')
+                return
+            if self.cache:
+                self.cache.put(url, ydl.sanitize_info(info))
+        # 队列满时阻塞，提取阶段不会跑得比下载阶段太远
+        start = time.monotonic()
+        self._ready.put((job, info))
+        waited = time.monotonic() - start
+        with self._blocked_lock:
+            self.extract_blocked += waited
+
+    def _extract_ordered(self, job):
+        """按策略挑选时告知待下载队列提取进行中，启动时的等待在提取空闲时提前结束"""
+        with self._ready.producing():
+            self._extract_one(job)
+
+    def _download_worker(self):
+        """两阶段的下载阶段"""
+        while True:
+            item = self._ready.get()
+            if item is None:
+                return
+            job, info = item
+            try:
+                self._finish(job, lambda ydl: ydl.process_ie_result(info, download=True))
+            except Exception as e:
+                # 日志、去重索引等写入失败时也要得出结果（否则 _drain 会一直等待），
+                # 线程继续处理后面的任务
+                print(f"✗ 失败: {job.url}: {e}")
+                self._settle(job, 'failed')
+
+    def _guarded(self, fn):
+        """任务函数出现意外异常时也要得出结果，否则 _drain 会一直等待"""
+        def run(job):
+            try:
+                fn(job)
+            except BaseException as e:
+                print(f"✗ 失败: {job.url}: {e}")
+                self._settle(job, 'failed')
+                raise
+        return run
+
+    def _resubmit(self, job):
+        """重试到期：重新派发到第一阶段"""
+        if self._stopping():
+            self._incomplete(job)
+            return
+        self._executor.submit(self._submit, job)
+
+    def _stopping(self):
+        return self.abort.is_set() or self.interrupted or self._closing
+
+    def _drain(self):
+        """等待所有任务（含等待重试的任务）得出结果，然后停止下载线程"""
+        with self._active_cond:
+            while self._active:
+                self._active_cond.wait(0.5)
+        if self.prefetch:
+            while self._stop_sent < len(self._downloaders):
+                self._ready.put(None)
+                self._stop_sent += 1
+            for t in self._downloaders:
+                t.join()
+
+    def _register_gauges(self):
+        """队列深度等在输出指标时取值"""
+        metrics = self.metrics
+        metrics.add_callback('retry_pending', '等待重试的 URL 数', lambda: len(self._retry_queue))
+        metrics.add_callback('skipped_total', '因已完成而跳过的 URL 数', lambda: self.stats.skipped,
+                             type='counter')
+        if self.prefetch:
+            metrics.add_callback('ready_queue_depth', '已提取、等待下载的 URL 数', self._ready.qsize)
+            metrics.add_callback('ready_queue_capacity', '待下载队列的容量', lambda: self.queue_depth)
+            metrics.add_callback('extract_blocked_seconds_total', '提取阶段因待下载队列已满而等待的秒数',
+                                 lambda: self.extract_blocked, type='counter')
+        if self.postprocess:
+            stage = self.postprocess
+            metrics.add_callback('postprocess_pending', '已下载、等待或正在后处理的文件数', lambda: stage.pending)
+            metrics.add_callback('postprocess_queue_capacity', '后处理队列的容量', lambda: stage.queue_depth)
+            metrics.add_callback('download_blocked_seconds_total', '下载阶段因后处理队列已满而等待的秒数',
+                                 lambda: stage.blocked_seconds, type='counter')
+            metrics.add_callback('postprocess_busy_seconds_total', '后处理进程累计处理时间',
+                                 lambda: stage.busy_seconds, type='counter')
+        if self.dedup:
+            metrics.add_callback('duplicates_total', '去重丢弃的 URL 数',
+                                 lambda: self.dedup.duplicates + self.dedup.previously_done, type='counter')
+
+    def stage_report(self):
+        """各阶段的背压：上游因下游队列已满而等待的时间"""
+        lines = []
+        if self.prefetch:
+            lines.append(f"提取阶段等待下载队列: {self.extract_blocked:.1f} 秒")
+        if self.postprocess:
+            lines.append(f"下载阶段等待后处理队列: {self.postprocess.blocked_seconds:.1f} 秒")
+            lines.append(self.postprocess.report())
+        return lines
+
+    def _archived(self, url, key):
+        """URL 能推导出存档 ID 且已在存档中"""
+        if self._matcher is None:
+            self._matcher = ExtractorMatcher()
+        if (key or self._matcher.key(url)) not in self.archive:
+            return False
+        self.archive_skipped += 1
+        self.stats.record('skipped')
+        return True
+
+    def _skip(self, url):
+        """派发前跳过的 URL（重复或已下载）在共享队列中记为完成"""
+        if self.work_queue:
+            self.work_queue.finish(url, 'skipped')
+
+    def _stop_retries(self):
+        """不再等待尚未到期的重试，把它们记为未完成"""
+        for job in self._retry_queue.flush():
+            self._incomplete(job)
+
+    def run(self, urls, total=None):
+        """
+        处理 URL 序列，返回 BatchStats
+
+        第一次 Ctrl-C 停止派发新任务（包括重试）并等待进行中的任务完成；
+        第二次 Ctrl-C 中断进行中的下载，并将其记为未完成。
+        """
+        self.total = total
+        if self.prefetch:
+            if self.job_order:
+                self._ready = self.job_order.ready_queue(self.queue_depth)
+            else:
+                self._ready = queue.Queue(maxsize=self.queue_depth)
+            self._stop_sent = 0
+            self._downloaders = [
+                threading.Thread(target=self._download_worker, name=f'download-{n}')
+                for n in range(self.jobs)]
+            for t in self._downloaders:
+                t.start()
+            self._executor = ThreadPoolExecutor(max_workers=self.prefetch, thread_name_prefix='extract')
+            extract = self._extract_ordered if self.job_order else self._extract_one
+            self._submit, window = self._guarded(extract), self.prefetch * 2
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.jobs, thread_name_prefix='download')
+            self._submit, window = self._guarded(self._download_one), self.jobs * 2
+        self._retry_queue = DelayedQueue(self._resubmit)
+        if self.metrics:
+            self._register_gauges()
+
+        pending = set()
+        stats = self.stats
+        try:
+            i = 0
+            for url in urls:
+                key = None
+                if self.dedup:
+                    key = self.dedup.check(url)
+                    if key is None:
+                        self._skip(url)
+                        continue
+                if self.archive is not None and self._archived(url, key):
+                    self._skip(url)
+                    continue
+                # 限制已派发未完成的任务数，避免一次性把整个列表塞进队列
+                while len(pending) >= window:
+                    _, pending = wait(pending, return_when=FIRST_COMPLETED)
+                i += 1
+                stats.seen = i
+                if self.journal:
+                    self.journal.record(url, PENDING)
+                with self._active_cond:
+                    self._active += 1
+                trace = None
+                if self.metrics:
+                    self.metrics.active.inc()
+                    trace = self.metrics.new_trace(url)
+                pending.add(self._executor.submit(self._submit, Job(i, url, key, trace=trace)))
+            self._drain()
+        except KeyboardInterrupt:
+            self.interrupted = True
+            print("\n收到中断信号，停止派发新任务，等待进行中的下载完成...")
+            print("再次按 Ctrl-C 将中断进行中的下载")
+            self._stop_retries()
+            try:
+                self._drain()
+            except KeyboardInterrupt:
+                self.abort.set()
+                print("\n正在中断进行中的下载...")
+                self._stop_retries()
+                if self.postprocess:
+                    self.postprocess.cancel()
+                self._drain()
+            if total is not None:
+                stats.record('incomplete', total - stats.seen)
+        finally:
+            # 出现意外异常时也要让所有线程退出，否则进程无法结束；正常结束时为空操作
+            self._closing = True
+            self._stop_retries()
+            self._drain()
+            self._retry_queue.close()
+            self._executor.shutdown(wait=True)
+            if self.postprocess:
+                self.postprocess.close()
+            for ydl in self._instances:
+                self.pool.detach(ydl)
+                ydl.close()
+            if self._own_pool:
+                self.pool.close()
+        return stats
@@ -0,0 +1,319 @@
+"""
+基准测试用的本机模拟视频站点
+
+在 127.0.0.1 上启动一个 HTTP/1.1（keep-alive）服务器，提供三种视频:
+
+- /watch/mp4-<n>    单文件 MP4，/media/<id>.mp4 支持 Range 请求
+- /watch/hls-<n>    m3u8 媒体播放列表，/hls/<id>/<k>.ts 共 segments 个分片
+- /watch/dash-<n>   mpd 清单（SegmentTemplate），/dash/<id>/init.mp4 + <k>.m4s
+- /playlist/<kind>-<count>?page=<k>
+                    包含 count 个视频的播放列表（JSON），每页 PLAYLIST_PAGE_SIZE 项
+
+视频 ID 以 -s<k> 结尾时（如 mp4-big1-s50）大小为 size 的 k 倍，用于构造大小不一的
+列表。benchmark.py 生成的 ID 形如 mp4-batch4x12，不会被当作倍数。
+
+页面由 bench_plugins 中的 BenchHostIE 解析。数据是重复的随机字节块，不是
+可播放的视频，只用于测量下载链路的吞吐。
+
+服务器按视频 ID 记录首个请求开始到最后一个响应结束的时间，作为单个条目的
+延迟，不依赖被测工具的输出格式。
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+KINDS = ('mp4', 'hls', 'dash')
+
+# 每个分片的时长（秒），只影响清单内容
+SEGMENT_DURATION = 2
+
+# 播放列表每页的条目数
+PLAYLIST_PAGE_SIZE = 50
+
+_BLOCK = os.urandom(64 * 1024)
+
+_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta property="og:title" content="Bench {id}">
+<title>Bench {id}</title>
+</head>
+<body>
+<script>var bench = {data};</script>
+</body>
+</html>
+"""
+
+_MPD = """<?xml version="1.0" encoding="UTF-8"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" profiles="urn:mpeg:dash:profile:isoff-live:2011"
+     mediaPresentationDuration="PT{duration}S" minBufferTime="PT2S">
+  <Period id="0" start="PT0S">
+    <AdaptationSet mimeType="video/mp4" segmentAlignment="true">
+      <Representation id="main" codecs="avc1.4d401f,mp4a.40.2" bandwidth="{bandwidth}" width="1280" height="720">
+        <SegmentTemplate timescale="1" duration="{segment}" startNumber="1"
+                         initialization="init.mp4" media="$Number$.m4s"/>
+      </Representation>
+    </AdaptationSet>
+  </Period>
+</MPD>
+"""
+
+_SCALE_RE = re.compile(r'-s(\d+)$')
+
+_PATH_RE = re.compile(r'^/(?:watch/(?P<page>[\w-]+)|media/(?P<media>[\w-]+)\.mp4|(?P<proto>hls|dash)/(?P<sid>[\w-]+)/(?P<name>[\w.]+)'
+                      r'|playlist/(?P<playlist>[a-z0-9]+)-(?P<count>\d+))$')
+
+
+class HostStats:
+    """服务器侧统计（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.bytes_sent = 0
+            self.requests = 0
+            self.playlist_pages = 0
+            self._items = {}
+
+    def count_playlist_page(self):
+        with self._lock:
+            self.requests += 1
+            self.playlist_pages += 1
+
+    def begin(self, video_id):
+        now = time.monotonic()
+        with self._lock:
+            self.requests += 1
+            item = self._items.setdefault(video_id, [now, now])
+            item[0] = min(item[0], now)
+
+    def end(self, video_id, nbytes):
+        now = time.monotonic()
+        with self._lock:
+            self.bytes_sent += nbytes
+            item = self._items[video_id]
+            item[1] = max(item[1], now)
+
+    def latencies(self):
+        """每个视频从首个请求到最后一个响应的耗时（秒）"""
+        with self._lock:
+            return [end - start for start, end in self._items.values()]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'BenchHost/1.0'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        host = self.server.host
+        path, _, query = self.path.partition('?')
+        m = _PATH_RE.match(path)
+        if not m:
+            self.send_error(404)
+            return
+        if m.group('playlist'):
+            host.stats.count_playlist_page()
+            if host.latency:
+                time.sleep(host.latency)
+            page = re.search(r'(?:^|&)page=(\d+)', query)
+            body = host.playlist_page(m.group('playlist'), int(m.group('count')), int(page.group(1)) if page else 0)
+            self._send_text(body, 'application/json')
+            return
+        video_id = m.group('page') or m.group('media') or m.group('sid')
+        kind = video_id.split('-', 1)[0]
+        if kind not in KINDS:
+            self.send_error(404)
+            return
+
+        host.stats.begin(video_id)
+        if host.latency:
+            time.sleep(host.latency)
+
+        sent = 0
+        if m.group('page'):
+            sent = self._send_text(host.page(video_id), 'text/html; charset=utf-8')
+        elif m.group('media'):
+            sent = self._send_payload(host.size_of(video_id), 'video/mp4', ranged=True)
+        elif m.group('proto') == 'hls':
+            if m.group('name') == 'index.m3u8':
+                sent = self._send_text(host.m3u8(), 'application/vnd.apple.mpegurl')
+            else:
+                sent = self._send_payload(host.segment_size * host.scale(video_id), 'video/mp2t')
+        else:
+            name = m.group('name')
+            if name == 'manifest.mpd':
+                sent = self._send_text(host.mpd(), 'application/dash+xml')
+            elif name == 'init.mp4':
+                sent = self._send_payload(1024, 'video/mp4')
+            else:
+                sent = self._send_payload(host.segment_size * host.scale(video_id), 'video/iso.segment')
+        host.stats.end(video_id, sent)
+
+    def _send_text(self, text, content_type):
+        body = text.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return len(body)
+
+    def _send_payload(self, size, content_type, ranged=False):
+        start, end = 0, size - 1
+        m = re.match(r'bytes=(\d*)-(\d*)', self.headers.get('Range', '')) if ranged else None
+        if m and (m.group(1) or m.group(2)):
+            if m.group(1):
+                start = int(m.group(1))
+                end = min(int(m.group(2)), size - 1) if m.group(2) else size - 1
+            else:
+                start = max(size - int(m.group(2)), 0)
+            if start >= size:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return 0
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        else:
+            self.send_response(200)
+        length = end - start + 1
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(length))
+        if ranged:
+            self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+
+        view = memoryview(_BLOCK)
+        offset = start % len(_BLOCK)
+        remaining = length
+        rate = self.server.host.rate
+        started = time.monotonic()
+        try:
+            while remaining:
+                chunk = view[offset:offset + remaining]
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+                offset = 0
+                if rate:
+                    # 按每个连接的速率上限放慢发送
+                    delay = started + (length - remaining) / rate - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        return length - remaining
+
+
+class MockVideoHost:
+    """
+    本机模拟视频站点
+
+    Args:
+        size: 每个视频的字节数（分片视频平均分到各分片）
+        segments: HLS/DASH 的分片数
+        latency: 每个请求在响应前等待的秒数，用于模拟网络往返
+        rate: 每个连接的发送速率上限（字节/秒），0 表示不限
+        port: 监听端口，0 表示自动分配
+
+    用法:
+        with MockVideoHost(size=4 * 1024 * 1024) as host:
+            urls = host.urls('hls', 20)
+    """
+
+    def __init__(self, size=2 * 1024 * 1024, segments=10, latency=0.0, port=0, rate=0):
+        self.size = size
+        self.rate = rate
+        self.segments = max(segments, 1)
+        self.segment_size = max(size // self.segments, 1)
+        self.latency = latency
+        self.stats = HostStats()
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), _Handler)
+        self._server.daemon_threads = True
+        self._server.host = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self._server.server_address[1]}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='bench-host', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def urls(self, kind, count, prefix=''):
+        """生成 count 个不同视频的页面地址"""
+        return [f'{self.base_url}/watch/{kind}-{prefix}{n}' for n in range(1, count + 1)]
+
+    def playlist_url(self, kind, count):
+        """包含 count 个视频的播放列表地址，条目 ID 为 <kind>-p<n>"""
+        return f'{self.base_url}/playlist/{kind}-{count}'
+
+    def playlist_page(self, kind, count, page):
+        start = page * PLAYLIST_PAGE_SIZE
+        ids = [f'{kind}-p{n}' for n in range(start + 1, min(start + PLAYLIST_PAGE_SIZE, count) + 1)]
+        return json.dumps({
+            'title': f'Bench playlist {kind}-{count}',
+            'count': count,
+            'entries': [{'id': video_id, 'url': f'{self.base_url}/watch/{video_id}'} for video_id in ids],
+        })
+
+    @staticmethod
+    def scale(video_id):
+        m = _SCALE_RE.search(video_id)
+        return int(m.group(1)) if m else 1
+
+    def size_of(self, video_id):
+        return self.size * self.scale(video_id)
+
+    def page(self, video_id):
+        kind = video_id.split('-', 1)[0]
+        data = {
+            'kind': kind,
+            'videoUrl': f'{self.base_url}/media/{video_id}.mp4',
+            'hlsUrl': f'{self.base_url}/hls/{video_id}/index.m3u8',
+            'dashUrl': f'{self.base_url}/dash/{video_id}/manifest.mpd',
+            'width': 1280,
+            'height': 720,
+            'filesize': self.size_of(video_id),
+        }
+        return _PAGE.format(id=video_id, data=json.dumps(data))
+
+    def m3u8(self):
+        lines = [
+            '#EXTM3U',
+            '#EXT-X-VERSION:3',
+            f'#EXT-X-TARGETDURATION:{SEGMENT_DURATION}',
+            '#EXT-X-MEDIA-SEQUENCE:0',
+            '#EXT-X-PLAYLIST-TYPE:VOD',
+        ]
+        for k in range(self.segments):
+            lines += [f'#EXTINF:{SEGMENT_DURATION}.0,', f'{k}.ts']
+        lines.append('#EXT-X-ENDLIST')
+        return '\n'.join(lines) + '\n'
+
+    def mpd(self):
+        duration = self.segments * SEGMENT_DURATION
+        return _MPD.format(duration=duration, segment=SEGMENT_DURATION,
+                           bandwidth=self.segment_size * 8 // SEGMENT_DURATION)
@@ -0,0 +1,125 @@
+"""
+基准测试用提取器
+
+只匹配 bench_host.MockVideoHost 在本机启动的模拟站点，由 benchmark.py 把
+scripts/bench_plugins 加入 PYTHONPATH 后通过 yt-dlp 插件机制加载。
+"""
+
+import functools
+
+from yt_dlp.extractor.common import InfoExtractor
+from yt_dlp.utils import OnDemandPagedList, int_or_none
+
+# 与 bench_host.PLAYLIST_PAGE_SIZE 一致
+_PLAYLIST_PAGE_SIZE = 50
+
+
+class BenchHostIE(InfoExtractor):
+    """模拟站点提取器
+
+    页面中的 "kind" 决定返回哪种格式：mp4（单文件）、hls（m3u8 分片）
+    或 dash（mpd 分片）
+    """
+
+    # 提取器描述
+    IE_DESC = 'yt-dlp-skill 基准测试模拟站点'
+    IE_NAME = 'benchhost'
+
+    # URL 匹配正则（只匹配本机地址）
+    _VALID_URL = r'https?://(?:127\.0\.0\.1|localhost):\d+/watch/(?P<id>[\w-]+)'
+
+    # 测试用例（需要先启动模拟站点）
+    _TESTS = [{
+        'url': 'http://127.0.0.1:8000/watch/mp4-1',
+        'info_dict': {
+            'id': 'mp4-1',
+            'ext': 'mp4',
+            'title': 'Bench mp4-1',
+        },
+        'params': {
+            'skip_download': True,  # 测试时不下载
+        },
+        'skip': '需要本机运行 bench_host',
+    }]
+
+    def _real_extract(self, url):
+        """主提取方法"""
+        # 1. 提取视频 ID
+        video_id = self._match_id(url)
+
+        # 2. 下载网页
+        webpage = self._download_webpage(url, video_id)
+
+        # 3. 提取页面中的视频数据
+        data = self._search_json(r'var\s+bench\s*=', webpage, 'bench data', video_id)
+
+        # 4. 按类型构建格式列表
+        kind = data['kind']
+        if kind == 'hls':
+            formats = self._extract_m3u8_formats(
+                data['hlsUrl'],
+                video_id,
+                ext='mp4',
+                entry_protocol='m3u8_native'
+            )
+        elif kind == 'dash':
+            formats = self._extract_mpd_formats(
+                data['dashUrl'],
+                video_id,
+                mpd_id='dash'
+            )
+        else:
+            formats = [{
+                'url': data['videoUrl'],
+                'ext': 'mp4',
+                'format_id': 'mp4',
+                'height': int_or_none(data.get('height')),
+                'width': int_or_none(data.get('width')),
+                'filesize': int_or_none(data.get('filesize')),
+                'vcodec': 'avc1.4d401f',
+                'acodec': 'mp4a.40.2',
+            }]
+
+        # 5. 返回信息字典
+        return {
+            'id': video_id,
+            'title': self._html_search_meta('og:title', webpage) or f'Bench {video_id}',
+            'formats': formats,
+        }
+
+
+class BenchHostPlaylistIE(InfoExtractor):
+    """模拟站点播放列表提取器
+
+    条目按页从 /playlist/<kind>-<count>?page=<k> 获取，迭代到哪一页才请求哪一页
+    """
+
+    IE_DESC = 'yt-dlp-skill 基准测试模拟站点播放列表'
+    IE_NAME = 'benchhost:playlist'
+
+    _VALID_URL = r'https?://(?:127\.0\.0\.1|localhost):\d+/playlist/(?P<id>[a-z0-9]+-\d+)'
+
+    # 没有可离线运行的测试用例，直接声明返回类型
+    _RETURN_TYPE = 'playlist'
+
+    _TESTS = [{
+        'url': 'http://127.0.0.1:8000/playlist/mp4-120',
+        'info_dict': {
+            'id': 'mp4-120',
+            'title': 'Bench playlist mp4-120',
+        },
+        'playlist_count': 120,
+        'skip': '需要本机运行 bench_host',
+    }]
+
+    def _fetch_page(self, url, playlist_id, page):
+        data = self._download_json(
+            url, playlist_id, note=f'Downloading page {page + 1}', query={'page': page})
+        for entry in data['entries']:
+            yield self.url_result(entry['url'], BenchHostIE, entry['id'])
+
+    def _real_extract(self, url):
+        playlist_id = self._match_id(url)
+        entries = OnDemandPagedList(
+            functools.partial(self._fetch_page, url, playlist_id), _PLAYLIST_PAGE_SIZE)
+        return self.playlist_result(entries, playlist_id, f'Bench playlist {playlist_id}')
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+批量链路基准测试
+
+在本机启动模拟视频站点（bench_host.py），用不同的并发数运行
+batch-download.py 和 format-analyzer.py，统计:
+
+- URLs/s、MB/s（按服务器实际发送的字节计算）
+- 单个条目的 p50/p99 延迟（服务器侧：该视频首个请求到最后一个响应）
+- 被测进程的峰值 RSS
+
+结果保存为 JSON，可以用 --compare 与之前的结果对比。
+"""
+
+import argparse
+import json
+import os
+import platform
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+try:
+    import yt_dlp
+except ImportError:
+    print("错误: 需要安装 yt-dlp")
+    print("请运行: pip install yt-dlp")
+    sys.exit(1)
+
+from bench_host import KINDS, MockVideoHost
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+PLUGIN_DIR = SCRIPTS_DIR / 'bench_plugins'
+
+TOOLS = {
+    'batch': 'batch-download.py',
+    'analyzer': 'format-analyzer.py',
+}
+
+
+def parse_list(value, cast=str):
+    return [cast(v) for v in value.split(',') if v.strip()]
+
+
+def percentile(values, p):
+    """最近秩百分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, round(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[k]
+
+
+def run_process(cmd, log_path):
+    """运行被测进程，返回 (退出码, 峰值 RSS 字节数)"""
+    env = dict(os.environ)
+    # 通过 yt-dlp 插件机制加载 BenchHostIE
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(PLUGIN_DIR), env.get('PYTHONPATH')]))
+    with open(log_path, 'wb') as log:
+        proc = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT, env=env)
+        if not hasattr(os, 'wait4'):
+            return proc.wait(), None
+        # wait4 返回的是这个子进程自己的资源占用
+        _, status, usage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+    # Linux 上单位为 KB，macOS 上为字节
+    rss = usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+    return proc.returncode, rss
+
+
+def count_ok(tool, out_dir, log_path):
+    """成功处理的条目数"""
+    if tool == 'batch':
+        return sum(1 for p in Path(out_dir).iterdir() if p.is_file() and not p.name.startswith('.'))
+    ok = 0
+    with open(log_path, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            if line.startswith('{') and '"error"' not in line:
+                ok += 1
+    return ok
+
+
+def run_case(host, tool, kind, jobs, items, work_dir, extra_args):
+    """运行一组测试，返回结果记录"""
+    case = f'{tool}-{kind}-j{jobs}'
+    case_dir = Path(work_dir) / case
+    out_dir = case_dir / 'out'
+    out_dir.mkdir(parents=True)
+    url_file = case_dir / 'urls.txt'
+    # 每组使用不同的视频 ID，避免被测工具的缓存或去重影响结果
+    url_file.write_text('\n'.join(host.urls(kind, items, prefix=f'{tool}{jobs}x')) + '\n', encoding='utf-8')
+    log_path = case_dir / 'output.log'
+
+    cmd = [sys.executable, str(SCRIPTS_DIR / TOOLS[tool]), '-f', str(url_file), '-j', str(jobs)]
+    if tool == 'batch':
+        cmd += ['-o', str(out_dir), '--no-dedup', '--retries', '0']
+    else:
+        cmd += ['--no-cache', '--output', 'ndjson']
+    cmd += extra_args
+
+    host.stats.reset()
+    start = time.perf_counter()
+    returncode, rss = run_process(cmd, log_path)
+    seconds = time.perf_counter() - start
+
+    latencies = host.stats.latencies()
+    p50 = percentile(latencies, 50)
+    p99 = percentile(latencies, 99)
+    return {
+        'tool': tool,
+        'kind': kind,
+        'jobs': jobs,
+        'items': items,
+        'ok': count_ok(tool, out_dir, log_path),
+        'returncode': returncode,
+        'seconds': round(seconds, 3),
+        'urls_per_sec': round(items / seconds, 2),
+        'mb_per_sec': round(host.stats.bytes_sent / seconds / 1024 / 1024, 2),
+        'requests': host.stats.requests,
+        'p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+        'p99_ms': round(p99 * 1000, 1) if p99 is not None else None,
+        'peak_rss_mb': round(rss / 1024 / 1024, 1) if rss else None,
+        'log': str(log_path),
+    }
+
+
+def print_result(r):
+    print(f"{r['tool']:<9} {r['kind']:<5} {r['jobs']:>4} {r['ok']:>4}/{r['items']:<4} "
+          f"{r['seconds']:>8.2f} {r['urls_per_sec']:>8.2f} {r['mb_per_sec']:>8.2f} "
+          f"{r['p50_ms'] or 0:>9.1f} {r['p99_ms'] or 0:>9.1f} {r['peak_rss_mb'] or 0:>8.1f}")
+
+
+def compare(results, baseline_path):
+    """与之前保存的结果对比吞吐和 p99 延迟"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {(r['tool'], r['kind'], r['jobs']): r for r in json.load(f)['results']}
+
+    print(f"\n与 {baseline_path} 对比:")
+    print(f"{'工具':<9} {'类型':<5} {'并发':>4} {'URLs/s':>16} {'p99 (ms)':>20}")
+    for r in results:
+        old = baseline.get((r['tool'], r['kind'], r['jobs']))
+        if not old:
+            continue
+
+        def change(new, before):
+            if not before or new is None:
+                return 'N/A'
+            return f'{(new - before) / before * 100:+.1f}%'
+
+        print(f"{r['tool']:<9} {r['kind']:<5} {r['jobs']:>4} "
+              f"{old['urls_per_sec']:>6.2f} → {r['urls_per_sec']:<6.2f}{change(r['urls_per_sec'], old['urls_per_sec']):>8} "
+              f"{old['p99_ms'] or 0:>7.1f} → {r['p99_ms'] or 0:<7.1f}{change(r['p99_ms'], old['p99_ms']):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='批量链路基准测试（本机模拟站点）',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  # 默认：两个工具 × 三种格式 × 并发 1,4,8
+  python benchmark.py
+
+  # 只测下载，HLS，每个视频 8MB / 20 个分片
+  python benchmark.py --tools batch --kinds hls --size 8 --segments 20
+
+  # 模拟 50ms 网络往返
+  python benchmark.py --latency 50
+
+  # 给 batch-download.py 传递额外参数
+  python benchmark.py --tools batch --batch-args "--prefetch 4"
+
+  # 保存结果并与上次对比
+  python benchmark.py -o after.json --compare before.json
+        """
+    )
+
+    parser.add_argument(
+        '--tools',
+        default='batch,analyzer',
+        help='被测工具，逗号分隔: batch, analyzer (默认: batch,analyzer)'
+    )
+
+    parser.add_argument(
+        '--kinds',
+        default=','.join(KINDS),
+        help=f'视频类型，逗号分隔: {", ".join(KINDS)} (默认: 全部)'
+    )
+
+    parser.add_argument(
+        '-j', '--jobs',
+        default='1,4,8',
+        help='并发数列表，逗号分隔 (默认: 1,4,8)'
+    )
+
+    parser.add_argument(
+        '-n', '--items',
+        type=int,
+        default=20,
+        help='每组测试的 URL 数 (默认: 20)'
+    )
+
+    parser.add_argument(
+        '--size',
+        type=float,
+        default=2,
+        help='每个视频的大小，MB (默认: 2)'
+    )
+
+    parser.add_argument(
+        '--segments',
+        type=int,
+        default=10,
+        help='HLS/DASH 分片数 (默认: 10)'
+    )
+
+    parser.add_argument(
+        '--latency',
+        type=float,
+        default=0,
+        help='每个请求的模拟延迟，毫秒 (默认: 0)'
+    )
+
+    parser.add_argument(
+        '--batch-args',
+        default='',
+        help='传给 batch-download.py 的额外参数'
+    )
+
+    parser.add_argument(
+        '--analyzer-args',
+        default='',
+        help='传给 format-analyzer.py 的额外参数'
+    )
+
+    parser.add_argument(
+        '-o', '--output',
+        help='结果文件 (默认: bench-<时间>.json)'
+    )
+
+    parser.add_argument(
+        '--compare',
+        metavar='JSON',
+        help='与之前保存的结果对比'
+    )
+
+    parser.add_argument(
+        '--keep',
+        action='store_true',
+        help='保留下载文件和被测进程的输出日志'
+    )
+
+    args = parser.parse_args()
+
+    tools = parse_list(args.tools)
+    kinds = parse_list(args.kinds)
+    try:
+        jobs_list = parse_list(args.jobs, int)
+    except ValueError:
+        parser.error(f'无法解析并发数: {args.jobs}')
+    for tool in tools:
+        if tool not in TOOLS:
+            parser.error(f'未知工具: {tool}')
+    for kind in kinds:
+        if kind not in KINDS:
+            parser.error(f'未知类型: {kind}')
+    if args.items < 1 or not jobs_list or min(jobs_list) < 1:
+        parser.error('--items 和 --jobs 必须大于等于 1')
+
+    extra_args = {
+        'batch': shlex.split(args.batch_args),
+        'analyzer': shlex.split(args.analyzer_args),
+    }
+    output = args.output or time.strftime('bench-%Y%m%d-%H%M%S.json')
+
+    work_dir = tempfile.mkdtemp(prefix='yt-dlp-bench-')
+    results = []
+    size = int(args.size * 1024 * 1024)
+
+    print(f"模拟站点: 每个视频 {args.size}MB，{args.segments} 个分片，请求延迟 {args.latency}ms")
+    print(f"工作目录: {work_dir}")
+    print("-" * 90)
+    print(f"{'工具':<9} {'类型':<5} {'并发':>4} {'成功':>9} {'耗时(s)':>8} {'URLs/s':>8} {'MB/s':>8} "
+          f"{'p50(ms)':>9} {'p99(ms)':>9} {'RSS(MB)':>8}")
+
+    try:
+        with MockVideoHost(size=size, segments=args.segments, latency=args.latency / 1000) as host:
+            for tool in tools:
+                for kind in kinds:
+                    for jobs in jobs_list:
+                        result = run_case(host, tool, kind, jobs, args.items, work_dir, extra_args[tool])
+                        results.append(result)
+                        print_result(result)
+                        if result['ok'] < result['items']:
+                            print(f"  警告: {result['items'] - result['ok']} 个条目失败"
+                                  f"{'，详见 ' + result['log'] if args.keep else '，使用 --keep 保留输出日志'}")
+    except KeyboardInterrupt:
+        print("\n已中断，保存已完成的结果")
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            for r in results:
+                r.pop('log', None)
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'yt_dlp': yt_dlp.version.__version__,
+        'config': {
+            'size_mb': args.size,
+            'segments': args.segments,
+            'latency_ms': args.latency,
+            'items': args.items,
+            'batch_args': args.batch_args,
+            'analyzer_args': args.analyzer_args,
+        },
+        'results': results,
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print("-" * 90)
+    print(f"结果已保存: {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+共享 HTTP 连接池
+
+yt-dlp 的每个 YoutubeDL 实例都有自己的请求层（RequestDirector）：各自加载 CA
+证书、创建 SSLContext，并各自维护 keep-alive 连接。批量任务中每个 worker 一个
+实例，同一站点的连接和 TLS 握手在 worker 之间无法复用。
+
+ConnectionPool 让一次运行中的所有 YoutubeDL 共用同一个 RequestDirector 和
+cookiejar:
+
+- 安装了 requests 时（yt-dlp 优先使用），同一主机的 keep-alive 连接在所有
+  URL 和 worker 之间复用，连接存活期间不再重新握手；每个主机保留的空闲连接数
+  调整为 worker 数，避免默认的 10 个上限在高并发时丢弃连接。
+- 只有 urllib 时无法保持连接，但仍可省去每个实例重复加载证书和创建 SSLContext。
+
+用法:
+    pool = ConnectionPool(maxsize=jobs)
+    ydl = pool.attach(yt_dlp.YoutubeDL(opts))
+    ...
+    pool.detach(ydl)
+    ydl.close()
+    pool.close()
+
+所有接入的实例应使用相同的网络选项（代理、cookies、证书等），
+请求层按第一个实例的选项创建。
+"""
+
+import threading
+
+# 连接池最多同时保留多少个主机的连接
+DEFAULT_MAX_HOSTS = 32
+
+
+class ConnectionPool:
+    """
+    多个 YoutubeDL 实例共享的请求层（线程安全）
+
+    Args:
+        maxsize: 每个主机保留的最大连接数，通常等于并发 worker 数
+        max_hosts: 同时保留连接的主机数上限
+    """
+
+    def __init__(self, maxsize=10, max_hosts=DEFAULT_MAX_HOSTS):
+        self.maxsize = max(maxsize, 1)
+        self.max_hosts = max_hosts
+        self._director = None
+        self._cookiejar = None
+        self._lock = threading.Lock()
+
+    @property
+    def keep_alive(self):
+        """请求层是否支持 keep-alive（需要安装 requests）"""
+        return self._director is not None and 'Requests' in self._director.handlers
+
+    def attach(self, ydl):
+        """让 ydl 使用共享的请求层和 cookiejar，返回 ydl"""
+        with self._lock:
+            if self._director is None:
+                # 第一个实例按自己的选项创建请求层，之后共享给其他实例
+                self._cookiejar = ydl.cookiejar
+                self._director = ydl._request_director
+                for handler in self._director.handlers.values():
+                    self._tune(handler)
+                return ydl
+        # cookiejar 和 _request_director 都是 cached_property，写入实例字典即可覆盖
+        ydl.__dict__['cookiejar'] = self._cookiejar
+        ydl.__dict__['_request_director'] = self._director
+        return ydl
+
+    def detach(self, ydl):
+        """在 ydl.close() 之前调用，避免关闭共享的连接"""
+        ydl.__dict__.pop('_request_director', None)
+
+    def close(self):
+        with self._lock:
+            if self._director is not None:
+                self._director.close()
+                self._director = None
+
+    def _tune(self, handler):
+        """调整请求处理器，使其可以安全地被多个线程共享"""
+        get_instance = getattr(handler, '_get_instance', None)
+        if get_instance is None:
+            return
+
+        # 处理器按 (cookiejar, 代理...) 缓存会话，但查找和创建没有加锁；
+        # 多个线程同时首次请求时会各自创建会话，连接无法复用
+        lock = threading.Lock()
+
+        def locked_get_instance(**kwargs):
+            with lock:
+                return get_instance(**kwargs)
+
+        handler._get_instance = locked_get_instance
+
+        if handler.RH_KEY == 'Requests':
+            create_instance = handler._create_instance
+
+            def create_pooled_instance(**kwargs):
+                session = create_instance(**kwargs)
+                # http 和 https 挂载的是同一个 adapter
+                for adapter in {id(a): a for a in session.adapters.values()}.values():
+                    adapter.init_poolmanager(self.max_hosts, self.maxsize)
+                return session
+
+            handler._create_instance = create_pooled_instance
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+下载存档管理
+
+查看、压缩、导入和导出 batch-download.py --download-archive 使用的存档。
+存档文件名以 .sqlite/.sqlite3/.db 结尾时为 SQLite 格式，否则为 yt-dlp 纯文本格式。
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+try:
+    import yt_dlp
+except ImportError:
+    print("错误: 需要安装 yt-dlp")
+    print("请运行: pip install yt-dlp")
+    sys.exit(1)
+
+from download_archive import export_text, open_archive, read_text_archive
+from url_dedup import ExtractorMatcher
+
+
+def cmd_stats(archive, args):
+    print(f"存档: {args.archive}")
+    print(f"条目数: {len(archive)}")
+    return 0
+
+
+def cmd_compact(archive, args):
+    before, after = archive.compact()
+    print(f"压缩完成: {yt_dlp.utils.format_bytes(before)} → {yt_dlp.utils.format_bytes(after)}")
+    return 0
+
+
+def cmd_export(archive, args):
+    count = export_text(archive, args.output)
+    print(f"已导出 {count} 条到 {args.output}")
+    return 0
+
+
+def cmd_import(archive, args):
+    before = len(archive)
+    for path in args.files:
+        archive.update(read_text_archive(path))
+    print(f"已导入 {len(archive) - before} 条新记录，共 {len(archive)} 条")
+    return 0
+
+
+def cmd_check(archive, args):
+    """按 URL 推导存档 ID 并查询，不发出网络请求"""
+    matcher = ExtractorMatcher()
+    missing = 0
+    for url in args.urls:
+        key = matcher.key(url)
+        if key in archive:
+            print(f"✓ 已下载: {url} ({key})")
+        else:
+            missing += 1
+            print(f"✗ 未下载: {url} ({key})")
+    return 1 if missing else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='下载存档管理',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  # 查看条目数
+  python download-archive.py archive.sqlite stats
+
+  # 把 yt-dlp 的纯文本存档导入 SQLite 存档
+  python download-archive.py archive.sqlite import archive.txt
+
+  # 导出为纯文本格式，供原生 yt-dlp 使用
+  python download-archive.py archive.sqlite export -o archive.txt
+
+  # 去掉重复行 / 重建数据库文件（没有下载进程运行时执行）
+  python download-archive.py archive.sqlite compact
+
+  # 查询 URL 是否已下载
+  python download-archive.py archive.sqlite check https://www.youtube.com/watch?v=xxx
+        """
+    )
+
+    parser.add_argument('archive', help='存档文件')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('stats', help='显示条目数').set_defaults(func=cmd_stats)
+    subparsers.add_parser('compact', help='压缩存档').set_defaults(func=cmd_compact)
+
+    export_parser = subparsers.add_parser('export', help='导出为 yt-dlp 纯文本格式')
+    export_parser.add_argument('-o', '--output', required=True, help='输出文件')
+    export_parser.set_defaults(func=cmd_export)
+
+    import_parser = subparsers.add_parser('import', help='导入 yt-dlp 纯文本存档')
+    import_parser.add_argument('files', nargs='+', help='纯文本存档文件')
+    import_parser.set_defaults(func=cmd_import)
+
+    check_parser = subparsers.add_parser('check', help='查询 URL 是否已下载（不联网）')
+    check_parser.add_argument('urls', nargs='+', help='视频 URL')
+    check_parser.set_defaults(func=cmd_check)
+
+    args = parser.parse_args()
+
+    if args.command != 'import' and not Path(args.archive).exists():
+        print(f"错误: 存档不存在: {args.archive}")
+        return 1
+
+    archive = open_archive(args.archive)
+    try:
+        return args.func(archive, args)
+    finally:
+        archive.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+常驻下载服务
+
+在本地 HTTP 端口或 Unix 套接字上提供提取/下载接口，按预设复用预热好的
+YoutubeDL 实例，调用方不必每次请求都创建 YoutubeDL。接口见 download_service.py。
+"""
+
+import argparse
+import signal
+import sys
+import threading
+
+from lazy_import import LazyModule, startup_profile
+
+yt_dlp = LazyModule('yt_dlp', install_hint='pip install yt-dlp')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='常驻下载服务（本地 HTTP / Unix 套接字接口）',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  # 在 8790 端口提供服务，每个预设最多 4 个并发任务
+  python download-service.py --port 8790 -o downloads/
+
+  # 使用 Unix 套接字，启动时预热常用站点的提取器
+  python download-service.py --unix /run/ytdlp.sock --preload https://www.youtube.com/watch?v=xxx
+
+  # 自定义预设（JSON: {"名称": {yt-dlp 选项}}，与内置的 default/audio/high/fast 合并）
+  python download-service.py --profiles profiles.json
+
+调用:
+  curl -s localhost:8790/extract -d '{"url": "https://www.youtube.com/watch?v=xxx"}'
+  curl -sN localhost:8790/download -d '{"url": "https://www.youtube.com/watch?v=xxx", "profile": "audio"}'
+  curl -s --unix-socket /run/ytdlp.sock http://localhost/health
+        """
+    )
+
+    listen = parser.add_mutually_exclusive_group()
+    listen.add_argument('--port', type=int, default=8790, help='监听端口 (默认: 8790)')
+    listen.add_argument('--unix', metavar='PATH', help='改为监听 Unix 套接字')
+
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='监听地址 (默认: 127.0.0.1)。接口没有认证，监听其他地址前请确认网络可信')
+    parser.add_argument('-o', '--output-dir', default='downloads', help='默认输出目录 (默认: downloads)')
+    parser.add_argument('-j', '--workers', type=int, default=4, help='每个预设最多同时处理的任务数 (默认: 4)')
+    parser.add_argument('--warm', type=int, metavar='N',
+                        help='启动时为每个预设预先创建的实例数 (默认: 与 --workers 相同)。'
+                             '每个实例创建约需数十毫秒，未预热的实例在第一次并发时才创建')
+    parser.add_argument('--profiles', metavar='JSON', help='自定义预设文件')
+    parser.add_argument('--preload', nargs='*', default=[], metavar='URL',
+                        help='启动时加载与这些 URL 匹配的提取器')
+    parser.add_argument('--progress-interval', type=float, default=0.5, metavar='SECONDS',
+                        help='进度事件的最小间隔 (默认: 0.5)')
+    parser.add_argument('--profile-startup', action='store_true', help='退出时在 stderr 输出启动各阶段耗时')
+
+    args = parser.parse_args()
+    if args.profile_startup:
+        startup_profile.enable()
+    if args.warm is None:
+        args.warm = args.workers
+    if args.workers < 1 or args.warm < 0:
+        parser.error('--workers 必须大于等于 1，--warm 不能为负数')
+
+    yt_dlp.load()
+    from download_service import PROFILES, DownloadService, ServiceServer, load_profiles
+
+    profiles = PROFILES
+    if args.profiles:
+        try:
+            profiles = load_profiles(args.profiles)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+
+    service = DownloadService(profiles, args.output_dir, args.workers, args.progress_interval)
+    loaded = service.warm(args.warm, args.preload)
+    startup_profile.mark('实例预热完成')
+    try:
+        server = ServiceServer(service, args.port, args.host, args.unix).start()
+    except OSError as e:
+        print(f"错误: 无法监听: {e}")
+        service.close()
+        return 1
+
+    print(f"下载服务已启动: {server.address}")
+    if not args.unix and args.host not in ('127.0.0.1', 'localhost', '::1'):
+        print(f"⚠ 监听 {args.host}: 接口没有认证，能访问该地址的客户端都可以提交下载")
+    print(f"预设: {', '.join(service.pools)}（每个最多 {args.workers} 个并发任务，已预热 {args.warm} 个实例）")
+    if loaded:
+        print(f"已加载提取器: {', '.join(loaded)}")
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    try:
+        stop.wait()
+    except KeyboardInterrupt:
+        pass
+    print("\n正在停止...")
+    server.stop()
+    service.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
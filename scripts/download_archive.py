@@ -0,0 +1,237 @@
+"""
+下载存档索引
+
+与 yt-dlp 的 --download-archive 相同，记录已下载的 "提取器 ID"（例如
+"youtube dQw4w9WgXcQ"），再次遇到时跳过。yt-dlp 的 download_archive 选项除了文件
+路径，也接受任何支持 `in` 和 add() 的集合对象，这里提供两种实现:
+
+- TextArchive: yt-dlp 原生的纯文本格式，首次查询时才读入哈希集合；追加时对
+  文件加锁。查询未命中和写入前会补读其他进程追加的行，多个进程可以共用同一个
+  文件（压缩除外）；大量进程并发时建议使用 SqliteArchive。
+- SqliteArchive: 文件名以 .sqlite/.sqlite3/.db 结尾时使用。按主键查询，不需要
+  把存档读入内存；WAL 模式下多个进程可以同时读写。
+
+两种存档都可以压缩（去掉重复行 / VACUUM），并导出为纯文本格式，供原生
+yt-dlp 使用。
+
+用法:
+    archive = open_archive('archive.sqlite')
+    ydl_opts['download_archive'] = archive
+    ...
+    archive.close()
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from yt_dlp.utils import locked_file
+
+SQLITE_SUFFIXES = ('.sqlite', '.sqlite3', '.db')
+
+
+class TextArchive:
+    """
+    纯文本存档（线程安全）
+
+    yt-dlp 自带的实现在创建 YoutubeDL 时就读入整个文件，每个 worker 各读一遍；
+    这里多个 worker 共用一个实例，第一次查询或写入时才读入。之后记住读到的位置，
+    未命中时只补读文件末尾新增的部分。
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._keys = None
+        self._offset = 0
+        self._inode = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._keys is None:
+            self._keys = set()
+            self._refresh()
+        return self._keys
+
+    def _refresh(self):
+        """读入上次读到的位置之后追加的行（其他进程写入的）"""
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return
+        if st.st_ino != self._inode or st.st_size < self._offset:
+            # 文件被替换（压缩）后从头读；压缩只去掉重复行，已有的键仍然有效
+            self._inode, self._offset = st.st_ino, 0
+        if st.st_size == self._offset:
+            return
+        with locked_file(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        # 只取完整的行，写到一半的行留到下次
+        end = data.rfind(b'\n') + 1
+        lines = data[:end].decode('utf-8').splitlines()
+        self._keys.update(key for key in map(str.strip, lines) if key)
+        self._offset += end
+
+    def __contains__(self, key):
+        with self._lock:
+            keys = self._load()
+            if key in keys:
+                return True
+            self._refresh()
+            return key in keys
+
+    def __bool__(self):
+        # yt-dlp 在存档为空时跳过查询；这里始终返回 True，避免为此读入文件
+        return True
+
+    def __len__(self):
+        with self._lock:
+            return len(self._load())
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._load()))
+
+    def add(self, key):
+        with self._lock:
+            keys = self._load()
+            if key in keys:
+                return
+            self._refresh()
+            if key in keys:
+                return
+            keys.add(key)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with locked_file(self.path, 'a', encoding='utf-8') as f:
+                f.write(key + '\n')
+
+    def update(self, keys):
+        for key in keys:
+            self.add(key)
+
+    def compact(self):
+        """
+        去掉重复行和空行（并发追加可能写入重复项），返回 (压缩前字节数, 压缩后字节数)
+
+        文件被整体替换，应在没有其他进程写入时执行。
+        """
+        with self._lock:
+            if not self.path.exists():
+                return 0, 0
+            before = self.path.stat().st_size
+            seen = {}
+            with locked_file(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    key = line.strip()
+                    if key:
+                        seen.setdefault(key, None)
+            tmp = self.path.with_name(self.path.name + '.tmp')
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.writelines(key + '\n' for key in seen)
+            os.replace(tmp, self.path)
+            st = self.path.stat()
+            self._keys = set(seen)
+            self._inode, self._offset = st.st_ino, st.st_size
+            return before, st.st_size
+
+    def close(self):
+        pass
+
+
+class SqliteArchive:
+    """
+    SQLite 存档（线程安全，多进程可同时写入）
+
+    每条记录带有写入时间，导出时按写入顺序输出。
+    """
+
+    def __init__(self, path, timeout=30.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # 多个 worker 线程共用一个连接，由 _lock 串行化
+        self._db = sqlite3.connect(self.path, timeout=timeout, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS archive (id TEXT PRIMARY KEY, ts REAL NOT NULL) WITHOUT ROWID')
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._db.execute('SELECT 1 FROM archive WHERE id = ?', (key,)).fetchone() is not None
+
+    def __bool__(self):
+        return True
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM archive').fetchone()[0]
+
+    def __iter__(self):
+        with self._lock:
+            rows = self._db.execute('SELECT id FROM archive ORDER BY ts').fetchall()
+        return (row[0] for row in rows)
+
+    def add(self, key):
+        with self._lock:
+            self._db.execute('INSERT OR IGNORE INTO archive (id, ts) VALUES (?, ?)', (key, time.time()))
+
+    def update(self, keys):
+        """批量写入（导入纯文本存档时使用）"""
+        now = time.time()
+        with self._lock:
+            self._db.execute('BEGIN')
+            try:
+                self._db.executemany('INSERT OR IGNORE INTO archive (id, ts) VALUES (?, ?)',
+                                     ((key, now) for key in keys))
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+
+    def compact(self):
+        """合并 WAL 并重建数据库文件，返回 (压缩前字节数, 压缩后字节数)"""
+        with self._lock:
+            before = self._disk_size()
+            self._db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            self._db.execute('VACUUM')
+            self._db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            return before, self._disk_size()
+
+    def _disk_size(self):
+        return sum(p.stat().st_size for p in (self.path, self.path.with_name(self.path.name + '-wal'))
+                   if p.exists())
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def open_archive(path):
+    """按扩展名选择存档实现"""
+    if Path(path).suffix.lower() in SQLITE_SUFFIXES:
+        return SqliteArchive(path)
+    return TextArchive(path)
+
+
+def read_text_archive(path):
+    """逐行读取 yt-dlp 纯文本存档"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            key = line.strip()
+            if key:
+                yield key
+
+
+def export_text(archive, path):
+    """导出为 yt-dlp 纯文本格式（原子替换），返回条目数"""
+    path = Path(path)
+    tmp = path.with_name(path.name + '.tmp')
+    count = 0
+    with open(tmp, 'w', encoding='utf-8') as f:
+        for key in archive:
+            f.write(key + '\n')
+            count += 1
+    os.replace(tmp, path)
+    return count
@@ -0,0 +1,518 @@
+"""
+常驻下载服务
+
+每次调用都新建 YoutubeDL 时（python-api-template.py 中的 download_video、
+extract_video_info 等），都要重新创建请求层、加载证书、实例化提取器，
+在本机上每次约几十到上百毫秒。Web 后端按请求调用时，这部分开销每次都要付出。
+
+DownloadService 常驻在进程中，按选项预设（profile，对应模板中的
+DEFAULT_OPTIONS、AUDIO_OPTIONS 等）维护预热好的 YoutubeDL 实例池：
+
+- 任务到达时从对应预设的池中取出空闲实例，用完放回，实例和已实例化的提取器
+  在任务之间复用；所有实例共享一个 ConnectionPool，同一站点的连接不必重新握手。
+- 每个实例同一时刻只处理一个任务；预设的实例都在使用中时，新任务排队等待。
+- 下载进度、后处理步骤通过 emit 回调以事件的形式实时送出。
+
+ServiceServer 把它包装为本地 HTTP 接口（TCP 端口或 Unix 套接字）:
+
+    GET  /health      实例池状态、任务数、派发延迟
+    GET  /profiles    可用的预设
+    POST /extract     {"url": ..., "profile": "default", "flat": false}  → info_dict JSON
+    POST /download    {"url": ..., "profile": "audio", "output_dir": "..."}
+                      → application/x-ndjson，每行一个事件，最后一行为 result 事件
+
+output_dir 是服务输出目录下的子目录（相对路径），解析后不在输出目录之内的
+请求返回 400。接口没有认证，默认只监听本机。
+
+派发延迟指从收到请求到取得实例、开始提取的时间，不含站点本身的响应时间。
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import yt_dlp
+
+from batch_pipeline import TrackingYoutubeDL
+from connection_pool import ConnectionPool
+from retry_policy import classify_failure
+
+BASE_OPTIONS = {
+    'outtmpl': '%(title)s.%(ext)s',
+    'no_warnings': True,
+    'quiet': True,
+    'noprogress': True,
+    # 错误由 TrackingYoutubeDL 记录后作为事件返回，不打断实例
+    'ignoreerrors': True,
+}
+
+# 对应 python-api-template.py 的配置文件模板；格式选择额外带 /best 回退，
+# 站点只提供合并好的单一格式时也能下载
+PROFILES = {
+    'default': {
+        'format': 'bestvideo+bestaudio/best',
+        'merge_output_format': 'mp4',
+    },
+    'audio': {
+        'format': 'bestaudio/best',
+        'postprocessors': [{
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': 'mp3',
+            'preferredquality': '0',
+        }],
+    },
+    'high': {
+        'format': 'bestvideo[height<=2160]+bestaudio/best',
+        'merge_output_format': 'mp4',
+    },
+    'fast': {
+        'format': 'worst',
+    },
+}
+
+# 进度事件的最小间隔（秒）；finished 等状态变化总是立即送出
+DEFAULT_PROGRESS_INTERVAL = 0.5
+
+
+def load_profiles(path):
+    """从 JSON 文件读取预设: {"名称": {yt-dlp 选项}, ...}，与内置预设合并"""
+    with open(path, encoding='utf-8') as f:
+        custom = json.load(f)
+    if not isinstance(custom, dict) or not all(isinstance(v, dict) for v in custom.values()):
+        raise ValueError(f'预设文件格式错误，应为 {{"名称": {{选项}}}}: {path}')
+    return {**PROFILES, **custom}
+
+
+class ServiceError(Exception):
+    """请求本身有误（未知预设、缺少 URL 等），对应 HTTP 400"""
+
+
+class _Relay:
+    """
+    实例的进度/后处理钩子，转发给当前任务的 emit 回调
+
+    emit 抛出异常（例如客户端已断开）时中断下载。
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.emit = None
+        self.files = []
+        self._last = 0.0
+        self._last_pp = None
+        self._lock = threading.Lock()
+
+    def bind(self, emit):
+        self.emit = emit
+        self.files = []
+        self._last = 0.0
+        self._last_pp = None
+
+    def _send(self, event):
+        emit = self.emit
+        if emit is None:
+            return
+        try:
+            emit(event)
+        except Exception as e:
+            self.emit = None
+            raise yt_dlp.utils.DownloadCancelled(f'客户端已断开: {e}')
+
+    def progress_hook(self, d):
+        status = d['status']
+        if status == 'downloading':
+            # 分片并发下载时钩子来自多个线程
+            with self._lock:
+                now = time.monotonic()
+                if now - self._last < self.interval:
+                    return
+                self._last = now
+        self._send({
+            'event': 'progress',
+            'status': status,
+            'filename': d.get('filename'),
+            'downloaded_bytes': d.get('downloaded_bytes'),
+            'total_bytes': d.get('total_bytes') or d.get('total_bytes_estimate'),
+            'speed': d.get('speed'),
+            'eta': d.get('eta'),
+        })
+
+    def postprocessor_hook(self, d):
+        key = (d['status'], d.get('postprocessor'))
+        # 由选项创建的后处理器会注册两次钩子（yt-dlp 的行为），同一事件只送出一次
+        if d['status'] in ('started', 'finished') and key != self._last_pp:
+            self._last_pp = key
+            self._send({'event': 'postprocess', 'status': d['status'], 'postprocessor': d.get('postprocessor')})
+
+    def post_hook(self, filepath):
+        self.files.append(filepath)
+
+
+class InstancePool:
+    """
+    一个预设的 YoutubeDL 实例池（线程安全）
+
+    Args:
+        name: 预设名称
+        ydl_opts: 该预设的 yt-dlp 选项
+        size: 最多同时存在的实例数，即该预设的并发任务数
+        connections: 共享的 ConnectionPool
+        progress_interval: 进度事件的最小间隔（秒）
+    """
+
+    def __init__(self, name, ydl_opts, size, connections, progress_interval=DEFAULT_PROGRESS_INTERVAL):
+        self.name = name
+        self.ydl_opts = ydl_opts
+        self.size = size
+        self.progress_interval = progress_interval
+        self._connections = connections
+        self._cond = threading.Condition()
+        self._idle = []
+        self._all = []
+        self.waiting = 0
+        self.jobs = 0
+
+    def _create(self):
+        relay = _Relay(self.progress_interval)
+        opts = {
+            **self.ydl_opts,
+            'progress_hooks': [*self.ydl_opts.get('progress_hooks', []), relay.progress_hook],
+            'postprocessor_hooks': [*self.ydl_opts.get('postprocessor_hooks', []), relay.postprocessor_hook],
+        }
+        ydl = self._connections.attach(TrackingYoutubeDL(opts))
+        ydl.add_post_hook(relay.post_hook)
+        return ydl, relay
+
+    def warm(self, count):
+        """预先创建实例，使实例数达到 count（不超过 size）；在开始接受任务前调用"""
+        while len(self._all) < min(count, self.size):
+            item = self._create()
+            with self._cond:
+                self._all.append(item)
+                self._idle.append(item)
+                self._cond.notify()
+
+    def acquire(self):
+        """取得一个空闲实例；都在使用中且已达上限时等待"""
+        with self._cond:
+            while not self._idle and len(self._all) >= self.size:
+                self.waiting += 1
+                try:
+                    self._cond.wait()
+                finally:
+                    self.waiting -= 1
+            self.jobs += 1
+            if self._idle:
+                # 后进先出：最近用过的实例连接和缓存最热
+                return self._idle.pop()
+            # 占位，创建在锁外进行
+            self._all.append(None)
+        try:
+            item = self._create()
+        except BaseException:
+            with self._cond:
+                self._all.remove(None)
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._all[self._all.index(None)] = item
+        return item
+
+    def release(self, item):
+        ydl, relay = item
+        relay.bind(None)
+        with self._cond:
+            self._idle.append(item)
+            self._cond.notify()
+
+    def status(self):
+        with self._cond:
+            return {'size': self.size, 'instances': len(self._all), 'idle': len(self._idle),
+                    'waiting': self.waiting, 'jobs': self.jobs}
+
+    def close(self):
+        with self._cond:
+            items, self._all, self._idle = [item for item in self._all if item is not None], [], []
+        for ydl, _ in items:
+            self._connections.detach(ydl)
+            ydl.close()
+
+
+class DispatchStats:
+    """派发延迟统计（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def as_dict(self):
+        with self._lock:
+            avg = self.total / self.count if self.count else 0.0
+            return {'count': self.count, 'avg_ms': round(avg * 1000, 3), 'max_ms': round(self.max * 1000, 3)}
+
+
+class DownloadService:
+    """
+    按预设维护预热 YoutubeDL 实例池的下载服务
+
+    Args:
+        profiles: {名称: yt-dlp 选项}，默认为 PROFILES
+        output_dir: 默认输出目录
+        workers: 每个预设最多同时处理的任务数（实例数）
+        progress_interval: 进度事件的最小间隔（秒）
+
+    所有预设共享一个连接池，应使用相同的网络选项（代理、cookies 等）。
+    """
+
+    def __init__(self, profiles=None, output_dir='downloads', workers=4,
+                 progress_interval=DEFAULT_PROGRESS_INTERVAL):
+        self.output_dir = str(output_dir)
+        self.connections = ConnectionPool(maxsize=workers)
+        self.pools = {}
+        for name, options in (profiles or PROFILES).items():
+            opts = {**BASE_OPTIONS, **options}
+            opts['paths'] = {'home': self.output_dir, **opts.get('paths', {})}
+            self.pools[name] = InstancePool(name, opts, workers, self.connections, progress_interval)
+        self.dispatch = DispatchStats()
+        self.started = time.time()
+
+    def warm(self, count=1, urls=()):
+        """
+        为每个预设预先创建 count 个实例，并加载与 urls 主机匹配的提取器
+
+        第一个请求因此不必等待实例创建和提取器模块导入。
+        """
+        from lazy_import import preload_extractors
+
+        for pool in self.pools.values():
+            pool.warm(count)
+        return preload_extractors(urls) if urls else []
+
+    def confine_output_dir(self, output_dir):
+        """
+        把请求中的 output_dir 解析为输出目录下的路径
+
+        相对路径相对于输出目录；解析（含符号链接）后不在输出目录之内时抛出 ServiceError。
+        """
+        root = Path(self.output_dir).resolve()
+        target = (root / output_dir).resolve()
+        if target != root and root not in target.parents:
+            raise ServiceError(f'output_dir 必须位于输出目录之内: {output_dir}')
+        return str(target)
+
+    def _pool(self, profile):
+        pool = self.pools.get(profile)
+        if pool is None:
+            raise ServiceError(f"未知预设: {profile}（可用: {', '.join(self.pools)}）")
+        return pool
+
+    def _run(self, profile, received, fn, emit=None, overrides=None):
+        """取得实例，临时设置 overrides 中的参数，执行 fn(ydl)"""
+        pool = self._pool(profile)
+        item = pool.acquire()
+        ydl, relay = item
+        self.dispatch.record(time.perf_counter() - received)
+        saved = {key: ydl.params.get(key) for key in overrides or {}}
+        ydl.params.update(overrides or {})
+        ydl.errors.clear()
+        relay.bind(emit)
+        try:
+            return fn(ydl, relay)
+        finally:
+            ydl.params.update(saved)
+            pool.release(item)
+
+    def extract(self, url, profile='default', flat=False, received=None):
+        """提取信息（不下载），返回可 JSON 序列化的 info_dict"""
+        received = received or time.perf_counter()
+
+        def extract(ydl, relay):
+            info = ydl.extract_info(url, download=False)
+            if info is None:
+                # ignoreerrors 模式下提取错误不会抛出，只返回 None
+                error = ydl.last_error() if ydl.errors else '提取失败'
+                raise error if isinstance(error, Exception) else yt_dlp.utils.DownloadError(error)
+            return ydl.sanitize_info(info)
+
+        overrides = {'extract_flat': 'in_playlist'} if flat else None
+        return self._run(profile, received, extract, overrides=overrides)
+
+    def download(self, url, profile='default', emit=None, output_dir=None, received=None):
+        """
+        下载，过程中调用 emit(event) 送出进度事件；返回 result 事件
+
+        result: {'event': 'result', 'ok': bool, 'files': [...], 'error': ..., 'kind': ...}
+        """
+        received = received or time.perf_counter()
+
+        def download(ydl, relay):
+            try:
+                ydl.download([url])
+                error = ydl.last_error() if ydl.errors else None
+            except Exception as e:
+                error = e
+            result = {'event': 'result', 'ok': error is None, 'files': relay.files}
+            if error is not None:
+                result['error'] = str(error)
+                result['kind'] = classify_failure(error)
+            return result
+
+        overrides = None
+        if output_dir:
+            overrides = {'paths': {**self._pool(profile).ydl_opts['paths'], 'home': str(output_dir)}}
+        if emit:
+            emit({'event': 'queued', 'profile': profile})
+        return self._run(profile, received, download, emit=emit, overrides=overrides)
+
+    def status(self):
+        return {
+            'uptime': round(time.time() - self.started, 1),
+            'keep_alive': self.connections.keep_alive,
+            'dispatch': self.dispatch.as_dict(),
+            'profiles': {name: pool.status() for name, pool in self.pools.items()},
+        }
+
+    def close(self):
+        for pool in self.pools.values():
+            pool.close()
+        self.connections.close()
+
+
+class ServiceServer:
+    """
+    DownloadService 的 HTTP 接口，在后台线程中运行
+
+    Args:
+        service: DownloadService
+        port: TCP 端口（与 unix_socket 二选一）
+        host: 监听地址，默认只监听本机
+        unix_socket: Unix 套接字路径
+    """
+
+    def __init__(self, service, port=None, host='127.0.0.1', unix_socket=None):
+        import socketserver
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send_json(self, status, payload):
+                body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _read_request(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    request = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError as e:
+                    raise ServiceError(f'请求不是合法的 JSON: {e}')
+                if not isinstance(request, dict) or not request.get('url'):
+                    raise ServiceError('请求需要包含 url')
+                service._pool(request.get('profile', 'default'))
+                if request.get('output_dir'):
+                    if not isinstance(request['output_dir'], str):
+                        raise ServiceError('output_dir 应为字符串')
+                    # 客户端不可信，只能写入服务输出目录之内
+                    request['output_dir'] = service.confine_output_dir(request['output_dir'])
+                return request
+
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+                if path == '/health':
+                    self._send_json(200, service.status())
+                elif path == '/profiles':
+                    self._send_json(200, {name: pool.ydl_opts.get('format') for name, pool in service.pools.items()})
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                received = time.perf_counter()
+                path = self.path.split('?', 1)[0]
+                if path not in ('/extract', '/download'):
+                    self.send_error(404)
+                    return
+                try:
+                    request = self._read_request()
+                except ServiceError as e:
+                    self._send_json(400, {'error': str(e)})
+                    return
+                profile = request.get('profile', 'default')
+                if path == '/extract':
+                    try:
+                        info = service.extract(request['url'], profile, bool(request.get('flat')), received)
+                    except Exception as e:
+                        self._send_json(502, {'error': str(e), 'kind': classify_failure(e)})
+                        return
+                    self._send_json(200, info)
+                    return
+
+                # 逐行送出事件，客户端断开时写入失败，下载随之中断
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+                self.send_header('Cache-Control', 'no-cache')
+                self.end_headers()
+
+                write_lock = threading.Lock()
+
+                def emit(event):
+                    # 分片并发下载时进度事件来自多个线程
+                    line = json.dumps(event, ensure_ascii=False).encode('utf-8') + b'\n'
+                    with write_lock:
+                        self.wfile.write(line)
+                        self.wfile.flush()
+
+                result = service.download(request['url'], profile, emit, request.get('output_dir'), received)
+                try:
+                    emit(result)
+                except OSError:
+                    pass
+
+            def address_string(self):
+                # Unix 套接字的 client_address 为空字符串
+                return self.client_address[0] if self.client_address else 'unix'
+
+            def log_message(self, format, *args):
+                pass
+
+        if unix_socket:
+            class UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+                daemon_threads = True
+
+            if os.path.exists(unix_socket):
+                os.unlink(unix_socket)
+            self._server = UnixServer(unix_socket, Handler)
+            self._unix_socket = unix_socket
+        else:
+            self._server = ThreadingHTTPServer((host, port), Handler)
+            self._server.daemon_threads = True
+            self._unix_socket = None
+        self._thread = threading.Thread(target=self._server.serve_forever, name='service-http', daemon=True)
+
+    @property
+    def address(self):
+        if self._unix_socket:
+            return f'unix:{self._unix_socket}'
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._unix_socket and os.path.exists(self._unix_socket):
+            os.unlink(self._unix_socket)
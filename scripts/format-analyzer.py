@@ -6,15 +6,22 @@
 """
 
 import argparse
+import collections
+import itertools
 import json
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-try:
-    import yt_dlp
-except ImportError:
-    print("错误: 需要安装 yt-dlp")
-    print("请运行: pip install yt-dlp")
-    sys.exit(1)
+from lazy_import import LazyModule, preload, startup_profile
+
+# 第一次使用时才导入，--help 和参数错误时不必等待 yt-dlp 加载
+yt_dlp = LazyModule('yt_dlp', install_hint='pip install yt-dlp')
+
+from connection_pool import ConnectionPool
+from format_index import FormatIndex
+from info_cache import DEFAULT_MAX_BYTES, DEFAULT_TTL, InfoCache
+from url_source import iter_urls
 
 
 def format_size(size):
@@ -28,84 +35,187 @@ def format_size(size):
     return f"{size:.1f}TB"
 
 
-def analyze_formats(url, verbose=False):
-    """分析视频格式"""
-    ydl_opts = {
-        'quiet': True,
-        'no_warnings': True,
-        'extract_flat': False,
-    }
+YDL_OPTS = {
+    'quiet': True,
+    'no_warnings': True,
+    'extract_flat': False,
+}
+
+
+def extract_info_cached(url, cache=None, refresh=False, ydl=None):
+    """
+    提取视频信息
+
+    提供 cache 时优先读取缓存，refresh=True 时强制重新提取；
+    提供 ydl 时复用该 YoutubeDL 实例，否则临时创建一个。
+    """
+    if cache and not refresh:
+        info = cache.get(url)
+        if info is not None:
+            return info
+
+    if ydl is None:
+        with yt_dlp.YoutubeDL(YDL_OPTS) as ydl:
+            return extract_info_cached(url, cache, refresh=True, ydl=ydl)
+
+    info = ydl.sanitize_info(ydl.extract_info(url, download=False))
+    if cache:
+        cache.put(url, info)
+    return info
 
-    try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-
-            print(f"\n标题: {info.get('title', 'N/A')}")
-            print(f"上传者: {info.get('uploader', 'N/A')}")
-            print(f"时长: {info.get('duration_string', 'N/A')}")
-            print(f"观看次数: {info.get('view_count', 'N/A')}")
-            print("\n" + "=" * 100)
-
-            formats = info.get('formats', [])
-            if not formats:
-                print("没有找到可用格式")
-                return
-
-            # 按格式分组
-            video_only = []
-            audio_only = []
-            combined = []
-
-            for f in formats:
-                vcodec = f.get('vcodec', 'none')
-                acodec = f.get('acodec', 'none')
-
-                if vcodec == 'none' and acodec != 'none':
-                    audio_only.append(f)
-                elif acodec == 'none' and vcodec != 'none':
-                    video_only.append(f)
-                else:
-                    combined.append(f)
-
-            # 显示格式
-            print("\n【已合并视频+音频】\n")
-            if combined:
-                print_format_table(combined, verbose)
-            else:
-                print("无")
-
-            print("\n【仅视频】\n")
-            if video_only:
-                print_format_table(video_only, verbose)
-            else:
-                print("无")
-
-            print("\n【仅音频】\n")
-            if audio_only:
-                print_format_table(audio_only, verbose)
-            else:
-                print("无")
-
-            # 推荐格式
-            print("\n" + "=" * 100)
-            print("\n【推荐格式】\n")
-            print_recommendations(video_only, audio_only, combined)
-
-            # 格式选择命令
-            print("\n" + "=" * 100)
-            print("\n【格式选择命令示例】\n")
-            print_command_examples(info)
 
+def analyze_formats(url, verbose=False, cache=None, refresh=False):
+    """分析视频格式"""
+    try:
+        info = extract_info_cached(url, cache, refresh)
+        print_analysis(info, verbose)
     except Exception as e:
         print(f"错误: {e}")
         sys.exit(1)
 
 
-def print_format_table(formats, verbose):
-    """打印格式表格"""
-    # 排序：按高度降序
-    formats = sorted(formats, key=lambda f: f.get('height', 0), reverse=True)
+def analyze_many(urls, verbose=False, jobs=1, cache=None, refresh=False, output='text'):
+    """
+    并发分析多个 URL，按输入顺序输出结果
+
+    每个 worker 线程复用同一个 YoutubeDL 实例，所有实例共享一个连接池，
+    同一主机的连接在 URL 之间复用；最多提前提取 jobs * 4 个 URL，
+    输入可以是生成器。单个 URL 出错时打印错误并继续，返回失败数。
+
+    output 为 json 时输出一个 JSON 数组，为 ndjson 时每行一条记录；两者都在
+    每个结果就绪时立即输出。出错的 URL 输出 {"url": ..., "error": ...}。
+    """
+    local = threading.local()
+    pool = ConnectionPool(maxsize=jobs)
+    instances = []
+    instances_lock = threading.Lock()
+
+    def work(url):
+        # 缓存命中时不创建 YoutubeDL，全部命中时不需要导入 yt-dlp
+        if cache and not refresh:
+            info = cache.get(url)
+            if info is not None:
+                return info
+        ydl = getattr(local, 'ydl', None)
+        if ydl is None:
+            ydl = local.ydl = pool.attach(yt_dlp.YoutubeDL(YDL_OPTS))
+            with instances_lock:
+                instances.append(ydl)
+        return extract_info_cached(url, cache, refresh=True, ydl=ydl)
+
+    failed = 0
+    count = 0
+
+    def emit(url, future):
+        nonlocal failed, count
+        if output == 'text':
+            if count:
+                print("\n" + "=" * 100 + "\n")
+            try:
+                print_analysis(future.result(), verbose)
+            except Exception as e:
+                failed += 1
+                print(f"错误: {url}: {e}")
+        else:
+            try:
+                record = analysis_record(url, future.result())
+            except Exception as e:
+                failed += 1
+                record = {'url': url, 'error': str(e)}
+            line = json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+            if output == 'json':
+                line = ('[' if not count else ',') + line
+            print(line, flush=True)
+        count += 1
+
+    window = collections.deque()
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            for url in urls:
+                window.append((url, executor.submit(work, url)))
+                if len(window) >= jobs * 4:
+                    emit(*window.popleft())
+            while window:
+                emit(*window.popleft())
+    finally:
+        for ydl in instances:
+            pool.detach(ydl)
+            ydl.close()
+        pool.close()
+        if output == 'json':
+            print(']' if count else '[]')
+    return failed
+
+
+# JSON 输出中每个格式保留的字段
+RECORD_FORMAT_FIELDS = (
+    'format_id', 'ext', 'protocol', 'width', 'height', 'fps', 'vcodec', 'acodec',
+    'vbr', 'abr', 'tbr', 'filesize', 'filesize_approx', 'format_note',
+)
+
+
+def analysis_record(url, info):
+    """单个视频的分析结果，供 JSON/NDJSON 输出"""
+    index = FormatIndex(info.get('formats'))
+
+    def compact(group):
+        return [{k: f[k] for k in RECORD_FORMAT_FIELDS if f.get(k) is not None} for f in index.by_height(group)]
+
+    return {
+        'url': url,
+        'id': info.get('id'),
+        'title': info.get('title'),
+        'uploader': info.get('uploader'),
+        'duration': info.get('duration'),
+        'view_count': info.get('view_count'),
+        'webpage_url': info.get('webpage_url'),
+        'formats': {
+            'combined': compact('combined'),
+            'video_only': compact('video_only'),
+            'audio_only': compact('audio_only'),
+        },
+        'recommendations': recommend_formats(index),
+        'selectors': SELECTOR_EXAMPLES,
+    }
+
+
+def print_analysis(info, verbose):
+    """打印单个视频的格式分析结果"""
+    print(f"\n标题: {info.get('title', 'N/A')}")
+    print(f"上传者: {info.get('uploader', 'N/A')}")
+    print(f"时长: {info.get('duration_string', 'N/A')}")
+    print(f"观看次数: {info.get('view_count', 'N/A')}")
+    print("\n" + "=" * 100)
+
+    formats = info.get('formats', [])
+    if not formats:
+        print("没有找到可用格式")
+        return
+
+    # 一次遍历完成分组和排序
+    index = FormatIndex(formats)
 
+    # 显示格式
+    for title, group in (('已合并视频+音频', 'combined'), ('仅视频', 'video_only'), ('仅音频', 'audio_only')):
+        print(f"\n【{title}】\n")
+        if getattr(index, group):
+            print_format_table(index.by_height(group), verbose)
+        else:
+            print("无")
+
+    # 推荐格式
+    print("\n" + "=" * 100)
+    print("\n【推荐格式】\n")
+    print_recommendations(index)
+
+    # 格式选择命令
+    print("\n" + "=" * 100)
+    print("\n【格式选择命令示例】\n")
+    print_command_examples(info)
+
+
+def print_format_table(formats, verbose):
+    """打印格式表格（formats 已按高度降序排列，见 FormatIndex.by_height）"""
     if verbose:
         print(f"{'ID':<12} {'扩展名':<6} {'分辨率':<10} {'帧率':<6} {'文件大小':<10} {'比特率':<12} {'编解码器'}")
         print("-" * 100)
@@ -143,51 +253,76 @@ def print_format_table(formats, verbose):
         print(f"\n... 还有 {len(formats) - (20 if verbose else 15)} 个格式")
 
 
-def print_recommendations(video_only, audio_only, combined):
-    """打印推荐格式"""
+def recommend_formats(index):
+    """
+    根据 FormatIndex 计算推荐格式
 
-    # 最佳 1080p
-    best_1080p = None
-    for f in video_only:
-        if f.get('height') == 1080:
-            best_1080p = f
-            break
-
-    if best_1080p:
-        audio = max(audio_only, key=lambda x: x.get('abr', 0)) if audio_only else None
-        if audio:
-            print(f"1080p: -f {best_1080p['format_id']}+{audio['format_id']}")
-            print(f"       文件大小约: {format_size(best_1080p.get('filesize') + audio.get('filesize'))}")
-
-    # 最佳 720p
-    best_720p = None
-    for f in video_only:
-        if f.get('height') == 720:
-            best_720p = f
-            break
-
-    if best_720p:
-        audio = max(audio_only, key=lambda x: x.get('abr', 0)) if audio_only else None
-        if audio:
-            print(f"720p:  -f {best_720p['format_id']}+{audio['format_id']}")
-            print(f"       文件大小约: {format_size(best_720p.get('filesize') + audio.get('filesize'))}")
+    返回列表，每项包含 label（1080p/720p/mp4/audio）、selector（-f 参数），
+    以及 filesize（预估大小，缺少数据时为 None）或 abr（音频比特率）。
+    """
+    recommendations = []
+    best_audio = index.best_audio()
 
-    # 最佳 MP4（兼容性好）
-    best_mp4 = None
-    for f in combined:
-        if f.get('ext') == 'mp4':
-            if not best_mp4 or (f.get('height') and f.get('height') > best_mp4.get('height', 0)):
-                best_mp4 = f
+    # 最佳 1080p / 720p
+    for height in (1080, 720):
+        video = index.best_video(height)
+        if video and video.get('height') == height and best_audio:
+            recommendations.append({
+                'label': f'{height}p',
+                'selector': f"{video['format_id']}+{best_audio['format_id']}",
+                'filesize': sum_filesize(video, best_audio),
+            })
 
+    # 最佳 MP4（兼容性好）
+    best_mp4 = index.best_mp4
     if best_mp4:
-        print(f"MP4:   -f {best_mp4['format_id']}")
-        print(f"       文件大小约: {format_size(best_mp4.get('filesize'))}")
+        recommendations.append({
+            'label': 'mp4',
+            'selector': best_mp4['format_id'],
+            'filesize': best_mp4.get('filesize'),
+        })
 
     # 最佳音频
-    if audio_only:
-        best_audio = max(audio_only, key=lambda x: x.get('abr', 0))
-        print(f"音频:  -f {best_audio['format_id']}")
-        print(f"       比特率: {best_audio.get('abr')}k")
+    if best_audio:
+        recommendations.append({
+            'label': 'audio',
+            'selector': best_audio['format_id'],
+            'abr': best_audio.get('abr'),
+        })
+
+    return recommendations
+
+
+def sum_filesize(*formats):
+    """多个格式的总大小，任一缺少 filesize 时返回 None"""
+    sizes = [f.get('filesize') for f in formats]
+    return sum(sizes) if all(sizes) else None
+
+
+RECOMMENDATION_LABELS = {
+    '1080p': '1080p: ',
+    '720p': '720p:  ',
+    'mp4': 'MP4:   ',
+    'audio': '音频:  ',
+}
+
+
+def print_recommendations(index):
+    """打印推荐格式"""
+    for rec in recommend_formats(index):
+        print(f"{RECOMMENDATION_LABELS[rec['label']]}-f {rec['selector']}")
+        if rec['label'] == 'audio':
+            print(f"       比特率: {rec['abr']}k")
+        else:
+            print(f"       文件大小约: {format_size(rec['filesize'])}")
+
+
+# 通用格式选择器，命令示例和 JSON 输出共用
+SELECTOR_EXAMPLES = {
+    'best': 'bestvideo+bestaudio',
+    'mp4_1080': 'bestvideo[height<=1080][ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best',
+    'audio': 'bestaudio',
+}
 
 
 def print_command_examples(info):
@@ -195,10 +330,10 @@ def print_command_examples(info):
     title = info.get('title', 'video')
 
     print(f"# 下载最佳质量")
-    print(f'yt-dlp -f "bestvideo+bestaudio" "{info["webpage_url"]}"')
+    print(f'yt-dlp -f "{SELECTOR_EXAMPLES["best"]}" "{info["webpage_url"]}"')
 
     print(f"\n# 下载 1080p 或以下最佳 MP4")
-    print(f'yt-dlp -f "bestvideo[height<=1080][ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best" "{info["webpage_url"]}"')
+    print(f'yt-dlp -f "{SELECTOR_EXAMPLES["mp4_1080"]}" "{info["webpage_url"]}"')
 
     print(f"\n# 只下载音频（MP3）")
     print(f'yt-dlp -x --audio-format mp3 "{info["webpage_url"]}"')
@@ -224,6 +359,15 @@ def main():
 
   # 从文件读取 URL
   python format_analyzer.py -f urls.txt
+
+  # 8 个并发 worker 分析大量 URL（按输入顺序输出）
+  python format_analyzer.py -f urls.txt -j 8
+
+  # 每个 URL 输出一行 JSON，供其他程序读取
+  python format_analyzer.py -f urls.txt --output ndjson
+
+  # 忽略缓存，重新提取
+  python format_analyzer.py --refresh https://www.youtube.com/watch?v=xxx
         """
     )
 
@@ -244,28 +388,87 @@ def main():
         help='详细输出'
     )
 
-    args = parser.parse_args()
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=1,
+        help='分析多个 URL 时的并发数，结果仍按输入顺序输出 (默认: 1)'
+    )
+
+    parser.add_argument(
+        '--output',
+        choices=['text', 'json', 'ndjson'],
+        default='text',
+        help='输出格式：text 为表格，json/ndjson 为机器可读记录 (默认: text)'
+    )
 
-    urls = []
+    parser.add_argument(
+        '--cache-dir',
+        help='info_dict 缓存目录 (默认: ~/.cache/yt-dlp-skill/info)'
+    )
 
-    if args.file:
-        with open(args.file, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#'):
-                    urls.append(line)
+    parser.add_argument(
+        '--cache-ttl',
+        type=int,
+        default=DEFAULT_TTL,
+        help=f'缓存有效期，秒 (默认: {DEFAULT_TTL})'
+    )
 
-    if args.url:
-        urls.append(args.url)
+    parser.add_argument(
+        '--cache-size',
+        type=int,
+        default=DEFAULT_MAX_BYTES // (1024 * 1024),
+        help=f'缓存目录大小上限，MB (默认: {DEFAULT_MAX_BYTES // (1024 * 1024)})'
+    )
+
+    parser.add_argument(
+        '--refresh',
+        action='store_true',
+        help='忽略缓存，重新提取并更新缓存'
+    )
+
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='不使用缓存'
+    )
+
+    parser.add_argument(
+        '--profile-startup',
+        action='store_true',
+        help='退出时在 stderr 输出启动各阶段耗时（导入 yt-dlp、预加载提取器等）'
+    )
+
+    args = parser.parse_args()
+    if args.profile_startup:
+        startup_profile.enable()
+    startup_profile.mark('参数解析完成')
 
-    if not urls:
+    if args.jobs < 1:
+        parser.error('--jobs 必须大于等于 1')
+
+    if not args.file and not args.url:
         print("错误: 没有提供 URL")
         sys.exit(1)
 
-    for url in urls:
-        analyze_formats(url, args.verbose)
-        if len(urls) > 1:
-            print("\n" + "=" * 100 + "\n")
+    cache = None
+    if not args.no_cache:
+        cache = InfoCache(args.cache_dir, ttl=args.cache_ttl, max_bytes=args.cache_size * 1024 * 1024)
+
+    # 单个 URL 命中缓存时完全不需要 yt-dlp；其余情况在后台导入并加载 URL 对应的提取器，
+    # 主线程同时读取 URL 文件
+    if args.file or cache is None or args.refresh:
+        preload(yt_dlp, [args.url] if args.url else [])
+
+    if not args.file and args.output == 'text':
+        analyze_formats(args.url, args.verbose, cache, args.refresh)
+        return
+
+    urls = iter_urls(args.file) if args.file else iter(())
+    if args.url:
+        urls = itertools.chain(urls, [args.url])
+    if analyze_many(urls, args.verbose, args.jobs, cache, args.refresh, args.output):
+        sys.exit(1)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,134 @@
+"""
+格式索引
+
+一次遍历 info_dict['formats']，完成分组（仅视频 / 仅音频 / 已合并）和排序，
+之后的查询不再重复扫描:
+
+- best_video(max_height)   不高于指定高度的最佳视频流，O(log n)
+- best_audio(ext=None)     比特率最高的音频流（可限定扩展名），O(1)
+- best_mp4                 分辨率最高的已合并 MP4，O(1)
+
+"最佳" 的含义与 yt-dlp 一致：yt-dlp 按质量从低到高排列 formats，同等条件下
+位置越靠后越好。format-analyzer.py 的推荐和 batch-download.py 的 --max-height
+都基于这里的查询。
+"""
+
+import bisect
+
+# 视频与音频合并时兼容的音频扩展名
+COMPATIBLE_AUDIO_EXT = {
+    'mp4': 'm4a',
+    'webm': 'webm',
+}
+
+
+class FormatRecord:
+    """单个格式的排序键和原始 dict"""
+
+    __slots__ = ('format_id', 'ext', 'height', 'abr', 'order', 'format')
+
+    def __init__(self, f, order):
+        self.format_id = f.get('format_id')
+        self.ext = f.get('ext')
+        self.height = f.get('height') or 0
+        self.abr = f.get('abr') or 0
+        self.order = order
+        self.format = f
+
+
+class FormatIndex:
+    """对一个视频的全部格式建立索引"""
+
+    def __init__(self, formats):
+        self.video_only = []
+        self.audio_only = []
+        self.combined = []
+        self._best_audio = None
+        self._best_audio_by_ext = {}
+        self._best_mp4 = None
+
+        for order, f in enumerate(formats or ()):
+            vcodec = f.get('vcodec', 'none')
+            acodec = f.get('acodec', 'none')
+            record = FormatRecord(f, order)
+
+            if vcodec == 'none' and acodec != 'none':
+                self.audio_only.append(record)
+                # 比特率相同时保留先出现的，与 max() 的行为一致
+                if self._best_audio is None or record.abr > self._best_audio.abr:
+                    self._best_audio = record
+                best = self._best_audio_by_ext.get(record.ext)
+                if best is None or record.abr > best.abr:
+                    self._best_audio_by_ext[record.ext] = record
+            elif acodec == 'none' and vcodec != 'none':
+                self.video_only.append(record)
+            else:
+                self.combined.append(record)
+                if record.ext == 'mp4' and (self._best_mp4 is None or record.height > self._best_mp4.height):
+                    self._best_mp4 = record
+
+        # 仅视频按 (高度, 位置) 升序，供二分查找
+        self.video_only.sort(key=lambda r: (r.height, r.order))
+        self._video_heights = [r.height for r in self.video_only]
+
+    def best_video(self, max_height=None):
+        """不高于 max_height 的最佳仅视频格式，没有时返回 None"""
+        if max_height is None:
+            i = len(self.video_only)
+        else:
+            i = bisect.bisect_right(self._video_heights, max_height)
+        return self.video_only[i - 1].format if i else None
+
+    def best_audio(self, ext=None):
+        """比特率最高的仅音频格式，可限定扩展名"""
+        record = self._best_audio if ext is None else self._best_audio_by_ext.get(ext)
+        return record.format if record else None
+
+    @property
+    def best_mp4(self):
+        """分辨率最高的已合并 MP4 格式"""
+        return self._best_mp4.format if self._best_mp4 else None
+
+    def by_height(self, group):
+        """按高度降序排列的格式列表，用于展示"""
+        records = getattr(self, group)
+        return [r.format for r in sorted(records, key=lambda r: r.height, reverse=True)]
+
+    def groups(self):
+        """按原始顺序返回 (仅视频, 仅音频, 已合并) 三组格式 dict"""
+        def originals(records):
+            return [r.format for r in sorted(records, key=lambda r: r.order)]
+        return originals(self.video_only), originals(self.audio_only), originals(self.combined)
+
+
+def merge_formats(video, audio):
+    """把视频流和音频流组合成 yt-dlp 可以直接下载的合并格式"""
+    compatible = COMPATIBLE_AUDIO_EXT.get(video.get('ext')) == audio.get('ext')
+    return {
+        'format_id': f"{video['format_id']}+{audio['format_id']}",
+        'ext': video.get('ext') if compatible else 'mkv',
+        'requested_formats': [video, audio],
+        'protocol': f"{video.get('protocol')}+{audio.get('protocol')}",
+    }
+
+
+def max_height_selector(max_height):
+    """
+    yt-dlp 的自定义格式选择函数：不高于 max_height 的最佳视频 + 最佳兼容音频，
+    没有可合并的视频流时退回到不高于该高度的最佳已合并格式。
+    """
+    def select(ctx):
+        index = FormatIndex(ctx['formats'])
+        video = index.best_video(max_height)
+        if video:
+            audio = index.best_audio(COMPATIBLE_AUDIO_EXT.get(video.get('ext'))) or index.best_audio()
+            if audio:
+                yield merge_formats(video, audio)
+                return
+            yield video
+            return
+
+        combined = [r for r in index.combined if r.height <= max_height]
+        if combined:
+            yield max(combined, key=lambda r: (r.height, r.order)).format
+    return select
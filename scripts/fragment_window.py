@@ -0,0 +1,199 @@
+"""
+HLS/DASH 分片并发下载（有界窗口、按序拼接）
+
+yt-dlp 的 concurrent_fragment_downloads 用 ThreadPoolExecutor.map 一次性提交
+全部分片，已下载但还不能拼接的分片文件数量只受分片总数限制。这里的实现
+最多同时持有 window 个分片（下载中 + 已下载待拼接），按顺序等待最早的分片
+完成后立即追加到输出文件，再补充提交下一个分片，占用只与窗口大小有关，
+与文件大小无关。
+
+断点续传沿用 yt-dlp 的分片级机制：每追加一个分片就更新 .ytdl 文件中的
+当前分片序号，.part 文件以追加方式打开；再次下载同一视频时（--resume 或
+自动重试）从最后追加的分片之后继续。窗口中已下载但尚未拼接的分片会重新下载。
+
+并发分支改写自 yt-dlp 的 FragmentFD.download_and_append_fragments（在
+TESTED_YTDLP_VERSION 上验证），依赖其私有方法。enable_windowed_fragments()
+先检查这些方法的签名，与预期不符时不做替换，继续使用 yt-dlp 自带的实现。
+
+用法:
+    enable_windowed_fragments()
+    ydl_opts['concurrent_fragment_downloads'] = 8
+    ydl_opts['fragment_window'] = 32
+"""
+
+import collections
+import concurrent.futures
+import inspect
+import math
+
+from yt_dlp import downloader as yt_downloader
+from yt_dlp.downloader.dash import DashSegmentsFD
+from yt_dlp.downloader.fragment import FragmentFD
+from yt_dlp.downloader.hls import HlsFD
+from yt_dlp.networking.exceptions import HTTPError, IncompleteRead
+from yt_dlp.utils import DownloadError, RetryManager
+from yt_dlp.utils.networking import HTTPHeaderDict
+
+# 未指定 fragment_window 时，窗口为并发数的倍数
+DEFAULT_WINDOW_FACTOR = 4
+
+# 验证过的 yt-dlp 版本
+TESTED_YTDLP_VERSION = '2026.08.19'
+
+# 用到的 FragmentFD 方法及其参数（不含 self），与此不符时不做替换
+_REQUIRED_SIGNATURES = {
+    'download_and_append_fragments': (
+        'ctx', 'fragments', 'info_dict', 'is_fatal', 'pack_func', 'finish_func', 'tpe', 'interrupt_trigger'),
+    '_download_fragment': ('ctx', 'frag_url', 'info_dict', 'headers', 'request_data'),
+    '_append_fragment': ('ctx', 'frag_content'),
+    '_read_fragment': ('ctx',),
+    '_finish_frag_download': ('ctx', 'info_dict'),
+    '_finish_multiline_status': (),
+    'decrypter': ('info_dict',),
+    'report_retry': ('err', 'count', 'retries', 'frag_index', 'fatal'),
+    'report_skip_fragment': ('frag_index', 'err'),
+}
+
+
+class WindowedFragmentsMixin:
+    """替换 FragmentFD.download_and_append_fragments 的并发分支"""
+
+    def download_and_append_fragments(
+            self, ctx, fragments, info_dict, *, is_fatal=(lambda idx: False),
+            pack_func=(lambda content, idx: content), finish_func=None,
+            tpe=None, interrupt_trigger=(True, )):
+        max_workers = math.ceil(
+            self.params.get('concurrent_fragment_downloads', 1) / ctx.get('max_progress', 1))
+        if max_workers <= 1 or info_dict.get('is_live'):
+            # 顺序下载和直播保持 yt-dlp 原有行为
+            return super().download_and_append_fragments(
+                ctx, fragments, info_dict, is_fatal=is_fatal, pack_func=pack_func,
+                finish_func=finish_func, tpe=tpe, interrupt_trigger=interrupt_trigger)
+
+        if not self.params.get('skip_unavailable_fragments', True):
+            is_fatal = lambda _: True
+        window = max(self.params.get('fragment_window') or max_workers * DEFAULT_WINDOW_FACTOR, max_workers)
+        decrypt_fragment = self.decrypter(info_dict)
+
+        def download_fragment(fragment):
+            # 与 yt-dlp 的实现相同，只是在 ctx 的副本上进行，供多个线程同时使用
+            frag_ctx = ctx.copy()
+            if not interrupt_trigger[0]:
+                return fragment, None
+            frag_index = frag_ctx['fragment_index'] = fragment['frag_index']
+            frag_ctx['last_error'] = None
+            headers = HTTPHeaderDict(info_dict.get('http_headers'))
+            byte_range = fragment.get('byte_range')
+            if byte_range:
+                headers['Range'] = 'bytes=%d-%d' % (byte_range['start'], byte_range['end'] - 1)
+
+            fatal = is_fatal(fragment.get('index') or (frag_index - 1))
+
+            def error_callback(err, count, retries):
+                self.report_retry(err, count, retries, frag_index, fatal)
+                frag_ctx['last_error'] = err
+
+            for retry in RetryManager(self.params.get('fragment_retries'), error_callback):
+                try:
+                    frag_ctx['fragment_count'] = fragment.get('fragment_count')
+                    if not self._download_fragment(
+                            frag_ctx, fragment['url'], info_dict, headers, info_dict.get('request_data')):
+                        return fragment, None
+                except (HTTPError, IncompleteRead) as err:
+                    retry.error = err
+                    continue
+                except DownloadError:
+                    if fatal:
+                        raise
+            return fragment, frag_ctx.get('fragment_filename_sanitized')
+
+        def append_fragment(fragment, frag_filename):
+            frag_index = fragment['frag_index']
+            # 下载线程的进度回调会并发修改 ctx['fragment_index']，
+            # 写入 .ytdl 时使用副本，保证记录的是已按序追加的最后一个分片
+            append_ctx = {**ctx, 'fragment_filename_sanitized': frag_filename, 'fragment_index': frag_index}
+            frag_content = decrypt_fragment(fragment, self._read_fragment(append_ctx))
+            if frag_content:
+                # 同时更新 .ytdl 中的分片序号，中断后从这里继续
+                self._append_fragment(append_ctx, pack_func(frag_content, frag_index))
+                return True
+            if not is_fatal(frag_index - 1):
+                self.report_skip_fragment(frag_index, 'fragment not found')
+                return True
+            ctx['dest_stream'].close()
+            self.report_error(f'fragment {frag_index} not found, unable to continue')
+            return False
+
+        pool = tpe or concurrent.futures.ThreadPoolExecutor(max_workers, thread_name_prefix='fragment')
+        in_flight = collections.deque()
+        fragments = iter(fragments)
+        try:
+            while True:
+                # 补满窗口
+                while len(in_flight) < window and interrupt_trigger[0]:
+                    fragment = next(fragments, None)
+                    if fragment is None:
+                        break
+                    in_flight.append(pool.submit(download_fragment, fragment))
+                if not in_flight:
+                    break
+                # 按顺序拼接：只等待最早提交的分片，后面已完成的分片留在磁盘上
+                fragment, frag_filename = in_flight.popleft().result()
+                if not append_fragment(fragment, frag_filename):
+                    return False
+        except KeyboardInterrupt:
+            self._finish_multiline_status()
+            self.report_error(
+                'Interrupted by user. Waiting for all threads to shutdown...', is_error=False, tb=False)
+            raise
+        finally:
+            for future in in_flight:
+                future.cancel()
+            if tpe is None:
+                pool.shutdown(wait=True)
+
+        if finish_func is not None:
+            ctx['dest_stream'].write(finish_func())
+            ctx['dest_stream'].flush()
+        return self._finish_frag_download(ctx, info_dict)
+
+
+class WindowedHlsFD(WindowedFragmentsMixin, HlsFD):
+    pass
+
+
+class WindowedDashSegmentsFD(WindowedFragmentsMixin, DashSegmentsFD):
+    pass
+
+
+def is_compatible():
+    """已安装的 yt-dlp 中，改写所依赖的 FragmentFD 方法签名与预期相同"""
+    for name, params in _REQUIRED_SIGNATURES.items():
+        method = getattr(FragmentFD, name, None)
+        if method is None:
+            return False
+        try:
+            actual = tuple(inspect.signature(method).parameters)[1:]
+        except (TypeError, ValueError):
+            return False
+        if actual != params:
+            return False
+    return True
+
+
+def enable_windowed_fragments():
+    """
+    让当前进程中的 yt-dlp 使用有界窗口的分片下载器（可重复调用）
+
+    Returns:
+        是否已替换；yt-dlp 的内部接口与预期不符时返回 False，保持原有下载器
+    """
+    if not is_compatible():
+        return False
+    protocol_map = yt_downloader.PROTOCOL_MAP
+    for protocol, fd in (('m3u8_native', WindowedHlsFD),
+                         ('http_dash_segments', WindowedDashSegmentsFD),
+                         ('http_dash_segments_generator', WindowedDashSegmentsFD)):
+        if protocol_map.get(protocol) in (HlsFD, DashSegmentsFD):
+            protocol_map[protocol] = fd
+    return True
@@ -0,0 +1,132 @@
+"""
+info_dict 磁盘缓存
+
+缓存 extract_info(download=False) 的结果，按规范化 URL 的 SHA-256 命名，
+gzip 压缩的 JSON 存放在缓存目录下。文件 mtime 是写入时间，超过 TTL 即视为
+过期；atime 在每次命中时刷新，目录总大小超过上限时淘汰最久未访问的条目（LRU）。
+
+注意：info_dict 中的格式地址通常带有签名和过期时间（YouTube 约 6 小时），
+用于下载时 TTL 不宜设置得过长。
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from url_dedup import canonicalize_url
+
+DEFAULT_TTL = 3600
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def default_cache_dir():
+    base = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(base) / 'yt-dlp-skill' / 'info'
+
+
+class InfoCache:
+    """
+    info_dict 缓存（线程安全）
+
+    Args:
+        root: 缓存目录，默认 ~/.cache/yt-dlp-skill/info
+        ttl: 条目有效期（秒）
+        max_bytes: 缓存目录大小上限（字节）
+    """
+
+    def __init__(self, root=None, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = Path(root) if root else default_cache_dir()
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._sizes = None
+
+    def _path(self, url):
+        digest = hashlib.sha256(canonicalize_url(url).encode('utf-8')).hexdigest()
+        return self.root / digest[:2] / f'{digest}.json.gz'
+
+    def _scan(self):
+        """首次写入时扫描一次目录，之后在内存中维护各条目大小"""
+        if self._sizes is None:
+            self._sizes = {}
+            if self.root.exists():
+                for path in self.root.glob('*/*.json.gz'):
+                    self._sizes[path] = path.stat().st_size
+        return self._sizes
+
+    def _load(self, url, touch):
+        path = self._path(url)
+        try:
+            mtime = path.stat().st_mtime
+            now = time.time()
+            if now - mtime > self.ttl:
+                return None
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                info = json.load(f)
+            if touch:
+                # 只刷新访问时间，写入时间（TTL 起点）保持不变
+                os.utime(path, (now, mtime))
+        except (OSError, ValueError):
+            return None
+        return info
+
+    def get(self, url):
+        """返回缓存的 info_dict，未命中或已过期时返回 None"""
+        info = self._load(url, touch=True)
+        # 多个提取 worker 同时调用
+        with self._lock:
+            if info is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return info
+
+    def peek(self, url):
+        """与 get() 相同，但不计入命中统计、不刷新访问时间（供调度等只读查看使用）"""
+        return self._load(url, touch=False)
+
+    def put(self, url, info):
+        """写入经过 YoutubeDL.sanitize_info 处理、可序列化为 JSON 的 info_dict"""
+        path = self._path(url)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f'{path.name}.{threading.get_ident()}.tmp')
+        with gzip.open(tmp, 'wt', encoding='utf-8', compresslevel=3) as f:
+            json.dump(info, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+        with self._lock:
+            sizes = self._scan()
+            sizes[path] = path.stat().st_size
+            if sum(sizes.values()) > self.max_bytes:
+                self._evict(sizes)
+
+    def _evict(self, sizes):
+        """按访问时间从旧到新删除，直到降到上限的 90%"""
+        target = self.max_bytes * 0.9
+        total = sum(sizes.values())
+        entries = []
+        for path in sizes:
+            try:
+                entries.append((path.stat().st_atime, path))
+            except OSError:
+                entries.append((0, path))
+        for _, path in sorted(entries):
+            if total <= target:
+                break
+            total -= sizes.pop(path)
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            for path in list(self._scan()):
+                path.unlink(missing_ok=True)
+            self._sizes = {}
@@ -0,0 +1,267 @@
+"""
+批量任务调度顺序
+
+默认按文件顺序处理，排在前面的 8 GB 直播回放会让后面几百个短视频一直等待。
+JobOrder 在两个位置调整顺序:
+
+- 派发前：从 URL 序列中预读 lookahead 个，按策略选出下一个派发的 URL。
+  此时只有 URL 文件中的优先级标记和信息缓存（--info-cache）中的元数据可用。
+- 两阶段模式（--prefetch）的待下载队列：提取完成的 info_dict 已带有文件大小，
+  下载 worker 按策略从队列中挑选，而不是先进先出。这是按大小调度真正生效的位置，
+  预提取越多（--queue-depth），可供挑选的任务越多。
+
+策略:
+
+- fifo: 保持原顺序
+- sjf: 预计字节数最少的优先（filesize，其次 filesize_approx，再次 tbr × duration），
+  未知大小按已知任务的平均值计
+- fair: 各站点轮流，同一站点内保持原顺序，一个站点的大量 URL 不会挡住其他站点
+
+无论哪种策略，URL 文件中标记的优先级都先于策略生效（数字大的先处理）:
+
+    https://www.youtube.com/watch?v=xxx priority=10
+
+为避免大文件一直被插队（例如持续追加的 URL 列表中总有更小的任务），任务被后来者
+越过并等待超过 max_delay 秒后立即处理。
+
+刚开始时待下载队列中只有最先提取完的几个任务，下载 worker 立即取走它们就等于
+没有选择（列表开头的大文件照样先下载）。sjf/fair 策略下，运行开始后的 settle 秒
+内，队列未满且仍有提取在进行时，下载 worker 会等待更多任务提取完成再挑选；
+提取空闲（例如列表很短、已经全部提取完）时立即开始，settle 秒之后不再等待。
+"""
+
+import contextlib
+import threading
+import time
+from urllib.parse import urlsplit
+
+POLICIES = ('fifo', 'sjf', 'fair')
+
+# 派发前预读的 URL 数
+DEFAULT_LOOKAHEAD = 64
+
+# 任务被后来者越过后最多等待的时间（秒）
+DEFAULT_MAX_DELAY = 600.0
+
+# 运行开始后等待待下载队列积累候选任务的最长时间（秒）
+DEFAULT_SETTLE = 2.0
+
+
+def estimate_size(info):
+    """按 yt-dlp 选中的格式估算下载字节数，无法估算时返回 None"""
+    if not info or info.get('_type', 'video') != 'video':
+        return None
+    total = 0
+    for f in info.get('requested_formats') or [info]:
+        size = f.get('filesize') or f.get('filesize_approx')
+        if not size and f.get('tbr') and info.get('duration'):
+            # tbr 单位为 KBit/s
+            size = f['tbr'] * 1000 / 8 * info['duration']
+        if not size:
+            return None
+        total += size
+    return int(total)
+
+
+def site_of(url):
+    host = (urlsplit(url).hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+class _Item:
+    __slots__ = ('seq', 'url', 'value', 'priority', 'size', 'site', 'added')
+
+    def __init__(self, seq, url, value, priority, size, site):
+        self.seq = seq
+        self.url = url
+        self.value = value
+        self.priority = priority
+        self.size = size
+        self.site = site
+        self.added = time.monotonic()
+
+
+class _Selector:
+    """按策略从候选任务中选出下一个（调用方负责加锁）"""
+
+    def __init__(self, policy, max_delay):
+        self.policy = policy
+        self.max_delay = max_delay
+        self.items = []
+        self._seq = 0
+        # 站点最近一次被选中的序号，fair 策略选最久未被选中的站点
+        self._served = {}
+        self._tick = 0
+        self._known = 0
+        self._known_bytes = 0
+        self.reordered = 0
+
+    def add(self, url, value, priority, size):
+        self._seq += 1
+        if size:
+            self._known += 1
+            self._known_bytes += size
+        self.items.append(_Item(self._seq, url, value, priority, size, site_of(url)))
+
+    def _key(self, item):
+        if self.policy == 'sjf':
+            size = item.size
+            if size is None:
+                size = self._known_bytes / self._known if self._known else 0
+            return (-item.priority, size, item.seq)
+        if self.policy == 'fair':
+            return (-item.priority, self._served.get(item.site, 0), item.seq)
+        return (-item.priority, item.seq)
+
+    def pop(self):
+        # 候选数量不超过预读窗口或待下载队列深度，线性扫描即可；
+        # 队列中最早的任务等待过久时直接处理它
+        oldest = min(self.items, key=lambda item: item.seq)
+        if time.monotonic() - oldest.added >= self.max_delay:
+            chosen = oldest
+        else:
+            chosen = min(self.items, key=self._key)
+        self.items.remove(chosen)
+        if chosen is not oldest:
+            self.reordered += 1
+        self._tick += 1
+        self._served[chosen.site] = self._tick
+        return chosen
+
+
+class ReadyQueue:
+    """
+    按策略出队的待下载队列，接口与 queue.Queue 的 put/get/qsize 相同
+
+    元素为 (job, info)；None 是下载线程的停止信号，只在没有其他元素时取出。
+    """
+
+    def __init__(self, order, maxsize):
+        self._order = order
+        self.maxsize = maxsize
+        self._selector = _Selector(order.policy, order.max_delay)
+        self._stops = 0
+        self._cond = threading.Condition()
+        # 第一个任务入队后开始计时
+        self._settle_until = None
+        # 正在提取、之后会放入队列的任务数
+        self._producing = 0
+
+    @contextlib.contextmanager
+    def producing(self):
+        """提取 worker 处理一个任务期间持有；没有提取在进行时下载 worker 不再等待"""
+        with self._cond:
+            self._producing += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._producing -= 1
+                self._cond.notify_all()
+
+    def put(self, item):
+        with self._cond:
+            if item is None:
+                self._stops += 1
+            else:
+                while len(self._selector.items) >= self.maxsize:
+                    self._cond.wait()
+                job, info = item
+                self._selector.add(job.url, item, self._order.priority(job.url), estimate_size(info))
+                if self._settle_until is None:
+                    self._settle_until = time.monotonic() + self._order.settle
+            self._cond.notify_all()
+
+    def get(self):
+        with self._cond:
+            while not self._selector.items and not self._stops:
+                self._cond.wait()
+            while (self._selector.items and not self._stops and len(self._selector.items) < self.maxsize
+                   and self._producing and time.monotonic() < self._settle_until):
+                self._cond.wait(self._settle_until - time.monotonic())
+            if self._selector.items:
+                value = self._selector.pop().value
+            else:
+                self._stops -= 1
+                value = None
+            self._cond.notify_all()
+        return value
+
+    def qsize(self):
+        with self._cond:
+            return len(self._selector.items)
+
+    @property
+    def reordered(self):
+        return self._selector.reordered
+
+
+class JobOrder:
+    """
+    调度策略
+
+    Args:
+        policy: fifo / sjf / fair
+        priorities: {URL: 优先级}，由 url_source.iter_urls(priorities=...) 填充
+        cache: InfoCache，派发前用其中的元数据估算大小（可选）
+        lookahead: 派发前预读的 URL 数，0 表示派发前不调整顺序
+        max_delay: 任务被越过后最多等待的时间（秒）
+        settle: 运行开始后等待待下载队列积累候选任务的最长时间（秒），提取空闲时
+            提前结束；默认 fifo 为 0，其他策略为 DEFAULT_SETTLE
+    """
+
+    def __init__(self, policy='fifo', priorities=None, cache=None, lookahead=DEFAULT_LOOKAHEAD,
+                 max_delay=DEFAULT_MAX_DELAY, settle=None):
+        if policy not in POLICIES:
+            raise ValueError(f"未知调度策略: {policy}（可用: {', '.join(POLICIES)}）")
+        self.policy = policy
+        self.priorities = priorities if priorities is not None else {}
+        self.cache = cache
+        self.lookahead = lookahead
+        self.max_delay = max_delay
+        self.settle = (0.0 if policy == 'fifo' else DEFAULT_SETTLE) if settle is None else settle
+        self._ready_queues = []
+        self._dispatch = None
+
+    def priority(self, url):
+        return self.priorities.get(url, 0)
+
+    def _cached_size(self, url):
+        if self.policy != 'sjf' or self.cache is None:
+            return None
+        # 只是查看，命中统计留给提取阶段的 get()
+        return estimate_size(self.cache.peek(url))
+
+    def order(self, urls):
+        """
+        派发前按策略重排 URL 序列（预读 lookahead 个）
+
+        fifo 策略下还没有读到带优先级的 URL 时不预读，读到一个交出一个。
+        """
+        if self.lookahead <= 0:
+            yield from urls
+            return
+        selector = self._dispatch = _Selector(self.policy, self.max_delay)
+        for url in urls:
+            selector.add(url, url, self.priority(url), self._cached_size(url))
+            if len(selector.items) >= self.lookahead or (self.policy == 'fifo' and not self.priorities):
+                yield selector.pop().value
+        while selector.items:
+            yield selector.pop().value
+
+    def ready_queue(self, maxsize):
+        """两阶段模式的待下载队列"""
+        ready = ReadyQueue(self, maxsize)
+        self._ready_queues.append(ready)
+        return ready
+
+    def report(self):
+        text = f"调度: {self.policy}"
+        if self.priorities:
+            text += f", {len(self.priorities)} 个 URL 带优先级"
+        if self._dispatch and self._dispatch.reordered:
+            text += f", 派发前调整 {self._dispatch.reordered} 次"
+        reordered = sum(ready.reordered for ready in self._ready_queues)
+        if reordered:
+            text += f", 下载前调整 {reordered} 次"
+        return text
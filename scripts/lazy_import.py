@@ -0,0 +1,193 @@
+"""
+延迟导入与启动耗时分析
+
+import yt_dlp 会连带导入网络、Cookies、下载器等模块，本机上约需 300 毫秒；
+--help 或参数错误这类调用根本用不到它。命令行脚本用 LazyModule 代替模块顶部的
+import，第一次访问属性时才真正导入：
+
+    yt_dlp = LazyModule('yt_dlp', install_hint='pip install yt-dlp')
+    ...
+    yt_dlp.YoutubeDL(opts)    # 此时才导入
+
+已知要处理的 URL 时，preload() 在后台线程中导入 yt_dlp，并只加载与这些 URL
+主机匹配的提取器模块（yt-dlp 的 lazy_extractors 只在匹配时才导入提取器），
+主线程同时继续读取日志、去重索引等文件。
+
+传入 --profile-startup 时，startup_profile 在退出时把各阶段耗时输出到 stderr。
+更细的逐模块耗时可以用 python -X importtime 查看。
+"""
+
+import atexit
+import importlib
+import importlib.util
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+# 预加载时最多检查的主机数，避免长 URL 列表拖慢启动
+PRELOAD_MAX_HOSTS = 8
+
+
+class StartupProfile:
+    """记录启动阶段的耗时（从本模块被导入开始计时）"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.enabled = False
+        self._marks = []
+        self._lock = threading.Lock()
+
+    def enable(self):
+        """启用并在进程退出时输出报告"""
+        if not self.enabled:
+            self.enabled = True
+            atexit.register(self._print_report)
+        return self
+
+    def mark(self, phase, duration=None):
+        """记录一个阶段：duration 为 None 时记录到达该阶段的时刻"""
+        elapsed = time.perf_counter() - self.started
+        with self._lock:
+            self._marks.append((phase, elapsed, duration, threading.current_thread().name))
+
+    def report(self):
+        lines = ['启动耗时（自脚本开始执行，不含解释器启动）:']
+        with self._lock:
+            marks = sorted(self._marks, key=lambda m: m[1])
+        for phase, elapsed, duration, thread in marks:
+            line = f"  {elapsed * 1000:8.1f} ms  {phase}"
+            if duration is not None:
+                line += f"（耗时 {duration * 1000:.1f} ms）"
+            if thread != 'MainThread':
+                line += f" [{thread}]"
+            lines.append(line)
+        lines.append(f"  已导入模块: {len(sys.modules)}")
+        return '\n'.join(lines)
+
+    def _print_report(self):
+        print(self.report(), file=sys.stderr)
+
+
+startup_profile = StartupProfile()
+
+
+class LazyModule:
+    """
+    第一次访问属性时才导入的模块（线程安全）
+
+    Args:
+        name: 模块名
+        install_hint: 模块未安装时提示的安装命令；提供时在创建时检查是否已安装
+            （只查找，不导入），未安装则打印提示并退出
+    """
+
+    def __init__(self, name, install_hint=None):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+        if install_hint and importlib.util.find_spec(name) is None:
+            print(f"错误: 需要安装 {name.replace('_', '-')}")
+            print(f"请运行: {install_hint}")
+            sys.exit(1)
+
+    def load(self, warmup=None):
+        """
+        导入并返回模块
+
+        warmup 在导入后、仍持有锁时调用，其他线程在它完成前访问本模块会等待。
+        """
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    startup_profile.mark(f'导入 {self._name}', time.perf_counter() - start)
+                    if warmup is not None:
+                        warmup(module)
+                    self._module = module
+        return self._module
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f'<LazyModule {self._name!r} ({state})>'
+
+
+# 形如 example.co.uk 的域名取倒数第三段作为站点名
+_SECOND_LEVEL = {'co', 'com', 'net', 'org', 'gov', 'edu', 'ac', 'ne', 'or'}
+
+
+def _site_name(host):
+    """主机名中代表站点的那一段，例如 www.youtube.com → youtube；IP 地址返回 None"""
+    labels = host.lower().split('.')
+    if len(labels) < 2 or labels[-1].isdigit():
+        return None
+    if len(labels) >= 3 and labels[-2] in _SECOND_LEVEL:
+        return labels[-3]
+    return labels[-2]
+
+
+def preload_extractors(urls):
+    """
+    导入与 URL 主机匹配的提取器模块，返回提取器名称列表
+
+    每个主机只检查第一个 URL，最多 PRELOAD_MAX_HOSTS 个主机。只对 _VALID_URL
+    中出现站点名的提取器调用 suitable()，不会为此编译全部一千多个正则；使用
+    lazy_extractors 时也不会导入不相关的提取器模块。这只是预热，没有找到或
+    找错提取器都不影响之后 yt-dlp 自己的匹配。
+    """
+    from yt_dlp.extractor import gen_extractor_classes
+
+    sites = {}
+    for url in urls:
+        site = _site_name(urlsplit(url).hostname or '')
+        if site and site not in sites:
+            sites[site] = url
+            if len(sites) >= PRELOAD_MAX_HOSTS:
+                break
+    if not sites:
+        return []
+
+    extractors = gen_extractor_classes()
+    loaded = []
+    for site, url in sites.items():
+        for ie in extractors:
+            patterns = ie._VALID_URL
+            if not patterns or ie.ie_key() == 'Generic':
+                continue
+            if not any(site in p for p in (patterns if isinstance(patterns, (list, tuple)) else [patterns])):
+                continue
+            if ie.suitable(url):
+                # LazyLoadExtractor 在访问 real_class 时才导入所在模块
+                getattr(ie, 'real_class', ie)
+                loaded.append(ie.ie_key())
+                break
+    return loaded
+
+
+def preload(module, urls=()):
+    """
+    在后台线程中导入 module（LazyModule），并预加载与 urls 匹配的提取器
+
+    主线程在此期间可以继续做其他准备工作；之后第一次访问 module 时若导入
+    尚未完成，会等待后台线程。yt-dlp 的模块不能由两个线程同时导入，主线程
+    导入其他依赖 yt-dlp 的模块之前，应先调用 module.load() 等待。
+    """
+    urls = list(urls)
+
+    def warmup(_):
+        if urls:
+            start = time.perf_counter()
+            loaded = preload_extractors(urls)
+            startup_profile.mark(f"预加载提取器: {', '.join(loaded) or '无'}", time.perf_counter() - start)
+
+    thread = threading.Thread(target=module.load, args=(warmup,), name='preload', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,334 @@
+"""
+播放列表惰性展开
+
+ydl.download([播放列表 URL]) 会先解析出全部条目（5000 个视频的频道要翻几十页）
+再开始下载第一个视频，并把所有条目的信息留在内存中。
+
+PlaylistExpander 把 URL 序列中的播放列表替换为其中各个视频的 URL：用
+extract_flat 只取条目地址，不解析每个视频；条目按页获取，边获取边产出。
+批量流水线只在派发窗口有空位时才向它取下一个 URL，因此翻页与下载交替进行，
+首个视频的开始时间和内存占用都与播放列表长度无关。
+
+是否为播放列表先由 URL 匹配到的提取器判断（_RETURN_TYPE，不发出网络请求）:
+
+- playlist: 直接展开
+- any: 既可能是视频也可能是播放列表（YoutubeTabIE 处理的频道、/playlist?list=
+  都属于这一类），先做一次扁平提取，按结果的 _type 决定。结果是视频时暂存
+  下来（take()），下载 worker 直接使用，不再重复提取；known 判断为已下载过的
+  URL 不做这次提取
+- 其他: 原样交给流水线
+
+这两类 URL 的第一次提取由 probe_workers 个线程完成，最多领先派发
+2 × probe_workers 个 URL，派发线程不必逐个等待；产出顺序不变。
+
+展开后的条目与普通 URL 一样经过去重、下载存档、任务日志，可以续传。
+
+展开后每个视频单独下载，输出文件名模板中的 playlist_index、playlist_title
+等字段不再可用。
+
+用法:
+    expander = PlaylistExpander(ydl_opts, matcher)
+    for url in expander.expand(urls):
+        ...
+    print(expander.report())
+"""
+
+import collections
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import yt_dlp
+from yt_dlp.utils import PagedList, PlaylistEntries
+
+from url_dedup import ExtractorMatcher
+
+# 可能返回播放列表的提取器类型
+PLAYLIST_TYPES = ('playlist', 'any')
+
+# 嵌套播放列表（频道 → 标签页 → 播放列表）最多展开的层数
+MAX_DEPTH = 3
+
+# 同时为判断类型做提取的线程数
+PROBE_WORKERS = 4
+
+# 判断类型时提取到的视频信息最多暂存的个数；超出时丢弃最早的，由下载 worker 重新提取
+MAX_RESOLVED = 128
+
+# 展开用的 YoutubeDL 不需要的选项
+_DOWNLOAD_ONLY_OPTS = ('progress_hooks', 'postprocessor_hooks', 'post_hooks', 'postprocessors',
+                       'download_archive', 'format', 'match_filter', 'outtmpl')
+
+
+class PlaylistExpander:
+    """
+    把播放列表 URL 惰性展开为视频 URL
+
+    Args:
+        ydl_opts: 下载使用的 yt-dlp 选项（沿用 Cookies、代理等设置；
+            playlist_items / playliststart / playlistend 用于选择条目）
+        matcher: ExtractorMatcher（与去重索引共用）。未提供时新建，并先用只含
+            播放列表类提取器的小匹配器排除普通视频 URL，多数情况下不必编译完整的匹配器
+        max_depth: 嵌套播放列表最多展开的层数
+        known: known(url) 为真时该 URL 已下载过（去重索引、下载存档等，只会是视频），
+            不为判断类型发出请求（可选）
+        probe_workers: 同时为判断类型做提取的线程数，0 表示在派发线程中逐个提取
+    """
+
+    def __init__(self, ydl_opts, matcher=None, max_depth=MAX_DEPTH, known=None, probe_workers=PROBE_WORKERS):
+        self.ydl_opts = {
+            **{k: v for k, v in ydl_opts.items() if k not in _DOWNLOAD_ONLY_OPTS},
+            'extract_flat': 'in_playlist',
+            'lazy_playlist': True,
+            'quiet': True,
+        }
+        self.matcher = matcher or ExtractorMatcher()
+        self._playlist_matcher = None if matcher else ExtractorMatcher(return_types=PLAYLIST_TYPES)
+        self.max_depth = max_depth
+        self.known = known
+        self.probe_workers = probe_workers
+        # 空闲的 YoutubeDL；正在提取或翻页的实例不在其中，不会被两个线程同时使用
+        self._idle_ydls = []
+        self._ydls = []
+        self._lock = threading.Lock()
+        self._resolved = collections.OrderedDict()
+        self.probed = 0
+        self.playlists = 0
+        self.entries = 0
+        self.unresolved = 0
+        self.failed = 0
+
+    def _acquire_ydl(self):
+        with self._lock:
+            if self._idle_ydls:
+                return self._idle_ydls.pop()
+        ydl = yt_dlp.YoutubeDL(self.ydl_opts)
+        with self._lock:
+            self._ydls.append(ydl)
+        return ydl
+
+    def _release_ydl(self, ydl):
+        with self._lock:
+            self._idle_ydls.append(ydl)
+
+    def close(self):
+        with self._lock:
+            ydls, self._ydls, self._idle_ydls = self._ydls, [], []
+        for ydl in ydls:
+            ydl.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def return_type(self, url):
+        """URL 对应提取器的返回类型: video / playlist / any / None（不发出网络请求）"""
+        ie = self.matcher.find(url)
+        return ie._RETURN_TYPE if ie is not None else None
+
+    def may_be_playlist(self, url):
+        """URL 可能是播放列表（不发出网络请求）"""
+        if self._playlist_matcher is not None and self._playlist_matcher.find(url) is None:
+            # 没有播放列表类提取器能处理，实际匹配到的提取器只会是其他类型
+            return False
+        return self.return_type(url) in PLAYLIST_TYPES
+
+    def _should_expand(self, url):
+        if not self.may_be_playlist(url):
+            return False
+        kind = self.return_type(url)
+        if kind == 'any':
+            return not (self.known and self.known(url))
+        return kind == 'playlist'
+
+    def take(self, url):
+        """取出判断类型时已提取的视频信息（未经格式选择），没有时返回 None；线程安全"""
+        with self._lock:
+            return self._resolved.pop(url, None)
+
+    def _stash(self, url, info):
+        with self._lock:
+            self._resolved[url] = info
+            if len(self._resolved) > MAX_RESOLVED:
+                self._resolved.popitem(last=False)
+
+    def expand(self, urls, expanded=None):
+        """
+        逐个产出 URL，播放列表替换为其中的视频 URL
+
+        expanded(url) 在输入中的播放列表 URL 的条目全部产出后调用（可选）
+        """
+        if not self.probe_workers:
+            for url in urls:
+                if self._should_expand(url):
+                    yield from self._expand_top(url, None, expanded)
+                else:
+                    yield url
+            return
+
+        # 输入可能是边读边产生的流（--follow、任务队列），读取会阻塞，放在单独的线程中；
+        # 派发线程等待 "读到新 URL" 和 "队首提取完成" 中先发生的一个
+        events = queue.Queue()
+        room = threading.Semaphore(2 * self.probe_workers)
+        stop = threading.Event()
+        threading.Thread(target=self._read_input, args=(urls, events, room, stop),
+                         name='expand-input', daemon=True).start()
+        pending = collections.deque()
+        pool = ThreadPoolExecutor(self.probe_workers, thread_name_prefix='probe')
+        eof, error = False, None
+        try:
+            while pending or not eof:
+                if pending and (eof or pending[0][1] is None or pending[0][1].done()):
+                    url, probe = pending.popleft()
+                    room.release()
+                    if probe is None:
+                        yield url
+                    else:
+                        yield from self._expand_top(url, probe.result(), expanded)
+                    continue
+                kind, value = events.get()
+                if kind == 'url':
+                    probe = None
+                    if self._should_expand(value):
+                        probe = pool.submit(self._extract, value)
+                        probe.add_done_callback(lambda _: events.put(('probed', None)))
+                    pending.append((value, probe))
+                elif kind == 'error':
+                    # 已读到的 URL 照常产出，再抛出读取输入时的异常
+                    eof, error = True, value
+                elif kind == 'end':
+                    eof = True
+            if error is not None:
+                raise error
+        finally:
+            stop.set()
+            room.release()
+            # 中途停止时不再开始尚未执行的提取，已提取的 YoutubeDL 归还
+            pool.shutdown(cancel_futures=True)
+            for _, probe in pending:
+                if probe is not None and not probe.cancelled():
+                    self._release_ydl(probe.result()[0])
+
+    @staticmethod
+    def _read_input(urls, events, room, stop):
+        """读取线程：最多领先派发线程 2 × probe_workers 个 URL"""
+        try:
+            for url in urls:
+                room.acquire()
+                if stop.is_set():
+                    return
+                events.put(('url', url))
+        except Exception as e:
+            events.put(('error', e))
+            return
+        events.put(('end', None))
+
+    def _expand_top(self, url, extracted, expanded):
+        playlists = self.playlists
+        yield from self._expand_playlist(url, 1, extracted)
+        if expanded and self.playlists > playlists:
+            expanded(url)
+
+    def _extract(self, url):
+        """扁平提取，返回 (ydl, info)；ydl 由调用方归还"""
+        if self.return_type(url) == 'any':
+            with self._lock:
+                self.probed += 1
+        ydl = self._acquire_ydl()
+        try:
+            # process=False: 不处理条目，entries 保持为生成器或按页获取的 PagedList
+            return ydl, ydl.extract_info(url, download=False, process=False)
+        except Exception as e:
+            print(f"⚠ 播放列表解析失败，交给下载 worker 处理: {url}: {e}")
+            return ydl, None
+
+    def _expand_playlist(self, url, depth, extracted=None):
+        ydl, info = extracted or self._extract(url)
+        try:
+            yield from self._expand_info(url, depth, ydl, info)
+        finally:
+            # 翻页结束（或中途停止）后才归还，期间条目生成器仍在使用这个实例
+            self._release_ydl(ydl)
+
+    def _expand_info(self, url, depth, ydl, info):
+        if not info:
+            # 原样交给流水线，由它按失败类型重试或记录
+            yield url
+            return
+        if info.get('_type') in ('url', 'url_transparent') and depth < self.max_depth:
+            # 频道首页等跳转到另一个播放列表地址
+            yield from self._expand_entry(info, depth)
+            return
+        if info.get('_type') not in ('playlist', 'multi_video'):
+            if info.get('_type', 'video') == 'video':
+                self._stash(url, info)
+            if depth > 1:
+                with self._lock:
+                    self.entries += 1
+            yield url
+            return
+
+        with self._lock:
+            self.playlists += 1
+        title = info.get('title') or info.get('id') or url
+        print(f"展开播放列表: {title}")
+        entries = self._iter_entries(ydl, info)
+        while True:
+            try:
+                entry = next(entries, None)
+            except Exception as e:
+                # 翻页失败：已产出的条目照常下载，剩余部分放弃
+                with self._lock:
+                    self.failed += 1
+                print(f"✗ 播放列表翻页失败，停止展开: {title}: {e}")
+                return
+            if entry is None:
+                return
+            yield from self._expand_entry(entry, depth)
+
+    def _expand_entry(self, entry, depth):
+        url = entry.get('url') or entry.get('webpage_url')
+        if not url or '://' not in url:
+            # 部分提取器的扁平条目只有 ID，没有可以单独下载的地址
+            with self._lock:
+                self.unresolved += 1
+            print(f"⚠ 跳过无法单独下载的条目: {entry.get('ie_key')} {entry.get('id') or url}")
+            return
+        if entry.get('_type') == 'playlist' or self._should_expand(url):
+            if depth < self.max_depth:
+                yield from self._expand_playlist(url, depth + 1)
+                return
+        with self._lock:
+            self.entries += 1
+        yield url
+
+    def _iter_entries(self, ydl, info):
+        """逐页产出条目，已产出的条目不保留"""
+        params = ydl.params
+        if params.get('playlist_items') or params.get('playliststart', 1) != 1 or params.get('playlistend'):
+            # 按 yt-dlp 的规则选择条目；只会取到所选范围的最后一项为止
+            for _, entry in PlaylistEntries(ydl, info).get_requested_items():
+                if entry:
+                    yield entry
+            return
+
+        entries = info['entries']
+        if isinstance(entries, PagedList):
+            # 默认缓存已获取的每一页，展开长列表时不需要
+            entries._use_cache = False
+            entries = entries._getslice(0, None)
+        for entry in entries:
+            if entry:
+                yield entry
+
+    def report(self):
+        text = f"播放列表: 展开 {self.playlists} 个, 共 {self.entries} 个视频"
+        if self.unresolved:
+            text += f", 跳过 {self.unresolved} 个无地址条目"
+        if self.failed:
+            text += f", {self.failed} 个未能完整展开"
+        if self.probed:
+            text += f", 判断类型提取 {self.probed} 次"
+        return text
@@ -0,0 +1,179 @@
+"""
+后处理阶段（独立进程池）
+
+--extract-audio、--embed-subs、--embed-metadata 添加的 FFmpeg 后处理器默认在
+下载 worker 中执行：ffmpeg 转码期间这个 worker 不会开始下一个下载。
+
+PostprocessStage 把这些后处理器移到独立的进程池中：下载 worker 的 YoutubeDL
+不再加载它们，而是在文件下载并移动到最终位置后（after_move）由 HandoffPP
+把 info_dict 交给进程池，随即开始下一个下载。每个后处理进程持有一个只配置了
+后处理器的 YoutubeDL，依次执行 run_all_pps('post_process')。
+
+待处理的文件数有上限（queue_depth），达到上限时 submit() 阻塞，下载阶段
+因此停下，等待时间计入 blocked_seconds，作为下载阶段受后处理拖累的背压指标。
+
+进程使用 spawn 方式启动：下载进程中有大量线程，fork 可能复制到被其他线程
+持有的锁。
+"""
+
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+
+import yt_dlp
+from yt_dlp.postprocessor import PostProcessor
+
+# 同时让子进程中的 yt-dlp 能找到 MergedFFmpegPP
+from pp_planner import savings
+
+# 只在下载进程中有意义、或无法传给子进程的选项（回调、函数形式的格式选择器等）
+_PARENT_ONLY_OPTS = ('progress_hooks', 'postprocessor_hooks', 'post_hooks', 'logger', 'format', 'match_filter',
+                     'download_archive')
+
+# 后处理进程中的 YoutubeDL，由 _init_worker 创建，进程内复用
+_worker_ydl = None
+
+
+def _init_worker(ydl_opts):
+    global _worker_ydl
+    # Ctrl-C 由下载进程处理：第一次等待后处理完成，第二次取消排队中的文件
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker_ydl = yt_dlp.YoutubeDL(ydl_opts)
+
+
+def _run_postprocessors(info):
+    """在后处理进程中执行，返回 (开始时间, 耗时, 最终文件路径, 合并省下的 (调用次数, 字节数))"""
+    started = time.time()
+    passes, nbytes = savings.snapshot()
+    info = _worker_ydl.run_all_pps('post_process', info)
+    saved_passes, saved_bytes = savings.snapshot()
+    return started, time.time() - started, info.get('filepath'), (saved_passes - passes, saved_bytes - nbytes)
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+class HandoffPP(PostProcessor):
+    """在文件移动到最终位置后，把 info_dict 交给 sink（在下载线程中调用）"""
+
+    def __init__(self, sink):
+        # downloader 由 add_post_processor 设置，同时注册进度钩子；构造时传入会注册两次
+        super().__init__()
+        self._sink = sink
+
+    def run(self, info):
+        # 字幕等附属文件在 after_move 之前已经移走，路径改为最终位置
+        moved = info.get('__files_to_move') or {}
+        info = yt_dlp.YoutubeDL.sanitize_info(info)
+        for sub in (info.get('requested_subtitles') or {}).values():
+            if sub.get('filepath') in moved:
+                sub['filepath'] = moved[sub['filepath']] or sub['filepath']
+        info['__files_to_move'] = {}
+        self._sink(info)
+        return [], info
+
+
+class PostprocessStage:
+    """
+    后处理进程池
+
+    Args:
+        ydl_opts: 下载使用的 yt-dlp 选项，需包含 postprocessors
+        workers: 进程数，默认为 CPU 核数
+        queue_depth: 已提交、尚未完成的文件数上限，默认为进程数的 2 倍
+
+    用法:
+        stage = PostprocessStage(ydl_opts)
+        download_opts = stage.download_opts(ydl_opts)
+        ydl.add_post_processor(HandoffPP(sink), when='after_move')
+        stage.submit(info, callback)
+        ...
+        stage.close()
+    """
+
+    def __init__(self, ydl_opts, workers=None, queue_depth=None):
+        self.workers = workers or default_workers()
+        self.queue_depth = queue_depth or self.workers * 2
+        pp_opts = {k: v for k, v in ydl_opts.items() if k not in _PARENT_ONLY_OPTS and not callable(v)}
+        # 后处理失败要抛出给调用方，而不是只打印
+        pp_opts['ignoreerrors'] = False
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker, initargs=(pp_opts,))
+
+        self._cond = threading.Condition()
+        self._futures = set()
+        self.pending = 0
+        self.peak_pending = 0
+        self.processed = 0
+        self.failed = 0
+        self.blocked_seconds = 0.0
+        self.busy_seconds = 0.0
+
+    @staticmethod
+    def download_opts(ydl_opts):
+        """下载 worker 使用的选项：去掉后处理器"""
+        return {k: v for k, v in ydl_opts.items() if k != 'postprocessors'}
+
+    def submit(self, info, callback):
+        """
+        提交一个已下载的文件；队列已满时阻塞
+
+        完成后在后台线程中调用 callback(error, result)：成功时 error 为 None，
+        result 为 (开始时间, 耗时, 最终文件路径)；合并后处理省下的重写计入本进程的
+        pp_planner.savings。
+        """
+        with self._cond:
+            if self.pending >= self.queue_depth:
+                start = time.monotonic()
+                while self.pending >= self.queue_depth:
+                    self._cond.wait()
+                self.blocked_seconds += time.monotonic() - start
+            self.pending += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+
+        def done(future):
+            error = CancelledError() if future.cancelled() else future.exception()
+            result = None if error else future.result()
+            with self._cond:
+                self._futures.discard(future)
+                self.pending -= 1
+                if error:
+                    self.failed += 1
+                else:
+                    self.processed += 1
+                    self.busy_seconds += result[1]
+                self._cond.notify_all()
+            if result:
+                savings.add(*result[3])
+                result = result[:3]
+            callback(error, result)
+
+        future = self._executor.submit(_run_postprocessors, info)
+        with self._cond:
+            self._futures.add(future)
+        future.add_done_callback(done)
+
+    def cancel(self):
+        """取消尚未开始的文件（回调收到 CancelledError），正在处理的文件继续完成"""
+        with self._cond:
+            futures = list(self._futures)
+        for future in futures:
+            future.cancel()
+
+    def report(self):
+        text = (f"后处理: {self.processed} 个文件, 进程 {self.workers}, "
+                f"队列峰值 {self.peak_pending}/{self.queue_depth}")
+        if self.processed:
+            text += f", 平均 {self.busy_seconds / self.processed:.1f} 秒"
+        if self.failed:
+            text += f", 失败 {self.failed}"
+        return text
+
+    def close(self):
+        """等待已提交的文件处理完成"""
+        self._executor.shutdown(wait=True)
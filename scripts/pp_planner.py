@@ -0,0 +1,294 @@
+"""
+后处理链合并
+
+--embed-subs、--embed-metadata（以及 --remux-video）各自对应一个 FFmpeg 后处理器，
+yt-dlp 依次执行，每一步都用 ffmpeg 把整个文件复制一遍再替换原文件。这几步都是
+流复制（-c copy），只是添加字幕流、元数据或更换容器，可以合并到一次 ffmpeg
+调用中完成。
+
+plan_postprocessors() 检查 postprocessors 配置，把相邻的可合并步骤替换为一个
+MergedFFmpeg 后处理器；转码类步骤（如 FFmpegExtractAudio）保持原样，并且会打断
+合并。遇到一次调用无法正确表达的情况（m4a 仅音频元数据、向 mkv 附加 info.json），
+MergedFFmpegPP 退回到逐个执行原来的后处理器。
+
+MergedFFmpegPP 复用了 FFmpegMetadataPP / FFmpegEmbedSubtitlePP / FFmpegVideoRemuxerPP
+的私有方法和属性（在 TESTED_YTDLP_VERSION 上验证）。plan_postprocessors() 先检查
+它们是否存在、签名是否与预期相同，不符时不做合并，保持原来的后处理器。
+
+每次合并省下的整文件重写字节数记在 savings 中。
+
+用法:
+    options['postprocessors'], groups = plan_postprocessors(options['postprocessors'])
+    ...
+    print(savings.report())
+"""
+
+import functools
+import inspect
+import os
+import threading
+
+from yt_dlp.postprocessor import (
+    FFmpegEmbedSubtitlePP,
+    FFmpegMetadataPP,
+    FFmpegPostProcessor,
+    FFmpegVideoRemuxerPP,
+    PostProcessor,
+)
+from yt_dlp.postprocessor.ffmpeg import resolve_mapping
+from yt_dlp.utils import ISO639Utils, format_bytes, prepend_extension, replace_extension
+
+# 可以合并的后处理器，都是流复制，合并后的执行顺序为: 换容器 → 嵌入字幕 → 元数据
+FOLDABLE = {
+    'FFmpegVideoRemuxer': FFmpegVideoRemuxerPP,
+    'FFmpegEmbedSubtitle': FFmpegEmbedSubtitlePP,
+    'FFmpegMetadata': FFmpegMetadataPP,
+}
+
+MERGED_KEY = 'MergedFFmpeg'
+
+# 验证过的 yt-dlp 版本
+TESTED_YTDLP_VERSION = '2026.08.19'
+
+# 用到的方法及其参数（含 self），与此不符时不做合并
+_REQUIRED_SIGNATURES = {
+    (FFmpegMetadataPP, '_fixup_chapters'): ('self', 'info'),
+    (FFmpegMetadataPP, '_get_chapter_opts'): ('chapters', 'metadata_filename'),
+    (FFmpegMetadataPP, '_get_metadata_opts'): ('self', 'info'),
+    (FFmpegPostProcessor, 'run_ffmpeg_multiple_files'): ('self', 'input_paths', 'out_path', 'opts', 'kwargs'),
+    (FFmpegPostProcessor, 'stream_copy_opts'): ('copy', 'ext'),
+    (FFmpegPostProcessor, '_delete_downloaded_files'): ('self', 'files_to_delete', 'kwargs'),
+}
+
+# 用到的实例属性（由各自的 __init__ 设置）
+_REQUIRED_ATTRIBUTES = {
+    FFmpegMetadataPP: ('_add_metadata', '_add_chapters', '_add_infojson'),
+    FFmpegEmbedSubtitlePP: ('_already_have_subtitle', 'SUPPORTED_EXTS'),
+    FFmpegVideoRemuxerPP: ('mapping',),
+}
+
+
+class RewriteSavings:
+    """合并后处理省下的 ffmpeg 调用次数和整文件重写字节数（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.files = 0
+        self.passes = 0
+        self.bytes = 0
+
+    def add(self, passes, nbytes):
+        if not passes:
+            return
+        with self._lock:
+            self.files += 1
+            self.passes += passes
+            self.bytes += nbytes
+
+    def snapshot(self):
+        with self._lock:
+            return self.passes, self.bytes
+
+    def report(self):
+        return (f"合并后处理: {self.files} 个文件, 少执行 {self.passes} 次 ffmpeg, "
+                f"避免重写 {format_bytes(self.bytes)}")
+
+
+# 本进程中 MergedFFmpegPP 的累计结果；后处理进程池中由 postprocess_stage 汇总回主进程
+savings = RewriteSavings()
+
+
+@functools.lru_cache(maxsize=None)
+def is_compatible():
+    """已安装的 yt-dlp 中，合并所依赖的后处理器内部接口与预期相同"""
+    for (cls, name), params in _REQUIRED_SIGNATURES.items():
+        method = getattr(cls, name, None)
+        if not callable(method):
+            return False
+        try:
+            if tuple(inspect.signature(method).parameters) != params:
+                return False
+        except (TypeError, ValueError):
+            return False
+    try:
+        if not callable(resolve_mapping) or len(inspect.signature(resolve_mapping).parameters) != 2:
+            return False
+        # 不需要 downloader 即可创建，只检查 __init__ 设置的属性
+        for cls, attributes in _REQUIRED_ATTRIBUTES.items():
+            pp = cls(None)
+            if not all(hasattr(pp, attr) for attr in attributes):
+                return False
+    except Exception:
+        return False
+    return True
+
+
+def plan_postprocessors(postprocessors):
+    """
+    合并相邻的流复制后处理器；yt-dlp 的内部接口与预期不符时原样返回
+
+    Returns:
+        (新的 postprocessors 列表, 被合并的步骤名列表的列表)
+    """
+    if not is_compatible():
+        return list(postprocessors), []
+    planned, groups, run = [], [], []
+
+    def flush():
+        if len(run) > 1:
+            planned.append({'key': MERGED_KEY, 'steps': list(run)})
+            groups.append([step['key'] for step in run])
+        else:
+            planned.extend(run)
+        run.clear()
+
+    for pp in postprocessors:
+        foldable = pp['key'] in FOLDABLE and pp.get('when', 'post_process') == 'post_process'
+        # 同一步骤出现两次时保持原有的先后关系，不合并
+        if not foldable or any(step['key'] == pp['key'] for step in run):
+            flush()
+        if foldable:
+            run.append(pp)
+        else:
+            planned.append(pp)
+    flush()
+    return planned, groups
+
+
+class MergedFFmpegPP(FFmpegPostProcessor):
+    """在一次 ffmpeg 调用中完成多个流复制后处理步骤"""
+
+    def __init__(self, downloader=None, steps=()):
+        super().__init__(downloader)
+        self._steps = {}
+        for step in steps:
+            kwargs = {k: v for k, v in step.items() if k != 'key'}
+            self._steps[step['key']] = FOLDABLE[step['key']](downloader, **kwargs)
+
+    def set_downloader(self, downloader):
+        super().set_downloader(downloader)
+        for pp in getattr(self, '_steps', {}).values():
+            pp._downloader = downloader
+
+    def _fallback(self, info):
+        """逐个执行原来的后处理器"""
+        for key in FOLDABLE:
+            pp = self._steps.get(key)
+            if pp:
+                info = self._downloader.run_pp(pp, info)
+        return [], info
+
+    def _subtitle_opts(self, info, ext, first_input):
+        """与 FFmpegEmbedSubtitlePP 相同的字幕选择规则，返回 (选项, 字幕文件)"""
+        if ext not in FFmpegEmbedSubtitlePP.SUPPORTED_EXTS:
+            self.to_screen(f'Subtitles can only be embedded in {", ".join(FFmpegEmbedSubtitlePP.SUPPORTED_EXTS)} files')
+            return [], []
+        opts, files = [], []
+        for lang, sub in (info.get('requested_subtitles') or {}).items():
+            if not os.path.exists(sub.get('filepath', '')):
+                self.report_warning(f'Skipping embedding {lang} subtitle because the file is missing')
+                continue
+            sub_ext = sub['ext']
+            if sub_ext == 'json' or (ext == 'webm' and sub_ext != 'vtt'):
+                self.report_warning(f'Skipping embedding {lang} subtitle: {sub_ext} is not supported in {ext}')
+                continue
+            i = len(files)
+            opts += ['-map', f'{first_input + i}:0',
+                     f'-metadata:s:s:{i}', f'language={ISO639Utils.short2long(lang) or lang}']
+            if sub.get('name'):
+                opts += [f'-metadata:s:s:{i}', f'handler_name={sub["name"]}',
+                         f'-metadata:s:s:{i}', f'title={sub["name"]}']
+            files.append(sub['filepath'])
+        # 不复制已有的字幕流，与再次运行 FFmpegEmbedSubtitlePP 的结果一致
+        return (['-map', '-0:s', *opts] if files else []), files
+
+    @staticmethod
+    def _attaches_infojson(meta, info):
+        """FFmpegMetadataPP 是否会把 info.json 作为附件写入 mkv/mka"""
+        if meta._add_infojson is True:
+            return True
+        infojson = info.get('infojson_filename')
+        return bool(meta._add_infojson and infojson and os.path.exists(infojson))
+
+    @PostProcessor._restrict_to(images=False)
+    def run(self, info):
+        if not is_compatible():
+            return self._fallback(info)
+        filename, source_ext = info['filepath'], info['ext'].lower()
+        remux, subs, meta = (self._steps.get(key) for key in FOLDABLE)
+
+        target_ext = source_ext
+        if remux:
+            target_ext, skip_msg = resolve_mapping(source_ext, remux.mapping)
+            if skip_msg:
+                self.to_screen(f'Not remuxing media file "{filename}"; {skip_msg}')
+                remux, target_ext = None, source_ext
+        if meta and (target_ext == 'm4a' or (target_ext in ('mkv', 'mka') and self._attaches_infojson(meta, info))):
+            return self._fallback(info)
+
+        inputs, opts, done = [filename], [], []
+        files_to_delete, temp_files = [], []
+        if remux:
+            done.append('remux')
+        if subs:
+            sub_opts, sub_files = self._subtitle_opts(info, target_ext, len(inputs))
+            if sub_files:
+                inputs += sub_files
+                opts += sub_opts
+                done.append('subtitles')
+                if not subs._already_have_subtitle:
+                    files_to_delete += sub_files
+        if meta:
+            meta._fixup_chapters(info)
+            meta_opts = []
+            if meta._add_chapters and info.get('chapters'):
+                metadata_filename = replace_extension(filename, 'meta')
+                # 生成器写出章节文件；输入序号按合并后的位置重新指定
+                list(meta._get_chapter_opts(info['chapters'], metadata_filename))
+                meta_opts += ['-map_metadata', str(len(inputs))]
+                inputs.append(metadata_filename)
+                temp_files.append(metadata_filename)
+            if meta._add_metadata:
+                meta_opts += [arg for opt in meta._get_metadata_opts(info) for arg in opt]
+            if meta_opts:
+                opts += meta_opts
+                done.append('metadata')
+
+        if not done:
+            self.to_screen('Nothing to remux, embed or tag')
+            return [], info
+
+        if remux:
+            outpath = replace_extension(filename, target_ext, source_ext)
+            files_to_delete.append(filename)
+        else:
+            outpath = prepend_extension(filename, 'temp')
+        self.to_screen(f'{" + ".join(done)} in one pass; Destination: {outpath if remux else filename}')
+        self.run_ffmpeg_multiple_files(
+            inputs, outpath, [*self.stream_copy_opts(ext=target_ext), *opts])
+        self._delete_downloaded_files(*temp_files)
+        if not remux:
+            os.replace(outpath, filename)
+            outpath = filename
+
+        # 分开执行时每一步都要重写一遍整个文件
+        savings.add(len(done) - 1, (len(done) - 1) * os.path.getsize(outpath))
+        info['filepath'] = outpath
+        if remux:
+            info['format'] = info['ext'] = target_ext
+        return files_to_delete, info
+
+
+def _register():
+    """让 postprocessors 选项中的 {'key': 'MergedFFmpeg'} 可以被 yt-dlp 找到"""
+    try:
+        from yt_dlp.globals import postprocessors
+    except ImportError:
+        # 旧版 yt-dlp 在 yt_dlp.postprocessor 模块中按名称查找
+        import yt_dlp.postprocessor
+        setattr(yt_dlp.postprocessor, f'{MERGED_KEY}PP', MergedFFmpegPP)
+    else:
+        postprocessors.value[f'{MERGED_KEY}PP'] = MergedFFmpegPP
+
+
+_register()
@@ -0,0 +1,115 @@
+"""
+全局带宽与站点并发调度
+
+yt-dlp 的 ratelimit 只限制单个下载，多个 worker 同时下载时总带宽无法控制。
+这里提供两个在所有 worker 之间共享的限制:
+
+- 全局字节速率：令牌桶，通过 progress_hooks 在每次收到数据后扣减，额度不足时
+  让当前下载线程等待，效果与 yt-dlp 自身的 ratelimit 相同，只是额度全局共享。
+- 站点并发上限：按域名限制同时进行的下载数，例如小红书最多 2 个。
+
+多台机器各自运行时，请把总预算按机器数拆分后分别设置。
+"""
+
+import contextlib
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+class TokenBucket:
+    """
+    令牌桶（线程安全）
+
+    consume() 先预占额度，额度为负时调用方睡眠到额度恢复；不会忙等。
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            deficit = -self._tokens
+        if deficit > 0:
+            time.sleep(deficit / self.rate)
+
+
+def parse_site_limits(values):
+    """解析 ["xiaohongshu.com=2", ...] 为 {"xiaohongshu.com": 2}"""
+    limits = {}
+    for value in values or ():
+        domain, sep, count = value.partition('=')
+        if not sep or not count.isdigit() or int(count) < 1:
+            raise ValueError(f'站点并发格式应为 域名=数量: {value}')
+        limits[domain.lower().lstrip('.')] = int(count)
+    return limits
+
+
+class RateScheduler:
+    """
+    批量下载的全局调度器
+
+    Args:
+        rate: 全局字节速率上限（字节/秒），None 表示不限
+        site_limits: {域名: 最大并发下载数}，域名匹配自身及其子域名
+    """
+
+    def __init__(self, rate=None, site_limits=None):
+        self.bucket = TokenBucket(rate) if rate else None
+        self.site_limits = dict(site_limits or {})
+        self._semaphores = {domain: threading.BoundedSemaphore(n) for domain, n in self.site_limits.items()}
+        # {文件名: 已计入的字节数}
+        self._progress = {}
+        self._progress_lock = threading.Lock()
+
+    def site_of(self, url):
+        """返回 URL 命中的受限域名，未命中返回 None"""
+        host = (urlsplit(url).hostname or '').lower()
+        for domain in self._semaphores:
+            if host == domain or host.endswith('.' + domain):
+                return domain
+        return None
+
+    @contextlib.contextmanager
+    def slot(self, url):
+        """占用该 URL 所属站点的一个并发名额，站点已满时等待"""
+        semaphore = self._semaphores.get(self.site_of(url))
+        if semaphore is None:
+            yield
+            return
+        with semaphore:
+            yield
+
+    def progress_hook(self, d):
+        """按新收到的字节数扣减全局额度"""
+        if self.bucket is None:
+            return
+        # 分片并发下载时回调来自多个线程，按文件而不是按线程计算增量
+        filename = d.get('filename') or d.get('tmpfilename')
+        if d['status'] in ('finished', 'error'):
+            with self._progress_lock:
+                self._progress.pop(filename, None)
+            return
+        if d['status'] != 'downloading':
+            return
+        downloaded = d.get('downloaded_bytes') or 0
+        with self._progress_lock:
+            last = self._progress.get(filename, 0)
+            if downloaded <= last:
+                return
+            self._progress[filename] = downloaded
+        self.bucket.consume(downloaded - last)
+
+    def forget(self, filenames):
+        """任务结束时清除其文件的进度记录（下载中断时不会收到 finished）"""
+        with self._progress_lock:
+            for filename in filenames:
+                self._progress.pop(filename, None)
@@ -0,0 +1,175 @@
+"""
+失败分类与重试
+
+把下载失败分为三类，只有临时性失败才重试:
+
+- transient: HTTP 429/5xx、超时、连接被重置等，稍后重试通常会成功
+- permanent: 地区限制、视频已删除、不支持的 URL、证书校验失败等，重试无意义
+- auth:      需要登录/cookies、私有视频等，需要人工处理
+
+重试按带抖动的指数退避延迟，排在 DelayedQueue 中到期后重新派发，等待期间
+不占用任何 worker。
+"""
+
+import heapq
+import itertools
+import random
+import re
+import threading
+import time
+
+TRANSIENT = 'transient'
+PERMANENT = 'permanent'
+AUTH = 'auth'
+
+KIND_LABELS = {
+    TRANSIENT: '临时',
+    PERMANENT: '永久',
+    AUTH: '认证',
+}
+
+_HTTP_STATUS_RE = re.compile(r'HTTP Error (\d{3})')
+
+# 按顺序匹配，先命中的生效
+_MESSAGE_RULES = (
+    (AUTH, re.compile(
+        r'sign in|log ?in|login required|requires authentication|cookies|members[- ]only|'
+        r'private video|this video is private|age[- ]restricted|confirm your age', re.I)),
+    (PERMANENT, re.compile(
+        r'not available in your country|geo[- ]?restrict|video unavailable|has been removed|'
+        r'been terminated|no longer available|does not exist|deleted|copyright|unsupported url|'
+        r'no video formats found|requested format is not available|'
+        r'certificate verify failed|self[- ]signed certificate|certificate has expired|hostname mismatch', re.I)),
+    (TRANSIENT, re.compile(
+        r'timed? ?out|connection (?:reset|refused|aborted)|remote end closed|temporary failure|'
+        r'incomplete ?read|too many requests|rate[- ]limit|try again later|service unavailable|'
+        r'bad gateway|name resolution|network is unreachable|'
+        # SSL 错误中只有连接中途断开（EOF）和握手超时是临时性的
+        r'unexpected[_ ]eof|eof occurred in violation of protocol', re.I)),
+)
+
+
+def _chain(error):
+    """依次产出异常及其 cause/__cause__/__context__"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = getattr(error, 'cause', None) or error.__cause__ or error.__context__
+
+
+def _http_status(error):
+    """在异常链中查找 HTTP 状态码"""
+    for e in _chain(error):
+        status = getattr(e, 'status', None)
+        if isinstance(status, int):
+            return status
+    return None
+
+
+def classify_failure(error):
+    """
+    判断失败类型
+
+    Args:
+        error: 异常对象或错误消息字符串
+
+    Returns:
+        TRANSIENT / PERMANENT / AUTH；无法判断时归为 PERMANENT，不做重试
+    """
+    message = str(error)
+    status = None
+    if isinstance(error, BaseException):
+        from yt_dlp.networking.exceptions import CertificateVerifyError, SSLError, TransportError
+        from yt_dlp.utils import GeoRestrictedError
+
+        if isinstance(error, GeoRestrictedError):
+            return PERMANENT
+        if any(isinstance(e, CertificateVerifyError) for e in _chain(error)):
+            # 证书不受信任或已过期，重试不会改变结果
+            return PERMANENT
+        status = _http_status(error)
+        cause = getattr(error, 'cause', None)
+        # 其他 SSL 错误按消息判断
+        if status is None and isinstance(cause, TransportError) and not isinstance(cause, SSLError):
+            return TRANSIENT
+    if status is None:
+        m = _HTTP_STATUS_RE.search(message)
+        status = int(m.group(1)) if m else None
+
+    if status is not None:
+        if status == 429 or status >= 500 or status == 408:
+            return TRANSIENT
+        if status == 401:
+            return AUTH
+        if status == 403:
+            # 403 多为签名地址过期或临时风控，重新提取通常可以恢复
+            return TRANSIENT
+        if status in (404, 410):
+            return PERMANENT
+
+    for kind, pattern in _MESSAGE_RULES:
+        if pattern.search(message):
+            return kind
+    return PERMANENT
+
+
+def backoff_delay(attempt, base=2.0, cap=300.0):
+    """第 attempt 次重试（从 0 开始）前的等待时间：指数增长，取上限后在后半段随机"""
+    delay = min(cap, base * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class DelayedQueue:
+    """
+    延迟队列：条目到期后在后台线程中交给 callback
+
+    Args:
+        callback: 到期时调用 callback(item)
+    """
+
+    def __init__(self, callback):
+        self.callback = callback
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='retry-timer', daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._heap)
+
+    def schedule(self, delay, item):
+        with self._cond:
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._counter), item))
+            self._cond.notify()
+
+    def flush(self):
+        """取出所有尚未到期的条目，不再派发"""
+        with self._cond:
+            items = [item for _, _, item in self._heap]
+            self._heap.clear()
+        return items
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    timeout = self._heap[0][0] - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    self._cond.wait(timeout)
+                if self._closed:
+                    return
+                _, _, item = heapq.heappop(self._heap)
+            self.callback(item)
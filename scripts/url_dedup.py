@@ -0,0 +1,375 @@
+"""
+URL 规范化与去重索引
+
+同一个视频常以不同形式出现在 URL 列表里（youtu.be 短链、带 si=/xsec_source
+等跟踪参数、末尾多一个斜杠……）。这里先把 URL 规范化，再用 yt-dlp 提取器的
+_VALID_URL 推导出 "提取器 + 视频 ID"，作为去重键。键的格式与 yt-dlp 的
+download archive 相同（例如 "youtube dQw4w9WgXcQ"）。
+
+去重在任何网络请求之前完成：列表内的重复项和历史运行中已下载的项都会被丢弃。
+"""
+
+import itertools
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# 只影响统计/分享来源、不影响内容的查询参数
+TRACKING_PARAMS = {
+    'si', 'feature', 'pp', 'fbclid', 'gclid', 'igshid', 'igsh',
+    'xsec_source', 'xsec_token', 'share_source', 'share_medium', 'share_from',
+    'app_platform', 'spm_id_from', 'vd_source', 'ref_src',
+}
+TRACKING_PREFIXES = ('utm_',)
+
+_YOUTU_BE_RE = re.compile(r'^/(?P<id>[0-9A-Za-z_-]{11})')
+
+
+def _is_tracking_param(name):
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def canonicalize_url(url, strip_www=True):
+    """
+    规范化 URL
+
+    - 统一为 https，主机名小写并（默认）去掉 www.
+    - youtu.be/<id> 改写为 youtube.com/watch?v=<id>
+    - 去掉跟踪参数和 #片段，其余参数按名称排序
+    - 去掉路径末尾的斜杠
+
+    部分提取器的 _VALID_URL 要求带 www.，匹配提取器时应传 strip_www=False。
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    if scheme in ('http', 'https'):
+        scheme = 'https'
+    host = parts.netloc.lower()
+    path = parts.path
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not _is_tracking_param(k)]
+
+    if host == 'youtu.be':
+        m = _YOUTU_BE_RE.match(path)
+        if m:
+            host, path = 'www.youtube.com', '/watch'
+            query.insert(0, ('v', m.group('id')))
+
+    if strip_www and host.startswith('www.'):
+        host = host[4:]
+    if len(path) > 1:
+        path = path.rstrip('/')
+    query.sort()
+    return urlunsplit((scheme, host, path, urlencode(query), ''))
+
+
+# 合并正则中每批包含的 _VALID_URL 数：越大调用次数越少，但编译越慢
+BATCH_SIZE = 64
+
+_GROUP_RE = re.compile(r'\(\?P([<=])(\w+)(>?)')
+_GLOBAL_FLAGS_RE = re.compile(r'^\(\?([aiLmsux]+)\)')
+# 按序号引用分组的写法在合并后序号会变化
+_NUMBERED_REF_RE = re.compile(r'\\[1-9]|\(\?\(\d')
+
+
+def _batchable_pattern(pattern, n):
+    """
+    改写为可以放进合并正则的形式：分组名加前缀，开头的全局标志改为局部标志
+
+    改写后的正则不在这里编译检查（编译占了合并耗时的一半），合并正则编译失败时
+    才由 _split_batch() 逐个检查。
+    """
+    if _NUMBERED_REF_RE.search(pattern):
+        return None
+    pattern = _GROUP_RE.sub(lambda m: f'(?P{m.group(1)}_{n}_{m.group(2)}{m.group(3)}', pattern)
+    flags = _GLOBAL_FLAGS_RE.match(pattern)
+    if flags:
+        pattern = f'(?{flags.group(1)}:{pattern[flags.end():]})'
+    return pattern
+
+
+def _compiles(pattern):
+    try:
+        re.compile(pattern)
+    except re.error:
+        return False
+    return True
+
+
+def _split_batch(alternatives):
+    """合并正则无法编译时，把改写后无法编译的提取器拆出来单独检查，其余仍按原顺序合并"""
+    units, pending = [], []
+    for ie, group in itertools.groupby(alternatives, key=lambda a: a[0]):
+        group = list(group)
+        if all(_compiles(p) for _, p in group):
+            pending.extend(group)
+            continue
+        if pending:
+            units.append(_Batch(pending))
+            pending = []
+        units.append(ie)
+    if pending:
+        units.append(_Batch(pending))
+    return units
+
+
+class _Batch:
+    """一组提取器的 _VALID_URL 合并成的一个正则，按原顺序排列"""
+
+    __slots__ = ('regex', 'owners', 'extractors')
+
+    def __init__(self, alternatives):
+        # alternatives: [(提取器, 改写后的正则)]，同一提取器可能有多个正则
+        self.owners = [ie for ie, _ in alternatives]
+        self.extractors = list(dict.fromkeys(self.owners))
+        self.regex = re.compile('|'.join(f'(?P<_{i}>{p})' for i, (_, p) in enumerate(alternatives)))
+
+    def match(self, url):
+        """返回第一个 suitable() 也认可的提取器"""
+        m = self.regex.match(url)
+        if m is None:
+            return None
+        # 最外层的分组最后闭合，lastgroup 就是命中的那一项
+        ie = self.owners[int(m.lastgroup[1:])]
+        if ie.suitable(url):
+            return ie
+        # suitable() 另有排除规则时，逐个检查这一批中排在后面的提取器
+        for other in self.extractors[self.extractors.index(ie) + 1:]:
+            if other.suitable(url):
+                return other
+        return None
+
+
+class ExtractorMatcher:
+    """
+    根据 URL 推导 yt-dlp 的提取器和视频 ID，不发出网络请求
+
+    按 yt-dlp 自身的优先级顺序尝试提取器。一千多个 _VALID_URL 预先编译为
+    每批 BATCH_SIZE 个的合并正则，每个 URL 只需调用几十次正则匹配，而不是
+    逐个调用一千多个提取器的 suitable()。命中后仍调用该提取器的 suitable() 确认：
+    重写了 suitable() 的提取器（如 YoutubeIE）都是在 _VALID_URL 匹配的基础上追加
+    排除条件，正则不匹配时 suitable() 不会返回 True，因此也可以放进合并正则。
+    使用了无法合并的正则写法的提取器按原顺序单独检查。
+
+    正则在第一次匹配时编译（约需半秒），之后可以在多个线程中共用。
+    return_types 只保留 _RETURN_TYPE 为其中之一的提取器，编译的正则随之减少；
+    这时 find() 返回的是这些提取器中第一个能处理该 URL 的，不一定是 yt-dlp
+    实际使用的提取器，只适合用来排除。
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, return_types=None):
+        self.batch_size = batch_size
+        self.return_types = return_types
+        self._units = None
+        self._lock = threading.Lock()
+
+    def _load_extractors(self):
+        from yt_dlp.extractor import gen_extractor_classes
+        try:
+            from yt_dlp.plugins import all_plugins_loaded, load_all_plugins
+        except ImportError:
+            # 旧版 yt-dlp 在导入时就加载了插件
+            pass
+        else:
+            # 插件提取器平时在创建第一个 YoutubeDL 时才加载
+            if not all_plugins_loaded.value:
+                load_all_plugins()
+        # GenericIE 匹配一切 URL，无法推导出稳定的 ID
+        return [ie for ie in gen_extractor_classes() if ie.ie_key() != 'Generic'
+                and (self.return_types is None or ie._RETURN_TYPE in self.return_types)]
+
+    @staticmethod
+    def _custom_suitable(ie):
+        from yt_dlp.extractor.common import InfoExtractor
+
+        for cls in ie.__mro__:
+            if cls is InfoExtractor or cls.__name__ == 'LazyLoadExtractor':
+                return False
+            if 'suitable' in cls.__dict__:
+                return True
+        return False
+
+    def _compile(self):
+        """按优先级顺序生成匹配单元：_Batch 或需要单独检查的提取器"""
+        units, pending = [], []
+
+        def flush():
+            if pending:
+                try:
+                    units.append(_Batch(pending))
+                except re.error:
+                    units.extend(_split_batch(pending))
+                pending.clear()
+
+        for ie in self._load_extractors():
+            patterns = ie._VALID_URL
+            if not patterns:
+                if self._custom_suitable(ie):
+                    flush()
+                    units.append(ie)
+                continue
+            rewritten = [_batchable_pattern(p, len(pending) + i)
+                         for i, p in enumerate(patterns if isinstance(patterns, (list, tuple)) else [patterns])]
+            if None in rewritten:
+                flush()
+                units.append(ie)
+                continue
+            pending.extend((ie, p) for p in rewritten)
+            if len(pending) >= self.batch_size:
+                flush()
+        flush()
+        return units
+
+    def _get_units(self):
+        if self._units is None:
+            with self._lock:
+                if self._units is None:
+                    self._units = self._compile()
+        return self._units
+
+    def precompile(self):
+        """提前编译合并正则，避免第一个 URL 承担编译时间"""
+        self._get_units()
+        return self
+
+    def find(self, url):
+        """返回第一个能处理该 URL 的提取器类，没有时返回 None"""
+        for unit in self._get_units():
+            if isinstance(unit, _Batch):
+                ie = unit.match(url)
+                if ie is not None:
+                    return ie
+            elif unit.suitable(url):
+                return unit
+        return None
+
+    def match(self, url):
+        """返回 (提取器类, 视频 ID)，无法推导时返回 (None, None)"""
+        ie = self.find(url)
+        if ie is None:
+            return None, None
+        return ie, ie.get_temp_id(url)
+
+    def key(self, url):
+        """去重键：能推导出 ID 时为 "提取器 ID"，否则为规范化后的 URL"""
+        ie, video_id = self.match(canonicalize_url(url, strip_www=False))
+        if ie and video_id:
+            return f'{ie.ie_key().lower()} {video_id}'
+        return canonicalize_url(url)
+
+
+# 本次运行已出现的去重键超过这个数量后转存到临时文件，内存占用不再随输入增长
+SEEN_MEMORY_LIMIT = 100_000
+
+
+class _SeenKeys:
+    """
+    本次运行已出现过的去重键（调用方负责加锁）
+
+    不超过 limit 个时放在内存中；超过后全部转存到 SQLite 临时数据库，
+    连接关闭时自动删除。
+    """
+
+    def __init__(self, limit=SEEN_MEMORY_LIMIT):
+        self.limit = limit
+        self._keys = set()
+        self._db = None
+
+    def add(self, key):
+        """加入去重键；已出现过时返回 False"""
+        if self._db is not None:
+            return self._db.execute('INSERT OR IGNORE INTO seen VALUES (?)', (key,)).rowcount == 1
+        if key in self._keys:
+            return False
+        self._keys.add(key)
+        if len(self._keys) > self.limit:
+            self._spill()
+        return True
+
+    def _spill(self):
+        # 文件名为空时 SQLite 创建私有的临时数据库文件
+        self._db = sqlite3.connect('', check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=OFF')
+        self._db.execute('PRAGMA synchronous=OFF')
+        self._db.execute('CREATE TABLE seen (key TEXT PRIMARY KEY) WITHOUT ROWID')
+        self._db.executemany('INSERT INTO seen VALUES (?)', ((key,) for key in self._keys))
+        self._keys = set()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+class DedupIndex:
+    """
+    持久化的去重索引（线程安全）
+
+    文件每行一个去重键，只记录下载成功的项；失败的 URL 下次运行仍会重试。
+    本次运行已出现过的键超过 seen_limit 个后转存到临时文件，流式处理超大
+    URL 列表时内存占用保持不变。
+    """
+
+    def __init__(self, path=None, matcher=None, seen_limit=SEEN_MEMORY_LIMIT):
+        self.path = Path(path) if path else None
+        self.matcher = matcher or ExtractorMatcher()
+        self._known = set()
+        self._seen = _SeenKeys(seen_limit)
+        self._lock = threading.Lock()
+        self._file = None
+        self.duplicates = 0
+        self.previously_done = 0
+
+    def open(self):
+        if self.path:
+            if self.path.exists():
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._known.update(line.strip() for line in f if line.strip())
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8')
+        return self
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+        with self._lock:
+            self._seen.close()
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def check(self, url):
+        """返回 URL 的去重键；本次运行已出现过或历史已下载时返回 None"""
+        key = self.matcher.key(url)
+        with self._lock:
+            if key in self._known:
+                self.previously_done += 1
+                return None
+            if not self._seen.add(key):
+                self.duplicates += 1
+                return None
+        return key
+
+    def is_done(self, key):
+        """历史运行中已下载（不计入统计，不影响 check()）"""
+        with self._lock:
+            return key in self._known
+
+    def add(self, key):
+        """记录下载成功的项"""
+        with self._lock:
+            if key in self._known:
+                return
+            self._known.add(key)
+            if self._file:
+                self._file.write(key + '\n')
+                self._file.flush()
+
+    def report(self):
+        return f"去重: 列表内重复 {self.duplicates} 个, 历史已下载 {self.previously_done} 个"
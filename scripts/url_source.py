@@ -0,0 +1,77 @@
+"""
+URL 输入源
+
+逐行读取 URL，不把整个列表读进内存。支持普通文件、标准输入（"-"）、
+命名管道（FIFO），以及像 `tail -f` 一样持续跟随追加写入的文件。
+
+URL 后面可以用空格隔开附加优先级标记，供 job_order 调度使用:
+
+    https://www.youtube.com/watch?v=xxx priority=10
+"""
+
+import re
+import sys
+import time
+
+_PRIORITY_RE = re.compile(r'(?:^|\s)priority=(-?\d+)(?:\s|$)')
+
+
+def parse_url_line(line):
+    """解析一行输入，返回其中的 URL；空行和以 # 开头的注释行返回 None"""
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+    return line.split(None, 1)[0]
+
+
+def parse_priority(line):
+    """一行输入中 URL 之后的 priority=N 标记，没有时返回 None"""
+    parts = line.strip().split(None, 1)
+    if len(parts) < 2:
+        return None
+    m = _PRIORITY_RE.search(parts[1])
+    return int(m.group(1)) if m else None
+
+
+def _follow_lines(f, poll_interval):
+    """读到文件末尾后继续等待新行，直到被中断"""
+    buffer = ''
+    while True:
+        chunk = f.readline()
+        if not chunk:
+            time.sleep(poll_interval)
+            continue
+        buffer += chunk
+        # 写入方可能只写了半行，等换行符到齐再交出去
+        if buffer.endswith('\n'):
+            yield buffer
+            buffer = ''
+
+
+def _parse_lines(lines, priorities=None):
+    for line in lines:
+        url = parse_url_line(line)
+        if url:
+            if priorities is not None:
+                priority = parse_priority(line)
+                if priority:
+                    priorities[url] = priority
+            yield url
+
+
+def iter_urls(source, follow=False, poll_interval=1.0, priorities=None):
+    """
+    逐个产出 URL
+
+    Args:
+        source: 文件路径，或 "-" 表示标准输入
+        follow: 读到末尾后继续等待追加的内容（按 Ctrl-C 结束）
+        poll_interval: follow 模式下的轮询间隔（秒）
+        priorities: 传入 dict 时，把带有非零 priority=N 标记的 URL 记入其中
+    """
+    if source == '-':
+        yield from _parse_lines(sys.stdin, priorities)
+        return
+
+    with open(source, 'r', encoding='utf-8') as f:
+        yield from _parse_lines(_follow_lines(f, poll_interval) if follow else f, priorities)
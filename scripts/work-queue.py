@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+多节点任务队列管理
+
+查看进度、添加 URL、重试失败项，以及释放已下线节点持有的任务。
+队列由 batch-download.py --queue 使用，见 work_queue.py。
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from url_source import iter_urls
+from work_queue import SqliteWorkQueue
+
+
+def cmd_stats(work_queue, args):
+    counts = work_queue.counts()
+    print(f"队列: {args.queue}")
+    print(f"待处理: {counts['pending']}, 处理中: {counts['leased']}, "
+          f"完成: {counts['done']}, 失败: {counts['failed']}")
+    now = time.time()
+    for owner, count, lease_until in work_queue.owners():
+        remaining = lease_until - now
+        state = f"租约剩余 {remaining:.0f} 秒" if remaining > 0 else f"租约已过期 {-remaining:.0f} 秒"
+        print(f"  节点 {owner}: {count} 个（{state}）")
+    return 0
+
+
+def cmd_add(work_queue, args):
+    urls = list(args.urls)
+    if args.file:
+        urls.extend(iter_urls(args.file))
+    added = work_queue.add(urls)
+    print(f"新增 {added} 个 URL（{len(urls) - added} 个已在队列中）")
+    return 0
+
+
+def cmd_failures(work_queue, args):
+    for url, reason in work_queue.failures(args.limit):
+        print(f"✗ {url}: {reason}")
+    return 0
+
+
+def cmd_retry(work_queue, args):
+    print(f"已把 {work_queue.retry_failed()} 个失败的 URL 放回队列")
+    return 0
+
+
+def cmd_release(work_queue, args):
+    """节点确认已下线时立即放回它的任务，不必等租约到期"""
+    print(f"已放回节点 {args.node} 持有的 {work_queue.release_all(args.node)} 个 URL")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='多节点任务队列管理',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  # 预先填充队列（也可以由第一个 batch-download.py --queue 节点填充）
+  python work-queue.py /mnt/shared/queue.sqlite add -f urls.txt
+
+  # 查看进度和各节点持有的任务
+  python work-queue.py /mnt/shared/queue.sqlite stats
+
+  # 查看失败原因 / 把失败项放回队列
+  python work-queue.py /mnt/shared/queue.sqlite failures
+  python work-queue.py /mnt/shared/queue.sqlite retry
+
+  # 节点已下线，立即放回它持有的任务
+  python work-queue.py /mnt/shared/queue.sqlite release box2-12345
+        """
+    )
+
+    parser.add_argument('queue', help='队列文件')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('stats', help='显示进度和各节点持有的任务').set_defaults(func=cmd_stats)
+
+    add_parser = subparsers.add_parser('add', help='添加 URL（已存在的忽略）')
+    add_parser.add_argument('-f', '--file', help='URL 列表文件，- 表示标准输入')
+    add_parser.add_argument('urls', nargs='*', help='直接提供 URL')
+    add_parser.set_defaults(func=cmd_add)
+
+    failures_parser = subparsers.add_parser('failures', help='列出最近失败的 URL 和原因')
+    failures_parser.add_argument('-n', '--limit', type=int, default=20, help='最多显示的条数 (默认: 20)')
+    failures_parser.set_defaults(func=cmd_failures)
+
+    subparsers.add_parser('retry', help='把失败的 URL 放回队列').set_defaults(func=cmd_retry)
+
+    release_parser = subparsers.add_parser('release', help='放回某个节点持有的全部 URL')
+    release_parser.add_argument('node', help='节点标识（见 stats 输出）')
+    release_parser.set_defaults(func=cmd_release)
+
+    args = parser.parse_args()
+
+    if args.command != 'add' and not Path(args.queue).exists():
+        print(f"错误: 队列不存在: {args.queue}")
+        return 1
+    if args.command == 'add' and not args.file and not args.urls:
+        parser.error('add 需要 -f 或 URL')
+
+    work_queue = SqliteWorkQueue(args.queue)
+    try:
+        return args.func(work_queue, args)
+    finally:
+        work_queue.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,267 @@
+"""
+多节点共享任务队列（租约领取）
+
+多台机器运行 batch-download.py 处理同一个 URL 列表时，把列表放进共享存储中的
+队列，各节点按需领取，不再手工拆分文件。
+
+- 领取（claim）：把一条待处理的 URL 标记为本节点持有，附带有效期（租约）。
+- 续约（renew）：后台线程定期延长本节点持有的全部租约，下载时间再长也不会过期。
+- 完成（finish）：成功/跳过记为 done，失败记为 failed，被中断的任务放回队列。
+- 节点崩溃或断网后续约停止，租约到期的 URL 由其他节点重新领取；同一 URL 被
+  领取 max_attempts 次仍未完成时记为 failed，避免一个导致崩溃的 URL 拖垮所有节点。
+
+SqliteWorkQueue 是基于 SQLite 文件的实现，文件可以放在多台机器共同挂载的卷上。
+网络文件系统不支持 WAL 需要的共享内存，这里使用默认的回滚日志模式，领取在
+BEGIN IMMEDIATE 事务中完成，同一时刻只有一个节点能写入。
+
+其他存储（Redis、数据库服务等）只需提供同样的方法: add(urls)、claim(n)、renew()、
+finish(url, outcome, reason)、release_all()、counts()、close()，即可替换。
+
+用法:
+    with SqliteWorkQueue('/mnt/shared/queue.sqlite') as work_queue:
+        work_queue.add(urls)                  # 任意节点都可以添加，重复的 URL 被忽略
+        for url in work_queue.claims():       # 领完且其他节点都已结束时返回
+            ...
+            work_queue.finish(url, 'success')
+"""
+
+import os
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+STATES = (PENDING, LEASED, DONE, FAILED)
+
+DEFAULT_LEASE = 120.0
+DEFAULT_MAX_ATTEMPTS = 5
+
+# 流水线的结果 → 队列状态；incomplete 表示被中断，放回队列
+_OUTCOME_STATES = {'success': DONE, 'skipped': DONE, 'failed': FAILED, 'incomplete': PENDING}
+
+
+def default_node_id():
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+class SqliteWorkQueue:
+    """
+    SQLite 任务队列（线程安全，多进程/多机器可同时使用）
+
+    Args:
+        path: 数据库文件
+        node_id: 本节点标识，默认为 "主机名-进程号"
+        lease: 租约有效期（秒）；续约间隔为其三分之一
+        max_attempts: 同一 URL 最多被领取的次数（被中断放回队列的不计）
+        timeout: 等待其他节点释放写锁的最长时间（秒）
+    """
+
+    def __init__(self, path, node_id=None, lease=DEFAULT_LEASE, max_attempts=DEFAULT_MAX_ATTEMPTS, timeout=60.0):
+        self.path = Path(path)
+        self.node_id = node_id or default_node_id()
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, timeout=timeout, check_same_thread=False, isolation_level=None)
+        self._db.execute('''CREATE TABLE IF NOT EXISTS items (
+            id INTEGER PRIMARY KEY,
+            url TEXT NOT NULL UNIQUE,
+            state TEXT NOT NULL DEFAULT 'pending',
+            owner TEXT,
+            lease_until REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            updated REAL NOT NULL,
+            reason TEXT
+        )''')
+        self._db.execute('CREATE INDEX IF NOT EXISTS items_state ON items (state, id)')
+        self._stop = threading.Event()
+        self._heartbeat = None
+        self.claimed = 0
+
+    def _transaction(self, fn):
+        """在写事务中执行 fn(db)，开始时即取得写锁，避免领取时两个节点读到同一行"""
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                result = fn(self._db)
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+            return result
+
+    def add(self, urls, batch_size=1000):
+        """添加 URL（已存在的忽略），返回新增数量"""
+        added = 0
+        batch = []
+
+        def insert(db):
+            now = time.time()
+            before = db.total_changes
+            db.executemany('INSERT OR IGNORE INTO items (url, updated) VALUES (?, ?)', ((url, now) for url in batch))
+            return db.total_changes - before
+
+        for url in urls:
+            batch.append(url)
+            if len(batch) >= batch_size:
+                added += self._transaction(insert)
+                batch.clear()
+        if batch:
+            added += self._transaction(insert)
+        return added
+
+    def claim(self, n=1):
+        """领取最多 n 个 URL：优先接手租约已过期的，其次按添加顺序领取待处理的"""
+        def claim(db):
+            now = time.time()
+            db.execute(
+                "UPDATE items SET state = 'failed', owner = NULL, updated = ?, reason = ? "
+                "WHERE state = 'leased' AND lease_until < ? AND attempts >= ?",
+                (now, f'租约到期 {self.max_attempts} 次（节点多次在处理中退出）', now, self.max_attempts))
+            rows = db.execute(
+                "SELECT id, url FROM items WHERE state = 'leased' AND lease_until < ? ORDER BY id LIMIT ?",
+                (now, n)).fetchall()
+            if len(rows) < n:
+                rows += db.execute(
+                    "SELECT id, url FROM items WHERE state = 'pending' ORDER BY id LIMIT ?",
+                    (n - len(rows),)).fetchall()
+            db.executemany(
+                "UPDATE items SET state = 'leased', owner = ?, lease_until = ?, attempts = attempts + 1, updated = ? "
+                "WHERE id = ?",
+                ((self.node_id, now + self.lease, now, row[0]) for row in rows))
+            return [row[1] for row in rows]
+
+        urls = self._transaction(claim)
+        self.claimed += len(urls)
+        return urls
+
+    def renew(self):
+        """延长本节点持有的全部租约，返回租约数"""
+        def renew(db):
+            now = time.time()
+            return db.execute(
+                "UPDATE items SET lease_until = ? WHERE owner = ? AND state = 'leased'",
+                (now + self.lease, self.node_id)).rowcount
+        return self._transaction(renew)
+
+    def finish(self, url, outcome, reason=None):
+        """
+        记录结果：success/skipped → done，failed → failed，incomplete → 放回队列
+
+        只更新本节点仍持有租约的 URL；返回 False 表示不是队列中的 URL（例如播放列表
+        展开出的条目），或租约已过期并被其他节点接手。
+        """
+        state = _OUTCOME_STATES[outcome]
+
+        def finish(db):
+            now = time.time()
+            if state == PENDING:
+                # 主动放回的不计入领取次数
+                return db.execute(
+                    "UPDATE items SET state = 'pending', owner = NULL, lease_until = NULL, "
+                    "attempts = MAX(attempts - 1, 0), updated = ? WHERE url = ? AND owner = ? AND state = 'leased'",
+                    (now, url, self.node_id)).rowcount
+            return db.execute(
+                "UPDATE items SET state = ?, owner = NULL, lease_until = NULL, updated = ?, reason = ? "
+                "WHERE url = ? AND owner = ? AND state = 'leased'",
+                (state, now, None if reason is None else str(reason), url, self.node_id)).rowcount
+
+        return bool(self._transaction(finish))
+
+    def release_all(self, node_id=None):
+        """把某个节点（默认本节点）持有的全部 URL 放回队列，返回数量"""
+        def release(db):
+            return db.execute(
+                "UPDATE items SET state = 'pending', owner = NULL, lease_until = NULL, "
+                "attempts = MAX(attempts - 1, 0), updated = ? WHERE owner = ? AND state = 'leased'",
+                (time.time(), node_id or self.node_id)).rowcount
+        return self._transaction(release)
+
+    def retry_failed(self):
+        """把失败的 URL 放回队列，返回数量"""
+        def retry(db):
+            return db.execute(
+                "UPDATE items SET state = 'pending', attempts = 0, reason = NULL, updated = ? WHERE state = 'failed'",
+                (time.time(),)).rowcount
+        return self._transaction(retry)
+
+    def counts(self):
+        with self._lock:
+            rows = self._db.execute('SELECT state, COUNT(*) FROM items GROUP BY state').fetchall()
+        result = dict.fromkeys(STATES, 0)
+        result.update(rows)
+        return result
+
+    def owners(self):
+        """各节点当前持有的租约数和最晚到期时间"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT owner, COUNT(*), MAX(lease_until) FROM items WHERE state = 'leased' GROUP BY owner "
+                "ORDER BY owner").fetchall()
+
+    def failures(self, limit=20):
+        with self._lock:
+            return self._db.execute(
+                "SELECT url, reason FROM items WHERE state = 'failed' ORDER BY updated DESC LIMIT ?",
+                (limit,)).fetchall()
+
+    def claims(self, poll_interval=5.0):
+        """
+        逐个领取并产出 URL
+
+        队列中暂时没有可领取的 URL、但还有其他节点持有租约时继续等待：那些节点
+        可能退出，租约到期后由本节点接手。所有 URL 都已完成或失败时返回。
+        """
+        while not self._stop.is_set():
+            urls = self.claim()
+            if urls:
+                yield from urls
+                continue
+            counts = self.counts()
+            if not counts[PENDING] and not counts[LEASED]:
+                return
+            self._stop.wait(poll_interval)
+
+    def _renew_loop(self):
+        interval = self.lease / 3
+        while not self._stop.wait(interval):
+            try:
+                self.renew()
+            except sqlite3.Error as e:
+                # 共享卷暂时不可用：下一轮再试，连续失败到租约过期时由其他节点接手
+                print(f"⚠ 任务队列续约失败: {e}")
+
+    def open(self):
+        """启动后台续约线程"""
+        if self._heartbeat is None:
+            self._heartbeat = threading.Thread(target=self._renew_loop, name='queue-heartbeat', daemon=True)
+            self._heartbeat.start()
+        return self
+
+    def close(self):
+        """停止续约，把仍持有的 URL 放回队列"""
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+        self.release_all()
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def report(self):
+        counts = self.counts()
+        return (f"任务队列: 本节点 {self.node_id} 领取 {self.claimed} 个; 全部 完成 {counts[DONE]}, "
+                f"失败 {counts[FAILED]}, 处理中 {counts[LEASED]}, 待处理 {counts[PENDING]}")
@@ -86,6 +86,55 @@ if __name__ == '__main__':
     download_playlist('https://www.youtube.com/playlist?list=xxx')
 ```
 
+## 大型播放列表逐条下载模板
+
+`ydl.download([playlist_url])` 会先解析出全部条目再开始下载。频道有上千个视频时，
+可以只取条目地址（extract_flat），边翻页边下载：
+
+```python
+#!/usr/bin/env python3
+"""
+大型播放列表/频道逐条下载脚本
+"""
+
+import yt_dlp
+
+
+def iter_playlist_urls(playlist_url):
+    """逐个产出播放列表中的视频地址，不解析每个视频，也不等待全部翻页完成"""
+    ydl_opts = {
+        'extract_flat': 'in_playlist',  # 条目只包含地址和 ID
+        'quiet': True,
+    }
+
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        # process=False: entries 保持为生成器或按需翻页的列表，迭代到哪一页才请求哪一页
+        info = ydl.extract_info(playlist_url, download=False, process=False)
+        for entry in info.get('entries') or []:
+            if entry and entry.get('url'):
+                yield entry['url']
+
+
+def download_playlist_lazily(playlist_url, output_dir='playlists'):
+    """逐条下载播放列表，第一个视频无需等待整个列表解析完成"""
+    ydl_opts = {
+        'outtmpl': f'{output_dir}/%(title)s.%(ext)s',
+        'ignoreerrors': True,
+        'download_archive': f'{output_dir}/archive.txt',  # 中断后再次运行时跳过已下载的视频
+    }
+
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        for url in iter_playlist_urls(playlist_url):
+            ydl.download([url])
+
+
+if __name__ == '__main__':
+    download_playlist_lazily('https://www.youtube.com/@xxx/videos')
+```
+
+批量下载可以直接使用 `scripts/batch-download.py`，播放列表和频道 URL 会被自动展开，
+条目与其他 URL 一起并发下载。
+
 ## 带进度监控的下载模板
 
 ```python
@@ -205,6 +254,91 @@ if __name__ == '__main__':
     print(json.dumps(info, indent=2, ensure_ascii=False))
 ```
 
+## 常驻下载服务客户端模板
+
+以上函数每次调用都会新建并关闭一个 `YoutubeDL`。Web 后端按请求调用时，可以运行
+`scripts/download-service.py`，由它按预设（default/audio/high/fast，对应下面配置文件
+模板中的 `DEFAULT_OPTIONS`、`AUDIO_OPTIONS` 等）复用预热好的实例，后端只发送 HTTP 请求：
+
+```python
+#!/usr/bin/env python3
+"""
+下载服务客户端（服务端: python scripts/download-service.py --port 8790）
+"""
+
+import json
+import urllib.request
+
+SERVICE = 'http://127.0.0.1:8790'
+
+
+def _post(path, payload, timeout=600):
+    request = urllib.request.Request(f'{SERVICE}{path}', data=json.dumps(payload).encode('utf-8'),
+                                     headers={'Content-Type': 'application/json'})
+    return urllib.request.urlopen(request, timeout=timeout)
+
+
+def extract_video_info(url, profile='default'):
+    """提取视频信息，返回完整的 info_dict"""
+    with _post('/extract', {'url': url, 'profile': profile}) as response:
+        return json.load(response)
+
+
+def download_video(url, profile='default', output_dir=None, on_progress=None):
+    """下载视频，逐个接收进度事件；返回最终结果 {'ok', 'files', 'error'}"""
+    payload = {'url': url, 'profile': profile}
+    if output_dir:
+        payload['output_dir'] = output_dir
+    with _post('/download', payload) as response:
+        for line in response:  # 每行一个 JSON 事件，最后一行为 result
+            event = json.loads(line)
+            if event['event'] == 'result':
+                return event
+            if on_progress:
+                on_progress(event)
+
+
+if __name__ == '__main__':
+    result = download_video('https://www.youtube.com/watch?v=xxx', profile='audio',
+                            on_progress=lambda e: print(e.get('status'), e.get('downloaded_bytes')))
+    print(result)
+```
+
+## asyncio 模板
+
+在 asyncio 服务中不必为每次调用手写 `run_in_executor`，可以使用 `scripts/async_api.py`：
+阻塞调用在固定大小的线程池中执行，进度事件以异步迭代器的形式产出，
+上千个待处理任务只占用协程：
+
+```python
+#!/usr/bin/env python3
+"""
+asyncio 批量下载脚本（需要把 scripts/ 加入 PYTHONPATH）
+"""
+
+import asyncio
+
+from async_api import AsyncDownloader
+
+
+async def main(urls):
+    async with AsyncDownloader(output_dir='downloads', workers=4) as downloader:
+        info = await downloader.extract(urls[0], timeout=30)
+        print(f"标题: {info.get('title')}")
+
+        async for event in downloader.download(urls[0], profile='audio', timeout=600):
+            if event['event'] == 'progress':
+                print(event['status'], event['downloaded_bytes'], event['total_bytes'])
+
+        results = await downloader.gather_downloads(urls, limit=8, timeout=600)
+        for result in results:
+            print('✓' if result['ok'] else '✗', result['url'], result.get('error', ''))
+
+
+if __name__ == '__main__':
+    asyncio.run(main(['https://www.youtube.com/watch?v=xxx']))
+```
+
 ## 自定义格式选择模板
 
 ```python